@@ -76,6 +76,25 @@ export const useProjectChanges = (onProjectChange?: (change: ProjectChange) => v
   }, [onProjectChange]);
 };
 
+// Called when events missed while offline could not be replayed: reload the project
+export const useProjectResync = (onProjectResync?: (projectGid: string) => void) => {
+  useEffect(() => {
+    if (!onProjectResync) return;
+
+    const unsubscribe = websocketService.onProjectResync(onProjectResync);
+    return unsubscribe;
+  }, [onProjectResync]);
+};
+
+export const useWorkspaceResync = (onWorkspaceResync?: (workspaceGid: string) => void) => {
+  useEffect(() => {
+    if (!onWorkspaceResync) return;
+
+    const unsubscribe = websocketService.onWorkspaceResync(onWorkspaceResync);
+    return unsubscribe;
+  }, [onWorkspaceResync]);
+};
+
 export const useTypingIndicators = (onTypingIndicator?: (indicator: TypingIndicator) => void) => {
   const [typingUsers, setTypingUsers] = useState<Map<string, TypingIndicator>>(new Map());
 
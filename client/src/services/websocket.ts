@@ -1,5 +1,8 @@
 import io, { Socket } from 'socket.io-client';
 
+// Sequence number of the event in each room it was sent to
+export type RoomSeqs = { [room: string]: number };
+
 export interface TaskUpdate {
   task_gid: string;
   update_type: string;
@@ -9,18 +12,31 @@ export interface TaskUpdate {
     name: string;
   };
   timestamp: string;
+  room_seqs?: RoomSeqs;
+  // Same id in the live event and in its replay
+  event_id?: string;
 }
 
 export interface TaskChange {
   task_gid: string;
   change_type: string;
+  // Only the changed fields ({ field: { from, to } } for updates)
   change_data: any;
-  task_data: any;
+  version: number;
   changed_by: {
     gid: string;
     name: string;
   };
   timestamp: string;
+  room_seqs?: RoomSeqs;
+  // Same id in the live event and in its replay
+  event_id?: string;
+}
+
+export interface TaskSnapshot {
+  task_gid: string;
+  version: number;
+  task_data: any;
 }
 
 export interface ProjectChange {
@@ -33,6 +49,21 @@ export interface ProjectChange {
     name: string;
   };
   timestamp: string;
+  room_seqs?: RoomSeqs;
+  // Same id in the live event and in its replay
+  event_id?: string;
+}
+
+export interface RoomReplay {
+  room: string;
+  // project_gid for project rooms, workspace_gid for workspace rooms
+  project_gid?: string;
+  workspace_gid?: string;
+  since_seq: number;
+  seq: number | null;
+  // false when the server buffer rolled over: the project must be reloaded
+  complete: boolean;
+  events: { seq: number; event: string; payload: any }[];
 }
 
 export interface TypingIndicator {
@@ -57,9 +88,28 @@ class WebSocketService {
   // Event listeners
   private taskUpdateListeners: ((update: TaskUpdate) => void)[] = [];
   private taskChangeListeners: ((change: TaskChange) => void)[] = [];
+  private taskSnapshotListeners: ((snapshot: TaskSnapshot) => void)[] = [];
   private projectChangeListeners: ((change: ProjectChange) => void)[] = [];
   private typingIndicatorListeners: ((indicator: TypingIndicator) => void)[] = [];
   private connectionListeners: ((connected: boolean) => void)[] = [];
+  private projectResyncListeners: ((projectGid: string) => void)[] = [];
+  private workspaceResyncListeners: ((workspaceGid: string) => void)[] = [];
+
+  // Last sequence delivered per joined room, kept across reconnects to replay missed events
+  private roomSeqs = new Map<string, number>();
+
+  // Events that arrived after a gap in some room, held until the gap is filled
+  private pendingRoomEvents: { event: string; payload: any }[] = [];
+  private gapTimers = new Map<string, ReturnType<typeof setTimeout>>();
+  private gapTimeoutMs = 2000;
+
+  // Recently delivered event ids: an event can arrive live and again in a replay
+  private deliveredEventIds = new Set<string>();
+  private deliveredEventOrder: string[] = [];
+  private maxDeliveredEventIds = 1000;
+
+  // Last version applied per task, used to detect missed task_changed deltas
+  private taskVersions = new Map<string, number>();
 
   constructor() {
     this.token = localStorage.getItem('token');
@@ -131,17 +181,53 @@ class WebSocketService {
     });
 
     // Task-related events
-    this.socket.on('task_updated', (update: TaskUpdate) => {
-      this.taskUpdateListeners.forEach(listener => listener(update));
-    });
+    this.socket.on('task_updated', (update: TaskUpdate) => this.dispatchRoomEvent('task_updated', update));
+
+    this.socket.on('task_changed', (change: TaskChange) => this.dispatchRoomEvent('task_changed', change));
 
-    this.socket.on('task_changed', (change: TaskChange) => {
-      this.taskChangeListeners.forEach(listener => listener(change));
+    this.socket.on('task_snapshot', (snapshot: TaskSnapshot) => {
+      this.taskVersions.set(snapshot.task_gid, snapshot.version);
+      this.taskSnapshotListeners.forEach(listener => listener(snapshot));
     });
 
     // Project-related events
-    this.socket.on('project_changed', (change: ProjectChange) => {
-      this.projectChangeListeners.forEach(listener => listener(change));
+    this.socket.on('project_changed', (change: ProjectChange) => this.dispatchRoomEvent('project_changed', change));
+
+    this.socket.on('joined_project', (data: { project_gid: string; seq: number | null }) => {
+      const room = `project_${data.project_gid}`;
+      if (data.seq !== null && !this.roomSeqs.has(room)) {
+        this.roomSeqs.set(room, data.seq);
+      }
+    });
+
+    this.socket.on('joined_workspace', (data: { workspace_gid: string; seq: number | null }) => {
+      const room = `workspace_${data.workspace_gid}`;
+      if (data.seq !== null && !this.roomSeqs.has(room)) {
+        this.roomSeqs.set(room, data.seq);
+      }
+    });
+
+    this.socket.on('room_replay', (replay: RoomReplay) => {
+      if (!replay.complete) {
+        // Missed events are no longer buffered: reload from the REST API
+        if (replay.seq !== null) {
+          this.roomSeqs.set(replay.room, replay.seq);
+        } else {
+          this.roomSeqs.delete(replay.room);
+        }
+        if (replay.project_gid) {
+          const projectGid = replay.project_gid;
+          this.projectResyncListeners.forEach(listener => listener(projectGid));
+        } else if (replay.workspace_gid) {
+          const workspaceGid = replay.workspace_gid;
+          this.workspaceResyncListeners.forEach(listener => listener(workspaceGid));
+        }
+        this.flushPendingRoomEvents();
+        return;
+      }
+      replay.events.forEach(({ seq, event, payload }) => {
+        this.dispatchRoomEvent(event, { ...payload, room_seqs: { [replay.room]: seq } });
+      });
     });
 
     // Typing indicators
@@ -175,6 +261,140 @@ class WebSocketService {
     }, delay);
   }
 
+  // Delivers room events in sequence order. Events already seen are dropped
+  // (replay and live delivery may overlap); events that arrive ahead of a gap
+  // wait for it, and a gap that does not fill is replayed from the server.
+  private dispatchRoomEvent(event: string, payload: any): void {
+    const state = this.roomEventState(payload);
+    if (state === 'stale') {
+      return;
+    }
+    if (state === 'gap') {
+      this.pendingRoomEvents.push({ event, payload });
+      this.scheduleGapCheck(payload);
+      return;
+    }
+    this.deliverRoomEvent(event, payload);
+    this.flushPendingRoomEvents();
+  }
+
+  // Joined rooms in which the event was numbered (other rooms' sequences have gaps by design)
+  private trackedRooms(payload: any): string[] {
+    return Object.keys(payload.room_seqs || {}).filter(room => this.roomSeqs.has(room));
+  }
+
+  private roomEventState(payload: any): 'ready' | 'stale' | 'gap' {
+    const roomSeqs: RoomSeqs = payload.room_seqs || {};
+    const rooms = this.trackedRooms(payload);
+    if (rooms.length === 0) {
+      return 'ready';
+    }
+    if (rooms.every(room => roomSeqs[room] <= this.roomSeqs.get(room)!)) {
+      return 'stale';
+    }
+    return rooms.some(room => roomSeqs[room] > this.roomSeqs.get(room)! + 1) ? 'gap' : 'ready';
+  }
+
+  private flushPendingRoomEvents(): void {
+    let delivered = true;
+    while (delivered) {
+      delivered = false;
+      const pending = this.pendingRoomEvents;
+      this.pendingRoomEvents = [];
+      pending.forEach(({ event, payload }) => {
+        const state = this.roomEventState(payload);
+        if (state === 'gap') {
+          this.pendingRoomEvents.push({ event, payload });
+        } else if (state === 'ready') {
+          this.deliverRoomEvent(event, payload);
+          delivered = true;
+        }
+      });
+    }
+  }
+
+  private scheduleGapCheck(payload: any): void {
+    const roomSeqs: RoomSeqs = payload.room_seqs || {};
+    this.trackedRooms(payload)
+      .filter(room => roomSeqs[room] > this.roomSeqs.get(room)! + 1 && !this.gapTimers.has(room))
+      .forEach(room => {
+        this.gapTimers.set(room, setTimeout(() => {
+          this.gapTimers.delete(room);
+          if (this.hasPendingEvents(room)) {
+            this.requestRoomReplay(room);
+          }
+        }, this.gapTimeoutMs));
+      });
+  }
+
+  private hasPendingEvents(room: string): boolean {
+    const last = this.roomSeqs.get(room);
+    return last !== undefined && this.pendingRoomEvents.some(({ payload }) => (payload.room_seqs?.[room] ?? 0) > last);
+  }
+
+  // Rejoining with since_seq makes the server send the missing events in room_replay
+  private requestRoomReplay(room: string): void {
+    const sinceSeq = this.roomSeqs.get(room);
+    if (!this.socket?.connected || sinceSeq === undefined) {
+      return;
+    }
+    if (room.startsWith('project_')) {
+      this.socket.emit('join_project', { project_gid: room.slice('project_'.length), since_seq: sinceSeq });
+    } else if (room.startsWith('workspace_')) {
+      this.socket.emit('join_workspace', { workspace_gid: room.slice('workspace_'.length), since_seq: sinceSeq });
+    }
+  }
+
+  private forgetRoom(room: string): void {
+    this.roomSeqs.delete(room);
+    clearTimeout(this.gapTimers.get(room));
+    this.gapTimers.delete(room);
+    // Events held only for this room are no longer wanted
+    this.pendingRoomEvents = this.pendingRoomEvents.filter(({ payload }) => this.trackedRooms(payload).length > 0);
+    this.flushPendingRoomEvents();
+  }
+
+  private deliverRoomEvent(event: string, payload: any): void {
+    const roomSeqs: RoomSeqs = payload.room_seqs || {};
+    this.trackedRooms(payload).forEach(room => {
+      this.roomSeqs.set(room, Math.max(roomSeqs[room], this.roomSeqs.get(room)!));
+    });
+
+    if (payload.event_id) {
+      if (this.deliveredEventIds.has(payload.event_id)) {
+        return;
+      }
+      this.deliveredEventIds.add(payload.event_id);
+      this.deliveredEventOrder.push(payload.event_id);
+      if (this.deliveredEventOrder.length > this.maxDeliveredEventIds) {
+        this.deliveredEventIds.delete(this.deliveredEventOrder.shift()!);
+      }
+    }
+
+    if (event === 'task_updated') {
+      this.taskUpdateListeners.forEach(listener => listener(payload));
+    } else if (event === 'task_changed') {
+      this.dispatchTaskChange(payload);
+    } else if (event === 'project_changed') {
+      this.projectChangeListeners.forEach(listener => listener(payload));
+    }
+  }
+
+  // Applies a delta only on top of the previous version; after a gap, asks for the full task instead
+  private dispatchTaskChange(change: TaskChange): void {
+    const known = this.taskVersions.get(change.task_gid);
+    if (known !== undefined && change.version <= known) {
+      return;
+    }
+    this.taskVersions.set(change.task_gid, change.version);
+
+    if (known !== undefined && change.version > known + 1) {
+      this.requestTaskSnapshot(change.task_gid);
+      return;
+    }
+    this.taskChangeListeners.forEach(listener => listener(change));
+  }
+
   private notifyConnectionListeners(connected: boolean): void {
     this.connectionListeners.forEach(listener => listener(connected));
   }
@@ -182,19 +402,28 @@ class WebSocketService {
   // Room management
   joinProject(projectGid: string): void {
     if (this.socket?.connected) {
-      this.socket.emit('join_project', { project_gid: projectGid });
+      // On a rejoin, ask only for the events missed while offline
+      const sinceSeq = this.roomSeqs.get(`project_${projectGid}`);
+      this.socket.emit('join_project', sinceSeq !== undefined
+        ? { project_gid: projectGid, since_seq: sinceSeq }
+        : { project_gid: projectGid });
     }
   }
 
   leaveProject(projectGid: string): void {
     if (this.socket?.connected) {
+      // An explicit leave forgets the sequence; a dropped connection keeps it for the replay
+      this.forgetRoom(`project_${projectGid}`);
       this.socket.emit('leave_project', { project_gid: projectGid });
     }
   }
 
   joinWorkspace(workspaceGid: string): void {
     if (this.socket?.connected) {
-      this.socket.emit('join_workspace', { workspace_gid: workspaceGid });
+      const sinceSeq = this.roomSeqs.get(`workspace_${workspaceGid}`);
+      this.socket.emit('join_workspace', sinceSeq !== undefined
+        ? { workspace_gid: workspaceGid, since_seq: sinceSeq }
+        : { workspace_gid: workspaceGid });
     }
   }
 
@@ -209,6 +438,18 @@ class WebSocketService {
     }
   }
 
+  // Version of a task loaded through the REST API, the baseline for gap detection
+  setTaskVersion(taskGid: string, version: number): void {
+    this.taskVersions.set(taskGid, version);
+  }
+
+  // Full task state, for when a change arrives with an unexpected version
+  requestTaskSnapshot(taskGid: string): void {
+    if (this.socket?.connected) {
+      this.socket.emit('request_task_snapshot', { task_gid: taskGid });
+    }
+  }
+
   sendTypingIndicator(targetType: string, targetGid: string, field: string, isTyping: boolean): void {
     if (this.socket?.connected) {
       this.socket.emit('typing_indicator', {
@@ -241,6 +482,16 @@ class WebSocketService {
     };
   }
 
+  onTaskSnapshot(listener: (snapshot: TaskSnapshot) => void): () => void {
+    this.taskSnapshotListeners.push(listener);
+    return () => {
+      const index = this.taskSnapshotListeners.indexOf(listener);
+      if (index > -1) {
+        this.taskSnapshotListeners.splice(index, 1);
+      }
+    };
+  }
+
   onProjectChange(listener: (change: ProjectChange) => void): () => void {
     this.projectChangeListeners.push(listener);
     return () => {
@@ -261,6 +512,28 @@ class WebSocketService {
     };
   }
 
+  // Called when missed events could not be replayed and the project must be reloaded
+  onProjectResync(listener: (projectGid: string) => void): () => void {
+    this.projectResyncListeners.push(listener);
+    return () => {
+      const index = this.projectResyncListeners.indexOf(listener);
+      if (index > -1) {
+        this.projectResyncListeners.splice(index, 1);
+      }
+    };
+  }
+
+  // Same as onProjectResync, for workspace rooms
+  onWorkspaceResync(listener: (workspaceGid: string) => void): () => void {
+    this.workspaceResyncListeners.push(listener);
+    return () => {
+      const index = this.workspaceResyncListeners.indexOf(listener);
+      if (index > -1) {
+        this.workspaceResyncListeners.splice(index, 1);
+      }
+    };
+  }
+
   onConnectionChange(listener: (connected: boolean) => void): () => void {
     this.connectionListeners.push(listener);
     return () => {
@@ -0,0 +1,97 @@
+"""
+Servidor Socket.IO usado pelos benchmarks: sobe o app de enhanced_main.create_app
+com SQLite e sem fila de mensagens, cria os dados de teste e fica escutando.
+    
+    SOCKETIO_ASYNC_MODE=gevent python benchmarks/bench_server.py --port 5055 --db /tmp/bench.db
+
+Com --users/--projects cria vários usuários, todos membros do workspace, e um
+projeto com uma tarefa para cada índice; o índice 0 usa os gids fixos abaixo.
+Com --redis-url o app usa esse Redis para o buffer de replay das salas, a
+presença e a invalidação do cache de acesso; a fila do Socket.IO vem de
+--message-queue.
+
+As variáveis de ambiente precisam estar definidas antes do import de enhanced_main,
+que aplica o monkey patching do modo escolhido.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_USER_GID = 'bench-user'
+BENCH_WORKSPACE_GID = 'bench-workspace'
+BENCH_PROJECT_GID = 'bench-project'
+BENCH_TASK_GID = 'bench-task'
+
+def bench_user_gid(index):
+    return BENCH_USER_GID if index == 0 else f'{BENCH_USER_GID}-{index}'
+
+def bench_project_gid(index):
+    return BENCH_PROJECT_GID if index == 0 else f'{BENCH_PROJECT_GID}-{index}'
+
+def bench_task_gid(index):
+    return BENCH_TASK_GID if index == 0 else f'{BENCH_TASK_GID}-{index}'
+
+def seed(db, users=1, projects=1):
+    from src.models.enhanced_work_graph import User, Workspace, Project, Task, workspace_memberships
+    
+    if db.session.get(User, BENCH_USER_GID):
+        return
+    db.session.add(Workspace(gid=BENCH_WORKSPACE_GID, name='Bench'))
+    db.session.add_all([
+        User(gid=bench_user_gid(i), name=f'Bench {i}', email=f'bench{i}@example.com')
+        for i in range(users)
+    ])
+    db.session.flush()
+    db.session.execute(workspace_memberships.insert(), [
+        {'workspace_gid': BENCH_WORKSPACE_GID, 'user_gid': bench_user_gid(i), 'role': 'member'}
+        for i in range(users)
+    ])
+    for j in range(projects):
+        project = Project(
+            gid=bench_project_gid(j), name=f'Bench {j}', workspace_gid=BENCH_WORKSPACE_GID,
+            owner_gid=BENCH_USER_GID, privacy_setting='public_to_workspace'
+        )
+        task = Task(gid=bench_task_gid(j), name=f'Bench {j}', workspace_gid=BENCH_WORKSPACE_GID)
+        task.projects.append(project)
+        db.session.add_all([project, task])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--db', default='/tmp/clareza-bench.db')
+    parser.add_argument('--message-queue', default='', help='URL Redis da fila do Socket.IO (vazio: sem fila)')
+    parser.add_argument('--redis-url', default='', help='Redis do app: replay, presença e cache de acesso (vazio: sem Redis)')
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--projects', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='banco já populado por outro processo')
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = f'sqlite:///{args.db}'
+    os.environ['SOCKETIO_REDIS_URL'] = args.message_queue
+    os.environ.setdefault('ACTIVITY_STREAM_ENABLED', 'false')
+    if args.redis_url:
+        os.environ['REDIS_URL'] = args.redis_url
+    else:
+        # Sem Redis local: nem o stream do feed nem o buffer de replay das salas
+        os.environ.setdefault('WEBSOCKET_ROOM_LOG_ENABLED', 'false')
+    
+    import logging
+    from src.enhanced_main import create_app
+    from src.models.enhanced_work_graph import db
+    
+    app, socketio = create_app('production')
+    # Um log por conexão distorceria as medições
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    if not args.no_seed:
+        with app.app_context():
+            seed(db, args.users, args.projects)
+    
+    print(f'ready {socketio.server.eio.async_mode} {args.port}', flush=True)
+    socketio.run(app, host='127.0.0.1', port=args.port, debug=False, log_output=False, allow_unsafe_werkzeug=True)
+
+if __name__ == '__main__':
+    main()
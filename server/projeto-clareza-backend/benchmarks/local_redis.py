@@ -0,0 +1,62 @@
+"""
+Redis local e descartável para os benchmarks: usa o redis-server do PATH ou, sem
+ele, um servidor fakeredis (pip install fakeredis lupa) em um subprocesso.
+
+    python benchmarks/local_redis.py --port 6390
+
+O fakeredis atende um cliente por thread e é bem mais lento que o Redis real:
+serve para exercitar a fila do Socket.IO, o replay e a presença, não para medir
+o teto de throughput.
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def start_local_redis(port, workdir):
+    """Sobe o Redis em 127.0.0.1:port. Retorna (processo, url, implementação)."""
+    log = open(os.path.join(workdir, 'redis.log'), 'w')
+    redis_server = shutil.which('redis-server')
+    if redis_server:
+        command = [redis_server, '--bind', '127.0.0.1', '--port', str(port), '--save', '', '--appendonly', 'no']
+        kind = 'redis-server'
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--port', str(port)]
+        kind = 'fakeredis'
+    
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    if not wait_for_port(port):
+        process.kill()
+        raise RuntimeError(f'{kind} não subiu na porta {port}; veja {log.name}')
+    return process, f'redis://127.0.0.1:{port}/0', kind
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        sys.exit('redis-server não encontrado e fakeredis não instalado (pip install fakeredis lupa)')
+    
+    server = TcpFakeServer(('127.0.0.1', args.port), server_type='redis')
+    server.daemon_threads = True
+    print(f'fakeredis ouvindo em 127.0.0.1:{args.port}', flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Cliente Socket.IO mínimo (Engine.IO v4 sobre WebSocket) para os benchmarks.
+
+Usa apenas simple-websocket, já presente em requirements.txt, e responde aos
+pings do servidor. Com o processo sob gevent, cada cliente custa dois greenlets.
+"""
+import json
+import threading
+import time
+from urllib.parse import urlencode
+
+import simple_websocket
+
+class SocketIOClient:
+    def __init__(self, base_url, token, on_event=None, index=None):
+        self.url = base_url.replace('http://', 'ws://').rstrip('/') + '/socket.io/?' + urlencode({
+            'EIO': 4, 'transport': 'websocket'
+        })
+        self.token = token
+        self.on_event = on_event
+        self.index = index
+        self.ws = None
+        self.connected = False
+        self.connect_seconds = None
+        self.received = 0
+    
+    def connect(self, timeout=10):
+        """Abre o WebSocket e entra no namespace '/' com o token. Retorna a latência em segundos."""
+        started = time.perf_counter()
+        self.ws = simple_websocket.Client.connect(self.url)
+        
+        # O pacote de abertura pode chegar no mesmo recv da resposta 101 e ficar retido
+        # no cliente até o próximo dado; por isso o connect do namespace vai sem esperá-lo
+        self.ws.send('40' + json.dumps({'token': self.token}))
+        while True:
+            packet = self.ws.receive(timeout=timeout)
+            if packet is None:
+                raise TimeoutError('namespace connect sem resposta')
+            if packet.startswith('0'):
+                continue
+            if packet == '2':
+                self.ws.send('3')
+            elif packet.startswith('40'):
+                break
+            elif packet.startswith('44'):
+                raise ConnectionError(f'conexão recusada: {packet[2:]}')
+        
+        self.connect_seconds = time.perf_counter() - started
+        self.connected = True
+        reader = threading.Thread(target=self._read, daemon=True)
+        reader.start()
+        return self.connect_seconds
+    
+    def emit(self, event, data):
+        self.ws.send('42' + json.dumps([event, data]))
+    
+    def close(self):
+        self.connected = False
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+    
+    def _read(self):
+        try:
+            while self.connected:
+                packet = self.ws.receive()
+                if packet is None:
+                    continue
+                if packet == '2':
+                    self.ws.send('3')
+                elif packet.startswith('42'):
+                    self.received += 1
+                    if self.on_event:
+                        event, *args = json.loads(packet[2:])
+                        self.on_event(event, args[0] if args else None)
+                elif packet.startswith('41') or packet == '1':
+                    break
+        except Exception:
+            pass
+        self.connected = False
@@ -0,0 +1,307 @@
+"""
+Capacidade de um processo Socket.IO em cada modo assíncrono (threading x gevent).
+
+Para cada modo o benchmark sobe benchmarks/bench_server.py em um subprocesso e:
+  1. abre --idle conexões autenticadas que só respondem aos pings;
+  2. abre --active conexões que entram na sala do projeto e enviam task_update
+     a --rate mensagens/s cada, durante --duration segundos.
+Ele mede as conexões mantidas, a latência de conexão e de entrega (emit ->
+task_updated nos demais clientes) e a CPU, a memória e as threads do servidor
+lidas de /proc (somente Linux).
+
+    python benchmarks/socketio_async_modes.py --modes threading gevent --idle 2000 --active 50
+"""
+# O próprio driver roda sob gevent (se instalado) para manter milhares de clientes
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+from bench_server import BENCH_USER_GID, BENCH_PROJECT_GID, BENCH_TASK_GID
+from sio_client import SocketIOClient
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+JWT_SECRET = 'clareza-bench-secret'
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(seconds):
+    """p50/p95/p99/máx em ms."""
+    ms = [value * 1000 for value in seconds]
+    return {
+        'count': len(ms),
+        'p50_ms': _round(percentile(ms, 50)),
+        'p95_ms': _round(percentile(ms, 95)),
+        'p99_ms': _round(percentile(ms, 99)),
+        'max_ms': _round(max(ms) if ms else None)
+    }
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+def process_sample(pid):
+    """RSS (MB), threads e segundos de CPU acumulados do processo."""
+    status = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            status[key] = value.strip()
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    return {
+        'rss_mb': round(int(status['VmRSS'].split()[0]) / 1024, 1),
+        'threads': int(status['Threads']),
+        'cpu_seconds': (int(fields[11]) + int(fields[12])) / ticks
+    }
+
+def cpu_percent(before, after, wall_seconds):
+    return round((after['cpu_seconds'] - before['cpu_seconds']) / wall_seconds * 100, 1)
+
+def make_token(seconds=3600, user_gid=BENCH_USER_GID):
+    payload = {'user_gid': user_gid, 'exp': datetime.utcnow() + timedelta(seconds=seconds)}
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(mode, workdir, server_args=(), name=None, db_path=None):
+    """Sobe bench_server.py no modo dado. Retorna (processo, url base, log)."""
+    name = name or mode
+    port = free_port()
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, JWT_SECRET=JWT_SECRET)
+    log_path = os.path.join(workdir, f'server-{name}.log')
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'bench_server.py'),
+         '--port', str(port), '--db', db_path or os.path.join(workdir, f'bench-{name}.db'), *server_args],
+        stdout=subprocess.PIPE, stderr=log, text=True, env=env
+    )
+    line = process.stdout.readline()
+    if not line.startswith('ready'):
+        process.kill()
+        raise RuntimeError(f'servidor {name} não subiu; veja {log_path}')
+    
+    # Espera o socket começar a aceitar conexões
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return process, f'http://127.0.0.1:{port}', log_path
+
+def open_clients(base_url, count, token, concurrency, on_event=None):
+    """
+    Abre count clientes com até concurrency handshakes simultâneos. token pode ser
+    uma função índice -> (url base, token) para distribuir usuários e servidores.
+    Retorna (clientes, latências, falhas); clientes fica na ordem de conexão.
+    """
+    clients, latencies, failures = [], [], []
+    lock = threading.Lock()
+    gate = threading.Semaphore(concurrency)
+    
+    def connect_one(index):
+        url, client_token = token(index) if callable(token) else (base_url, token)
+        client = SocketIOClient(url, client_token, on_event=on_event, index=index)
+        with gate:
+            try:
+                seconds = client.connect()
+            except Exception as e:
+                client.close()
+                with lock:
+                    failures.append(str(e))
+                return
+        with lock:
+            clients.append(client)
+            latencies.append(seconds)
+    
+    workers = [threading.Thread(target=connect_one, args=(index,), daemon=True) for index in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return clients, latencies, failures
+
+def run_mode(mode, args, workdir):
+    process, base_url, log_path = start_server(mode, workdir)
+    token = make_token()
+    result = {'mode': mode}
+    try:
+        baseline = process_sample(process.pid)
+        result['baseline'] = {'rss_mb': baseline['rss_mb'], 'threads': baseline['threads']}
+        
+        # Fase 1: conexões ociosas
+        started = time.perf_counter()
+        idle, connect_latencies, failures = open_clients(base_url, args.idle, token, args.concurrency)
+        connect_wall = time.perf_counter() - started
+        
+        before = process_sample(process.pid)
+        time.sleep(args.hold)
+        after = process_sample(process.pid)
+        result['idle'] = {
+            'requested': args.idle,
+            'connected': len(idle),
+            'failed': len(failures),
+            'first_failure': failures[0] if failures else None,
+            'connect_wall_s': round(connect_wall, 2),
+            'connect_latency': latency_summary(connect_latencies),
+            'rss_mb': after['rss_mb'],
+            'threads': after['threads'],
+            'cpu_percent': cpu_percent(before, after, args.hold),
+            'kb_per_connection': round((after['rss_mb'] - baseline['rss_mb']) * 1024 / len(idle), 1) if idle else None
+        }
+        
+        # Fase 2: conexões ativas na sala do projeto
+        deliveries = []
+        deliveries_lock = threading.Lock()
+        
+        def on_event(event, data):
+            if event == 'task_updated':
+                sent_at = (data.get('update_data') or {}).get('sent_at')
+                if sent_at:
+                    with deliveries_lock:
+                        deliveries.append(time.time() - sent_at)
+        
+        active, _, active_failures = open_clients(base_url, args.active, token, args.concurrency, on_event=on_event)
+        for client in active:
+            client.emit('join_project', {'project_gid': BENCH_PROJECT_GID})
+        time.sleep(1)
+        
+        sent = [0]
+        stop = threading.Event()
+        
+        def send_loop(client):
+            interval = 1 / args.rate
+            next_at = time.monotonic()
+            while not stop.is_set() and client.connected:
+                client.emit('task_update', {
+                    'task_gid': BENCH_TASK_GID,
+                    'update_type': 'name_change',
+                    'update_data': {'sent_at': time.time()}
+                })
+                sent[0] += 1
+                next_at += interval
+                stop.wait(max(0, next_at - time.monotonic()))
+        
+        before = process_sample(process.pid)
+        senders = [threading.Thread(target=send_loop, args=(client,), daemon=True) for client in active]
+        for sender in senders:
+            sender.start()
+        time.sleep(args.duration)
+        stop.set()
+        for sender in senders:
+            sender.join()
+        # Entregas ainda em trânsito
+        time.sleep(2)
+        after = process_sample(process.pid)
+        
+        expected = sent[0] * max(len(active) - 1, 0)
+        result['active'] = {
+            'requested': args.active,
+            'connected': len(active),
+            'failed': len(active_failures),
+            'messages_sent': sent[0],
+            'deliveries_expected': expected,
+            'deliveries_received': len(deliveries),
+            'delivery_latency': latency_summary(deliveries),
+            'rss_mb': after['rss_mb'],
+            'threads': after['threads'],
+            'cpu_percent': cpu_percent(before, after, args.duration + 2),
+            'idle_still_connected': sum(1 for client in idle if client.connected)
+        }
+        
+        for client in idle + active:
+            client.close()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    result['server_log'] = log_path
+    return result
+
+def print_report(results):
+    rows = [
+        ('idle conectadas', lambda r: f"{r['idle']['connected']}/{r['idle']['requested']}"),
+        ('conexão p50/p99 ms', lambda r: f"{r['idle']['connect_latency']['p50_ms']}/{r['idle']['connect_latency']['p99_ms']}"),
+        ('idle RSS MB', lambda r: r['idle']['rss_mb']),
+        ('idle KB/conexão', lambda r: r['idle']['kb_per_connection']),
+        ('idle threads', lambda r: r['idle']['threads']),
+        ('idle CPU %', lambda r: r['idle']['cpu_percent']),
+        ('ativas conectadas', lambda r: f"{r['active']['connected']}/{r['active']['requested']}"),
+        ('entregas recebidas', lambda r: f"{r['active']['deliveries_received']}/{r['active']['deliveries_expected']}"),
+        ('entrega p50/p95/p99 ms', lambda r: '/'.join(str(r['active']['delivery_latency'][k]) for k in ('p50_ms', 'p95_ms', 'p99_ms'))),
+        ('ativo CPU %', lambda r: r['active']['cpu_percent']),
+        ('ativo RSS MB', lambda r: r['active']['rss_mb']),
+        ('ativo threads', lambda r: r['active']['threads']),
+        ('idle ainda conectadas', lambda r: r['active']['idle_still_connected'])
+    ]
+    header = f"{'':26}" + ''.join(f"{r['mode']:>22}" for r in results)
+    print(header)
+    for label, value in rows:
+        cells = []
+        for r in results:
+            try:
+                cells.append(f'{value(r)!s:>22}')
+            except (KeyError, TypeError, ZeroDivisionError):
+                cells.append(f"{'-':>22}")
+        print(f'{label:26}' + ''.join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['threading', 'gevent'])
+    parser.add_argument('--idle', type=int, default=1000, help='conexões ociosas')
+    parser.add_argument('--active', type=int, default=50, help='conexões que enviam task_update')
+    parser.add_argument('--rate', type=float, default=1.0, help='task_update/s por conexão ativa')
+    parser.add_argument('--duration', type=float, default=20, help='segundos de tráfego ativo')
+    parser.add_argument('--hold', type=float, default=10, help='segundos medindo as conexões ociosas')
+    parser.add_argument('--concurrency', type=int, default=50, help='handshakes simultâneos')
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    args = parser.parse_args()
+    
+    # Cada conexão usa um descritor no driver e outro no servidor (herda o limite)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    
+    workdir = tempfile.mkdtemp(prefix='clareza-bench-')
+    results = []
+    for mode in args.modes:
+        print(f'== {mode}: {args.idle} ociosas, {args.active} ativas a {args.rate}/s por {args.duration}s', flush=True)
+        try:
+            results.append(run_mode(mode, args, workdir))
+        except Exception as e:
+            print(f'   falhou: {e}', flush=True)
+    
+    if results:
+        print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
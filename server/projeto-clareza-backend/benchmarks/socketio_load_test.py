@@ -0,0 +1,406 @@
+"""
+Teste de carga do servidor em tempo real com um roteiro de tráfego.
+
+Sobe o app de enhanced_main.create_app (benchmarks/bench_server.py), abre --clients
+conexões autenticadas distribuídas entre --users usuários e --projects projetos,
+entra nas salas de projeto e executa as fases do roteiro com task_update e
+typing_indicator. Relata a latência de conexão e de join, a latência ponta a
+ponta dos broadcasts (emit do remetente -> evento nos demais clientes da sala)
+em percentis, as entregas recebidas x esperadas e CPU/memória dos servidores
+lidas de /proc (somente Linux).
+
+    python benchmarks/socketio_load_test.py --clients 500 --users 50 --projects 10
+    python benchmarks/socketio_load_test.py --redis local --servers 2 --script roteiro.json
+
+Com --redis none (padrão) o app roda sem fila de mensagens e sem Redis. --redis
+local sobe um Redis descartável (benchmarks/local_redis.py) e --redis <url> usa
+um existente; nos dois casos o broadcast passa pela fila do Socket.IO, o replay
+e a presença ficam ativos e --servers pode ser maior que 1.
+
+O roteiro é uma lista JSON de fases executadas em sequência:
+
+    [{"name": "aquecimento", "duration": 5, "senders": 0.1, "task_update_rate": 0.5},
+     {"name": "pico", "duration": 20, "senders": 0.5, "task_update_rate": 1, "typing_rate": 2}]
+
+senders é a fração dos clientes que envia e as taxas são eventos/s por remetente.
+Cada indicador de digitação é um par início/fim em um campo próprio, que o
+limitador do servidor deixa passar inteiro.
+"""
+# O próprio driver roda sob gevent (se instalado) para manter milhares de clientes
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from bench_server import bench_user_gid, bench_project_gid, bench_task_gid
+from local_redis import start_local_redis
+from socketio_async_modes import (
+    cpu_percent, free_port, latency_summary, make_token, open_clients, process_sample, start_server
+)
+
+DEFAULT_SCRIPT = [
+    {'name': 'aquecimento', 'duration': 5, 'senders': 0.1, 'task_update_rate': 0.5, 'typing_rate': 0.5},
+    {'name': 'sustentado', 'duration': 20, 'senders': 0.2, 'task_update_rate': 1, 'typing_rate': 1}
+]
+
+# Quanto dura cada indicador de digitação (início -> fim)
+TYPING_HOLD_SECONDS = 0.3
+
+def load_script(path):
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path) as f:
+        phases = json.load(f)
+    for index, phase in enumerate(phases):
+        if not phase.get('duration'):
+            raise ValueError(f'fase {index} sem duration')
+        phase.setdefault('name', f'fase-{index}')
+    return phases
+
+class ServerMonitor:
+    """Amostra CPU, memória e threads dos processos monitorados a cada interval segundos."""
+    
+    def __init__(self, processes, interval=1.0):
+        self.processes = processes
+        self.interval = interval
+        self.peaks = defaultdict(lambda: {'rss_mb': 0, 'threads': 0})
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def sample(self):
+        """{nome: amostra} de todos os processos ainda vivos."""
+        samples = {}
+        for name, process in self.processes.items():
+            try:
+                samples[name] = process_sample(process.pid)
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+        return samples
+    
+    def reset_peaks(self):
+        self.peaks.clear()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for name, sample in self.sample().items():
+                peak = self.peaks[name]
+                peak['rss_mb'] = max(peak['rss_mb'], sample['rss_mb'])
+                peak['threads'] = max(peak['threads'], sample['threads'])
+
+def resource_summary(monitor, before, after, wall_seconds):
+    """CPU médio e picos de memória/threads por processo entre duas amostras."""
+    summary = {}
+    for name, end in after.items():
+        if name not in before:
+            continue
+        peak = monitor.peaks.get(name, {})
+        summary[name] = {
+            'cpu_percent': cpu_percent(before[name], end, wall_seconds),
+            'rss_mb': end['rss_mb'],
+            'rss_mb_peak': max(peak.get('rss_mb', 0), end['rss_mb']),
+            'threads_peak': max(peak.get('threads', 0), end['threads'])
+        }
+    return summary
+
+class LoadRecorder:
+    """Latências de entrega por (fase, evento), a partir do horário de envio que viaja no payload."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deliveries = defaultdict(list)
+        self.sent = Counter()
+        self.expected = Counter()
+        self.joined = {}
+        # O fim da digitação repete o campo do início; o horário do envio fica aqui
+        self.typing_stops = {}
+    
+    def record_sent(self, phase, event, fanout):
+        with self.lock:
+            self.sent[(phase, event)] += 1
+            self.expected[(phase, event)] += fanout
+    
+    def on_event(self, client, event, data):
+        now = time.time()
+        if event == 'task_updated':
+            marker = (data.get('update_data') or {}).get('load')
+            if marker:
+                self._delivered(marker['phase'], 'task_updated', now - marker['sent_at'])
+        elif event == 'typing_indicator':
+            # Campo 'load|<fase>|<cliente>|<envio do início>'
+            field = data.get('field') or ''
+            parts = field.split('|')
+            if len(parts) == 4 and parts[0] == 'load':
+                sent_at = float(parts[3]) if data.get('is_typing') else self.typing_stops.get(field)
+                if sent_at is not None:
+                    self._delivered(parts[1], 'typing_indicator', now - sent_at)
+        elif event == 'joined_project':
+            sent_at = getattr(client, 'join_sent_at', None)
+            if sent_at is not None:
+                with self.lock:
+                    self.joined[client.index] = now - sent_at
+    
+    def _delivered(self, phase, event, seconds):
+        with self.lock:
+            self.deliveries[(phase, event)].append(seconds)
+
+def client_target(client_index, args):
+    """Usuário, projeto e servidor de cada cliente (round-robin)."""
+    return (
+        bench_user_gid(client_index % args.users),
+        client_index % args.projects,
+        client_index % args.servers
+    )
+
+def join_rooms(clients, recorder, args):
+    for client in clients:
+        _, project_index, _ = client_target(client.index, args)
+        client.project_index = project_index
+        client.on_event = lambda event, data, client=client: recorder.on_event(client, event, data)
+        client.join_sent_at = time.time()
+        client.emit('join_project', {'project_gid': bench_project_gid(project_index)})
+    
+    deadline = time.monotonic() + args.join_timeout
+    while len(recorder.joined) < len(clients) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    
+    joined = [client for client in clients if client.index in recorder.joined]
+    return joined
+
+def run_phase(phase, clients, room_sizes, recorder, args):
+    """Executa uma fase do roteiro; cada remetente tem um laço por tipo de evento."""
+    name = phase['name']
+    duration = phase['duration']
+    sender_count = max(1, int(round(len(clients) * phase.get('senders', 1.0)))) if clients else 0
+    senders = clients[:sender_count]
+    stop = threading.Event()
+    
+    def fanout(client):
+        return room_sizes[client.project_index] - 1
+    
+    def send_task_update(client):
+        client.emit('task_update', {
+            'task_gid': bench_task_gid(client.project_index),
+            'update_type': 'name_change',
+            'update_data': {'load': {'phase': name, 'sent_at': time.time()}}
+        })
+        recorder.record_sent(name, 'task_updated', fanout(client))
+    
+    def send_typing(client):
+        field = f'load|{name}|{client.index}|{time.time():.6f}'
+        target = {'target_type': 'task', 'target_gid': bench_task_gid(client.project_index), 'field': field}
+        client.emit('typing_indicator', dict(target, is_typing=True))
+        recorder.record_sent(name, 'typing_indicator', fanout(client))
+        if not stop.wait(TYPING_HOLD_SECONDS) and client.connected:
+            recorder.typing_stops[field] = time.time()
+            client.emit('typing_indicator', dict(target, is_typing=False))
+            recorder.record_sent(name, 'typing_indicator', fanout(client))
+    
+    def loop(client, rate, send):
+        interval = 1 / rate
+        # Remetentes defasados para não enviarem todos no mesmo instante
+        next_at = time.monotonic() + interval * (client.index % 97) / 97
+        stop.wait(max(0, next_at - time.monotonic()))
+        while not stop.is_set() and client.connected:
+            send(client)
+            next_at += interval
+            stop.wait(max(0, next_at - time.monotonic()))
+    
+    workers = []
+    for rate_key, send in (('task_update_rate', send_task_update), ('typing_rate', send_typing)):
+        rate = phase.get(rate_key) or 0
+        if rate > 0:
+            workers += [threading.Thread(target=loop, args=(client, rate, send), daemon=True) for client in senders]
+    
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sender_count
+
+def phase_report(phase, sender_count, recorder, resources):
+    name = phase['name']
+    events = {}
+    for event in ('task_updated', 'typing_indicator'):
+        key = (name, event)
+        if not recorder.sent[key]:
+            continue
+        events[event] = {
+            'sent': recorder.sent[key],
+            'deliveries_expected': recorder.expected[key],
+            'deliveries_received': len(recorder.deliveries[key]),
+            'latency': latency_summary(recorder.deliveries[key])
+        }
+    return {
+        'name': name,
+        'duration_s': phase['duration'],
+        'senders': sender_count,
+        'events': events,
+        'resources': resources
+    }
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='clareza-load-')
+    script = load_script(args.script)
+    processes = {}
+    redis_kind = None
+    
+    try:
+        redis_url = ''
+        if args.redis == 'local':
+            processes['redis'], redis_url, redis_kind = start_local_redis(free_port(), workdir)
+        elif args.redis != 'none':
+            redis_url, redis_kind = args.redis, 'externo'
+        if args.servers > 1 and not redis_url:
+            raise ValueError('--servers > 1 precisa de --redis (local ou URL)')
+        
+        # O primeiro servidor popula o banco; os demais compartilham o mesmo SQLite
+        db_path = os.path.join(workdir, 'load.db')
+        urls = []
+        for index in range(args.servers):
+            server_args = [
+                '--users', str(args.users), '--projects', str(args.projects),
+                '--message-queue', redis_url, '--redis-url', redis_url
+            ]
+            if index:
+                server_args.append('--no-seed')
+            process, url, _ = start_server(args.mode, workdir, server_args, name=f'{args.mode}-{index}', db_path=db_path)
+            processes[f'server-{index}'] = process
+            urls.append(url)
+        
+        monitor = ServerMonitor(processes)
+        monitor.start()
+        result = {
+            'mode': args.mode,
+            'servers': args.servers,
+            'redis': redis_kind,
+            'clients': args.clients,
+            'users': args.users,
+            'projects': args.projects,
+            'workdir': workdir
+        }
+        result['baseline'] = monitor.sample()
+        
+        tokens = {bench_user_gid(i): make_token(user_gid=bench_user_gid(i)) for i in range(args.users)}
+        
+        def target(index):
+            user_gid, _, server_index = client_target(index, args)
+            return urls[server_index], tokens[user_gid]
+        
+        started = time.perf_counter()
+        clients, connect_latencies, failures = open_clients(urls[0], args.clients, target, args.concurrency)
+        result['connect'] = {
+            'connected': len(clients),
+            'failed': len(failures),
+            'first_failure': failures[0] if failures else None,
+            'wall_s': round(time.perf_counter() - started, 2),
+            'latency': latency_summary(connect_latencies)
+        }
+        
+        recorder = LoadRecorder()
+        joined = join_rooms(clients, recorder, args)
+        result['join'] = {
+            'joined': len(joined),
+            'latency': latency_summary(list(recorder.joined.values()))
+        }
+        result['after_join'] = monitor.sample()
+        
+        room_sizes = Counter(client.project_index for client in joined)
+        # Conexões que caíram durante as fases continuam contando como destino esperado
+        result['phases'] = []
+        for phase in script:
+            print(f"== fase {phase['name']}: {phase['duration']} s", flush=True)
+            monitor.reset_peaks()
+            before = monitor.sample()
+            sender_count = run_phase(phase, joined, room_sizes, recorder, args)
+            after = monitor.sample()
+            resources = resource_summary(monitor, before, after, phase['duration'])
+            # Entregas ainda em trânsito entram na fase em que foram enviadas
+            time.sleep(args.drain)
+            result['phases'].append(phase_report(phase, sender_count, recorder, resources))
+        
+        result['still_connected'] = sum(1 for client in clients if client.connected)
+        monitor.stop()
+        for client in clients:
+            client.close()
+        return result
+    finally:
+        # Servidores antes do Redis, para não registrarem erros de conexão na saída
+        for process in reversed(list(processes.values())):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def _latency_line(summary):
+    return '/'.join(str(summary[key]) for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+
+def print_report(result):
+    print(f"\nmodo {result['mode']}, {result['servers']} servidor(es), redis: {result['redis'] or 'sem fila'}")
+    connect = result['connect']
+    print(f"conexões       {connect['connected']}/{result['clients']} em {connect['wall_s']} s, "
+          f"p50/p95/p99/máx {_latency_line(connect['latency'])} ms")
+    if connect['first_failure']:
+        print(f"               primeira falha: {connect['first_failure']}")
+    print(f"joins          {result['join']['joined']}/{connect['connected']}, "
+          f"p50/p95/p99/máx {_latency_line(result['join']['latency'])} ms")
+    for name, sample in result['after_join'].items():
+        print(f"{name:14} após joins: RSS {sample['rss_mb']} MB, {sample['threads']} threads")
+    
+    for phase in result['phases']:
+        print(f"\nfase {phase['name']} ({phase['duration_s']} s, {phase['senders']} remetentes)")
+        for event, stats in phase['events'].items():
+            print(f"  {event:18} enviados {stats['sent']:>7}  entregas {stats['deliveries_received']}/{stats['deliveries_expected']}"
+                  f"  p50/p95/p99/máx {_latency_line(stats['latency'])} ms")
+        for name, stats in phase['resources'].items():
+            print(f"  {name:18} CPU {stats['cpu_percent']}%  RSS {stats['rss_mb']} MB (pico {stats['rss_mb_peak']})"
+                  f"  threads (pico) {stats['threads_peak']}")
+    print(f"\nainda conectados ao final: {result['still_connected']}/{connect['connected']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', default='gevent', choices=['threading', 'gevent'], help='SOCKETIO_ASYNC_MODE dos servidores')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--users', type=int, default=20, help='usuários distintos (clientes distribuídos em round-robin)')
+    parser.add_argument('--projects', type=int, default=5, help='salas de projeto')
+    parser.add_argument('--servers', type=int, default=1, help='processos Socket.IO (com --redis)')
+    parser.add_argument('--redis', default='none', help="none, local ou a URL de um Redis existente")
+    parser.add_argument('--script', help='roteiro JSON de fases (padrão: aquecimento + sustentado)')
+    parser.add_argument('--concurrency', type=int, default=50, help='handshakes simultâneos')
+    parser.add_argument('--join-timeout', type=float, default=30)
+    parser.add_argument('--drain', type=float, default=2, help='segundos aguardando entregas após cada fase')
+    parser.add_argument('--json', help='grava o resultado neste arquivo')
+    args = parser.parse_args()
+    
+    # Cada conexão usa um descritor no driver e outro no servidor (herda o limite)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
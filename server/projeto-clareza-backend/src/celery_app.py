@@ -1,4 +1,7 @@
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init, task_prerun, task_postrun
+from flask import Flask, has_app_context
 from src.config import Config
 import os
 
@@ -24,6 +27,39 @@ def make_celery(app=None):
         worker_max_tasks_per_child=1000,
     )
     
+    # Tarefas periódicas (celery beat)
+    # Com particionamento, meses expirados vão para o arquivo frio em vez de serem apagados
+    if Config.ACTIVITY_PARTITIONING:
+        celery.conf.beat_schedule = {
+            'maintain-activity-partitions': {
+                'task': 'src.tasks.automation_tasks.maintain_activity_partitions',
+                'schedule': crontab(hour=3, minute=0),
+                'kwargs': {'retention_days': Config.ACTIVITY_RETENTION_DAYS},
+            },
+        }
+    else:
+        celery.conf.beat_schedule = {
+            'cleanup-old-activities': {
+                'task': 'src.tasks.automation_tasks.cleanup_old_activities',
+                'schedule': crontab(hour=3, minute=0),
+                'kwargs': {'days_old': Config.ACTIVITY_RETENTION_DAYS},
+            },
+        }
+    
+    # Itens da caixa de entrada expiram independentemente do feed (lidos antes, não lidos no limite de idade)
+    celery.conf.beat_schedule['cleanup-activity-inbox'] = {
+        'task': 'src.tasks.automation_tasks.cleanup_activity_inbox',
+        'schedule': crontab(hour=3, minute=30),
+    }
+    
+    # Atualização opcional dos nomes gravados nas atividades (entidades renomeadas)
+    if Config.ACTIVITY_NAME_REFRESH_ENABLED:
+        celery.conf.beat_schedule['refresh-activity-display-names'] = {
+            'task': 'src.tasks.automation_tasks.refresh_activity_display_names',
+            'schedule': crontab(minute=15),
+            'kwargs': {'days': Config.ACTIVITY_NAME_REFRESH_DAYS},
+        }
+    
     if app:
         class ContextTask(celery.Task):
             """Make celery tasks work with Flask app context."""
@@ -32,9 +68,53 @@ def make_celery(app=None):
                     return self.run(*args, **kwargs)
         
         celery.Task = ContextTask
+        
+        # Permite ao buffer de atividades gravar no desligamento do worker
+        from src.tasks.activity_writer import activity_writer
+        activity_writer.init_app(app)
     
     return celery
 
 # Instância global do Celery
 celery = make_celery()
 
+# App Flask do worker iniciado com `celery -A src.celery_app`, que não passa pelo create_app
+_worker_app = None
+_task_contexts = {}
+
+def make_worker_app():
+    """App mínimo (configuração e banco) para as tarefas do worker."""
+    from src.config import config
+    from src.models.enhanced_work_graph import db
+    
+    app = Flask('projeto_clareza_worker')
+    app.config.from_object(config[os.environ.get('FLASK_CONFIG', 'development')])
+    db.init_app(app)
+    return app
+
+@worker_init.connect
+def _bind_worker_app(**kwargs):
+    """
+    Vincula um app ao worker sem app: as tarefas passam a rodar em um app
+    context e o buffer de atividades ganha o timer de gravação e a gravação no
+    desligamento. Os processos filhos do prefork herdam o app.
+    """
+    global _worker_app
+    from src.tasks.activity_writer import activity_writer
+    if activity_writer.app is not None:
+        return
+    _worker_app = make_worker_app()
+    activity_writer.init_app(_worker_app)
+
+@task_prerun.connect
+def _push_worker_app_context(task_id=None, **kwargs):
+    if _worker_app is not None and not has_app_context():
+        context = _worker_app.app_context()
+        context.push()
+        _task_contexts[task_id] = context
+
+@task_postrun.connect
+def _pop_worker_app_context(task_id=None, **kwargs):
+    context = _task_contexts.pop(task_id, None)
+    if context is not None:
+        context.pop()
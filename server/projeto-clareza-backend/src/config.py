@@ -22,8 +22,58 @@ class Config:
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
     
+    # Automation Configuration
+    AUTOMATION_MAX_CASCADE_DEPTH = int(os.environ.get('AUTOMATION_MAX_CASCADE_DEPTH') or 5)
+    AUTOMATION_MAX_CASCADE_OPERATIONS = int(os.environ.get('AUTOMATION_MAX_CASCADE_OPERATIONS') or 500)
+    AUTOMATION_SIMULATION_MAX_TASKS = int(os.environ.get('AUTOMATION_SIMULATION_MAX_TASKS') or 5000)
+    AUTOMATION_BATCH_WINDOW_SECONDS = float(os.environ.get('AUTOMATION_BATCH_WINDOW_SECONDS') or 1)
+    AUTOMATION_BATCH_SIZE = int(os.environ.get('AUTOMATION_BATCH_SIZE') or 200)
+    
+    # Activity Feed Configuration
+    ACTIVITY_WRITER_MAX_BATCH = int(os.environ.get('ACTIVITY_WRITER_MAX_BATCH') or 500)
+    ACTIVITY_WRITER_MAX_DELAY_SECONDS = float(os.environ.get('ACTIVITY_WRITER_MAX_DELAY_SECONDS') or 2)
+    ACTIVITY_WRITER_MAX_BUFFER = int(os.environ.get('ACTIVITY_WRITER_MAX_BUFFER') or 10000)
+    ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS') or 30)
+    ACTIVITY_PURGE_BATCH_SIZE = int(os.environ.get('ACTIVITY_PURGE_BATCH_SIZE') or 1000)
+    ACTIVITY_PURGE_SLEEP_SECONDS = float(os.environ.get('ACTIVITY_PURGE_SLEEP_SECONDS') or 0.1)
+    ACTIVITY_PURGE_MAX_RUNTIME_SECONDS = int(os.environ.get('ACTIVITY_PURGE_MAX_RUNTIME_SECONDS') or 600)
+    ACTIVITY_INBOX_ENABLED = os.environ.get('ACTIVITY_INBOX_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # Retenção da caixa de entrada: itens lidos expiram antes; o limite de idade vale também para os não lidos
+    ACTIVITY_INBOX_READ_RETENTION_DAYS = int(os.environ.get('ACTIVITY_INBOX_READ_RETENTION_DAYS') or 30)
+    ACTIVITY_INBOX_MAX_AGE_DAYS = int(os.environ.get('ACTIVITY_INBOX_MAX_AGE_DAYS') or 90)
+    ACTIVITY_NAME_REFRESH_ENABLED = os.environ.get('ACTIVITY_NAME_REFRESH_ENABLED', 'false').lower() in ['true', 'on', '1']
+    ACTIVITY_NAME_REFRESH_DAYS = int(os.environ.get('ACTIVITY_NAME_REFRESH_DAYS') or 30)
+    ACTIVITY_STREAM_ENABLED = os.environ.get('ACTIVITY_STREAM_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ACTIVITY_STREAM_MAXLEN = int(os.environ.get('ACTIVITY_STREAM_MAXLEN') or 10000)
+    ACTIVITY_STREAM_HEARTBEAT_SECONDS = int(os.environ.get('ACTIVITY_STREAM_HEARTBEAT_SECONDS') or 15)
+    ACTIVITY_PARTITIONING = os.environ.get('ACTIVITY_PARTITIONING', 'false').lower() in ['true', 'on', '1']
+    ACTIVITY_PARTITION_MONTHS_AHEAD = int(os.environ.get('ACTIVITY_PARTITION_MONTHS_AHEAD') or 2)
+    # Fora do repositório por padrão: o arquivo frio não pode ir parar no deploy nem no git
+    ACTIVITY_ARCHIVE_DIR = os.environ.get('ACTIVITY_ARCHIVE_DIR') or os.path.join(
+        os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+        'projeto-clareza', 'archive', 'activity_feed'
+    )
+    
+    # Reports Configuration
+    BURNDOWN_CACHE_TTL_SECONDS = int(os.environ.get('BURNDOWN_CACHE_TTL_SECONDS') or 86400)
+    
     # WebSocket Configuration
-    SOCKETIO_REDIS_URL = REDIS_URL
+    # Vazio desativa a fila de mensagens (um único processo, ex.: benchmarks)
+    SOCKETIO_REDIS_URL = os.environ.get('SOCKETIO_REDIS_URL', REDIS_URL)
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE') or 'threading'
+    WEBSOCKET_AUTH_CHECK_SECONDS = int(os.environ.get('WEBSOCKET_AUTH_CHECK_SECONDS') or 60)
+    WEBSOCKET_TYPING_THROTTLE_SECONDS = float(os.environ.get('WEBSOCKET_TYPING_THROTTLE_SECONDS') or 2)
+    WEBSOCKET_TASK_ROOM_CACHE_TTL_SECONDS = int(os.environ.get('WEBSOCKET_TASK_ROOM_CACHE_TTL_SECONDS') or 300)
+    WEBSOCKET_TASK_ROOM_CACHE_SIZE = int(os.environ.get('WEBSOCKET_TASK_ROOM_CACHE_SIZE') or 10000)
+    WEBSOCKET_BROADCAST_QUEUE_SIZE = int(os.environ.get('WEBSOCKET_BROADCAST_QUEUE_SIZE') or 10000)
+    WEBSOCKET_BROADCAST_WORKERS = int(os.environ.get('WEBSOCKET_BROADCAST_WORKERS') or 2)
+    WEBSOCKET_ROOM_LOG_ENABLED = os.environ.get('WEBSOCKET_ROOM_LOG_ENABLED', 'true').lower() in ['true', 'on', '1']
+    WEBSOCKET_ROOM_LOG_MAXLEN = int(os.environ.get('WEBSOCKET_ROOM_LOG_MAXLEN') or 1000)
+    WEBSOCKET_ROOM_LOG_TTL_SECONDS = int(os.environ.get('WEBSOCKET_ROOM_LOG_TTL_SECONDS') or 86400)
+    WEBSOCKET_PRESENCE_TTL_SECONDS = int(os.environ.get('WEBSOCKET_PRESENCE_TTL_SECONDS') or 90)
+    WEBSOCKET_PRESENCE_HEARTBEAT_SECONDS = int(os.environ.get('WEBSOCKET_PRESENCE_HEARTBEAT_SECONDS') or 30)
+    WEBSOCKET_ROOM_ACCESS_CACHE_TTL_SECONDS = int(os.environ.get('WEBSOCKET_ROOM_ACCESS_CACHE_TTL_SECONDS') or 300)
+    WEBSOCKET_ROOM_ACCESS_CACHE_SIZE = int(os.environ.get('WEBSOCKET_ROOM_ACCESS_CACHE_SIZE') or 10000)
     
     # CORS Configuration
     CORS_ORIGINS = ['http://localhost:3000', 'http://127.0.0.1:3000']
@@ -3,6 +3,10 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+# Com SOCKETIO_ASYNC_MODE=gevent o monkey patching precisa anteceder os demais imports
+from src.websocket.async_mode import monkey_patch, configured_async_mode
+monkey_patch()
+
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_socketio import SocketIO
@@ -17,7 +21,12 @@ from src.routes.user import user_bp
 from src.routes.enhanced_tasks import enhanced_tasks_bp
 from src.routes.custom_fields import custom_fields_bp
 from src.routes.automation_rules import automation_rules_bp
-from src.websocket.events import init_websocket_events
+from src.routes.activity_feed import activity_feed_bp
+from src.routes.project_reports import project_reports_bp
+from src.routes.project_presence import project_presence_bp
+from src.tasks.activity_partitions import init_activity_storage
+from src.tasks.burndown_cache import init_burndown_invalidation
+from src.websocket.events import init_websocket_events, broadcast_publisher
 import redis
 import logging
 
@@ -37,11 +46,12 @@ def create_app(config_name=None):
     CORS(app, origins=app.config['CORS_ORIGINS'])
     
     # Initialize SocketIO with Redis for scaling
+    # O modo vem do mesmo ponto que o monkey patching, validado e normalizado
     socketio = SocketIO(
         app,
         cors_allowed_origins=app.config['CORS_ORIGINS'],
-        message_queue=app.config['SOCKETIO_REDIS_URL'],
-        async_mode='threading'
+        message_queue=app.config['SOCKETIO_REDIS_URL'] or None,
+        async_mode=configured_async_mode()
     )
     
     # Initialize Celery
@@ -51,6 +61,9 @@ def create_app(config_name=None):
     # Initialize WebSocket events
     init_websocket_events(socketio)
     
+    # Mudanças de tarefas em dias encerrados invalidam o cache de burndown
+    init_burndown_invalidation()
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(projects_bp, url_prefix='/api')
@@ -60,6 +73,9 @@ def create_app(config_name=None):
     app.register_blueprint(enhanced_tasks_bp)
     app.register_blueprint(custom_fields_bp)
     app.register_blueprint(automation_rules_bp)
+    app.register_blueprint(activity_feed_bp)
+    app.register_blueprint(project_reports_bp)
+    app.register_blueprint(project_presence_bp)
     
     # Health check endpoint
     @app.route('/health')
@@ -72,7 +88,11 @@ def create_app(config_name=None):
             r = redis.from_url(app.config['REDIS_URL'])
             r.ping()
             
-            return {'status': 'healthy', 'services': {'database': 'ok', 'redis': 'ok'}}, 200
+            return {
+                'status': 'healthy',
+                'services': {'database': 'ok', 'redis': 'ok'},
+                'broadcasts': broadcast_publisher.stats()
+            }, 200
         except Exception as e:
             logger.error(f"Health check failed: {str(e)}")
             return {'status': 'unhealthy', 'error': str(e)}, 500
@@ -84,7 +104,7 @@ def create_app(config_name=None):
         static_folder_path = app.static_folder
         if static_folder_path is None:
             return "Static folder not configured", 404
-
+        
         if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
             return send_from_directory(static_folder_path, path)
         else:
@@ -97,6 +117,8 @@ def create_app(config_name=None):
     # Create tables
     with app.app_context():
         try:
+            # Com ACTIVITY_PARTITIONING, activity_feed é criada particionada antes do create_all
+            init_activity_storage()
             db.create_all()
             logger.info("Database tables created successfully")
         except Exception as e:
@@ -113,6 +135,6 @@ if __name__ == '__main__':
         debug=app.config['DEBUG'],
         host='0.0.0.0',
         port=5001,
-        allow_unsafe_werkzeug=True  # For development only
+        allow_unsafe_werkzeug=True  # For development only (ignored with gevent)
     )
 
@@ -17,6 +17,26 @@ task_dependencies = db.Table('task_dependencies',
     db.Column('dependency_task_gid', db.String(36), db.ForeignKey('tasks.gid'), primary_key=True)
 )
 
+# Seguidores de tarefas (mesma tabela de TaskFollower em work_graph.py)
+task_followers = db.Table('task_followers',
+    db.Column('task_gid', db.String(36), db.ForeignKey('tasks.gid'), primary_key=True),
+    db.Column('user_gid', db.String(36), db.ForeignKey('users.gid'), primary_key=True)
+)
+
+# Membros de projetos (mesma tabela de ProjectMembership em work_graph.py)
+project_memberships = db.Table('project_memberships',
+    db.Column('project_gid', db.String(36), db.ForeignKey('projects.gid'), primary_key=True),
+    db.Column('user_gid', db.String(36), db.ForeignKey('users.gid'), primary_key=True),
+    db.Column('role', db.String(50), nullable=False, default='member')
+)
+
+# Membros de workspaces (mesma tabela de WorkspaceMembership em work_graph.py)
+workspace_memberships = db.Table('workspace_memberships',
+    db.Column('workspace_gid', db.String(36), db.ForeignKey('workspaces.gid'), primary_key=True),
+    db.Column('user_gid', db.String(36), db.ForeignKey('users.gid'), primary_key=True),
+    db.Column('role', db.String(50), nullable=False, default='member')
+)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -147,6 +167,7 @@ class Task(db.Model):
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     resource_subtype = db.Column(db.String(50))  # default_task, milestone, approval
+    version = db.Column(db.Integer, nullable=False, default=1)  # Incrementada a cada mudança transmitida
     
     # Relacionamentos
     projects = db.relationship('Project', secondary=task_projects, back_populates='tasks')
@@ -179,6 +200,7 @@ class Task(db.Model):
             'modified_at': self.modified_at.isoformat() if self.modified_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'resource_subtype': self.resource_subtype,
+            'version': self.version,
             'project_gids': [project.gid for project in self.projects],
             'dependency_gids': [dep.gid for dep in self.dependencies],
             'dependent_gids': [dep.gid for dep in self.dependents]
@@ -277,6 +299,13 @@ class AutomationRule(db.Model):
 
 class ActivityFeed(db.Model):
     __tablename__ = 'activity_feed'
+    __table_args__ = (
+        # Paginação por cursor (created_at, gid) dentro de workspace/projeto
+        db.Index('ix_activity_feed_workspace_created', 'workspace_gid', 'created_at', 'gid'),
+        db.Index('ix_activity_feed_project_created', 'project_gid', 'created_at', 'gid'),
+        # Varredura por idade na limpeza de retenção
+        db.Index('ix_activity_feed_created_at', 'created_at', 'gid'),
+    )
     
     gid = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     resource_type = db.Column(db.String(50), default='activity')
@@ -289,6 +318,11 @@ class ActivityFeed(db.Model):
     data = db.Column(db.Text)  # JSON string com dados adicionais
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Snapshot dos nomes no momento da gravação, para exibir o feed sem joins
+    actor_name = db.Column(db.String(255))
+    target_name = db.Column(db.String(255))
+    project_name = db.Column(db.String(255))
+    
     # Relacionamentos
     actor = db.relationship('User', backref='activities')
     
@@ -303,6 +337,88 @@ class ActivityFeed(db.Model):
             'project_gid': self.project_gid,
             'workspace_gid': self.workspace_gid,
             'data': json.loads(self.data) if self.data else {},
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'actor_name': self.actor_name,
+            'target_name': self.target_name,
+            'project_name': self.project_name
+        }
+
+class ActivityDailyRollup(db.Model):
+    __tablename__ = 'activity_daily_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('workspace_gid', 'project_gid', 'day', 'event_type', 'actor_gid',
+                            name='uq_activity_daily_rollup_key'),
+        db.Index('ix_activity_daily_rollups_project_day', 'project_gid', 'day'),
+    )
+    
+    # project_gid e actor_gid usam '' quando ausentes para que a chave única funcione no upsert
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    workspace_gid = db.Column(db.String(36), nullable=False)
+    project_gid = db.Column(db.String(36), nullable=False, default='')
+    day = db.Column(db.Date, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    actor_gid = db.Column(db.String(36), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    latest_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'workspace_gid': self.workspace_gid,
+            'project_gid': self.project_gid or None,
+            'day': self.day.isoformat() if self.day else None,
+            'event_type': self.event_type,
+            'actor_gid': self.actor_gid or None,
+            'count': self.count,
+            'latest_at': self.latest_at.isoformat() if self.latest_at else None
+        }
+
+class ActivityInboxItem(db.Model):
+    __tablename__ = 'activity_inbox'
+    __table_args__ = (
+        # Leitura da caixa de entrada: um range scan por usuário, do id mais recente para trás
+        db.Index('ix_activity_inbox_user_id', 'user_gid', 'id'),
+        db.UniqueConstraint('user_gid', 'activity_gid', name='uq_activity_inbox_user_activity'),
+    )
+    
+    # Cópia dos campos da atividade para que a leitura não dependa de activity_feed
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    user_gid = db.Column(db.String(36), db.ForeignKey('users.gid'), nullable=False)
+    activity_gid = db.Column(db.String(36), nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # assignee, follower, member, owner
+    event_type = db.Column(db.String(50), nullable=False)
+    actor_gid = db.Column(db.String(36))
+    target_gid = db.Column(db.String(36))
+    target_type = db.Column(db.String(50))
+    project_gid = db.Column(db.String(36))
+    workspace_gid = db.Column(db.String(36), nullable=False)
+    data = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    actor_name = db.Column(db.String(255))
+    target_name = db.Column(db.String(255))
+    project_name = db.Column(db.String(255))
+    read_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'activity_gid': self.activity_gid,
+            'reason': self.reason,
+            'event_type': self.event_type,
+            'actor_gid': self.actor_gid,
+            'target_gid': self.target_gid,
+            'target_type': self.target_type,
+            'project_gid': self.project_gid,
+            'workspace_gid': self.workspace_gid,
+            'data': json.loads(self.data) if self.data else {},
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'actor_name': self.actor_name,
+            'target_name': self.target_name,
+            'project_name': self.project_name,
+            'read_at': self.read_at.isoformat() if self.read_at else None
         }
 
+class ActivityInboxCounter(db.Model):
+    __tablename__ = 'activity_inbox_counters'
+    
+    user_gid = db.Column(db.String(36), db.ForeignKey('users.gid'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
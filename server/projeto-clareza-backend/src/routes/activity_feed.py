@@ -1,11 +1,20 @@
-from flask import Blueprint, request, jsonify, g
-from src.models.enhanced_work_graph import db, ActivityFeed, User, Task, Project
-from src.routes.auth import auth_required
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
+from src.models.enhanced_work_graph import (
+    db, ActivityFeed, ActivityDailyRollup, ActivityInboxItem, User, Task, Project, project_memberships, workspace_memberships
+)
+from src.routes.auth import auth_required, verify_token
+from src.config import Config
+from src.tasks.activity_inbox import mark_read, unread_count
+from src.tasks.activity_stream import latest_stream_id, oldest_stream_id, read_activity_stream, parse_stream_id
 from datetime import datetime, timedelta
+import base64
 import json
 
 activity_feed_bp = Blueprint('activity_feed', __name__)
 
+# Atores listados por tipo de evento no resumo (os mais recentes primeiro)
+SUMMARY_RECENT_ACTORS_LIMIT = 10
+
 @activity_feed_bp.route('/api/activity-feed', methods=['GET'])
 @auth_required
 def get_activity_feed():
@@ -18,6 +27,8 @@ def get_activity_feed():
         event_type = request.args.get('event_type')
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total')  # 'exact' ou 'estimate'
         
         # Filtro de data (últimos N dias)
         days = int(request.args.get('days', 30))
@@ -36,62 +47,72 @@ def get_activity_feed():
         if event_type:
             query = query.filter_by(event_type=event_type)
         
-        # Ordenar por data (mais recente primeiro)
-        query = query.order_by(ActivityFeed.created_at.desc())
+        filtered_query = query
         
-        # Paginação
-        activities = query.offset(offset).limit(limit).all()
+        # Ordenar por data (mais recente primeiro)
+        query = query.order_by(ActivityFeed.created_at.desc(), ActivityFeed.gid.desc())
+        
+        # Paginação por cursor em (created_at, gid); offset mantido por compatibilidade
+        if cursor:
+            cursor_created_at, cursor_gid = _decode_cursor(cursor)
+            query = query.filter(db.or_(
+                ActivityFeed.created_at < cursor_created_at,
+                db.and_(ActivityFeed.created_at == cursor_created_at, ActivityFeed.gid < cursor_gid)
+            ))
+        elif offset:
+            query = query.offset(offset)
+        
+        # Buscar um registro a mais para saber se há próxima página
+        activities = query.limit(limit + 1).all()
+        has_more = len(activities) > limit
+        activities = activities[:limit]
+        
+        # Enriquecer com os nomes gravados na atividade; live_relations=true consulta as tabelas
+        related = _related_for(activities, _live_relations())
         
-        # Enriquecer dados com informações relacionadas
         result = []
         for activity in activities:
             activity_data = activity.to_dict()
             
             # Adicionar dados do ator
-            if activity.actor:
-                activity_data['actor'] = {
-                    'gid': activity.actor.gid,
-                    'name': activity.actor.name,
-                    'email': activity.actor.email
-                }
+            actor = related['actors'].get(activity.actor_gid)
+            if actor:
+                activity_data['actor'] = actor
             
             # Adicionar dados do alvo baseado no tipo
-            if activity.target_type == 'task' and activity.target_gid:
-                task = Task.query.get(activity.target_gid)
-                if task:
-                    activity_data['target'] = {
-                        'gid': task.gid,
-                        'name': task.name,
-                        'completed': task.completed
-                    }
-            elif activity.target_type == 'project' and activity.target_gid:
-                project = Project.query.get(activity.target_gid)
-                if project:
-                    activity_data['target'] = {
-                        'gid': project.gid,
-                        'name': project.name
-                    }
+            target = _related_target(activity, related)
+            if target:
+                activity_data['target'] = target
             
             # Adicionar dados do projeto se disponível
-            if activity.project_gid:
-                project = Project.query.get(activity.project_gid)
-                if project:
-                    activity_data['project'] = {
-                        'gid': project.gid,
-                        'name': project.name
-                    }
+            project = related['projects'].get(activity.project_gid)
+            if project:
+                activity_data['project'] = project
             
             result.append(activity_data)
         
+        pagination = {
+            'limit': limit,
+            'offset': offset,
+            'has_more': has_more,
+            'next_cursor': _encode_cursor(activities[-1]) if has_more else None
+        }
+        
+        # Total só quando solicitado: contagem exata ou estimativa barata
+        if include_total == 'exact':
+            pagination['total'] = filtered_query.order_by(None).count()
+            pagination['total_is_estimate'] = False
+        elif include_total == 'estimate':
+            pagination['total'], pagination['total_is_estimate'] = _estimate_count(filtered_query)
+        
         return jsonify({
             'activities': result,
-            'pagination': {
-                'limit': limit,
-                'offset': offset,
-                'total': query.count()
-            }
+            'pagination': pagination
         }), 200
-        
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -104,48 +125,50 @@ def get_activity_summary():
         project_gid = request.args.get('project_gid')
         days = int(request.args.get('days', 7))
         
-        since_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Query base
-        query = ActivityFeed.query.filter(ActivityFeed.created_at >= since_date)
+        # Janela em dias completos (incluindo hoje) é servida pelos rollups diários
+        if request.args.get('whole_days', 'false').lower() == 'true':
+            since_day = datetime.utcnow().date() - timedelta(days=days - 1)
+            summary = _summary_from_rollups(since_day, workspace_gid, project_gid)
+            return jsonify({
+                'summary': summary,
+                'period_days': days,
+                'total_activities': sum(item['count'] for item in summary.values()),
+                'source': 'rollup'
+            }), 200
         
-        if workspace_gid:
-            query = query.filter_by(workspace_gid=workspace_gid)
-        if project_gid:
-            query = query.filter_by(project_gid=project_gid)
+        since_date = datetime.utcnow() - timedelta(days=days)
+        filters = _activity_filters(since_date, workspace_gid, project_gid)
         
-        activities = query.all()
+        # Agrupar por tipo de evento no banco
+        rows = db.session.query(
+            ActivityFeed.event_type,
+            db.func.count(ActivityFeed.gid),
+            db.func.max(ActivityFeed.created_at)
+        ).filter(*filters).group_by(ActivityFeed.event_type).all()
         
-        # Agrupar por tipo de evento
         summary = {}
-        for activity in activities:
-            event_type = activity.event_type
-            if event_type not in summary:
-                summary[event_type] = {
-                    'count': 0,
-                    'recent_actors': set(),
-                    'latest_timestamp': None
-                }
-            
-            summary[event_type]['count'] += 1
-            if activity.actor:
-                summary[event_type]['recent_actors'].add(activity.actor.name)
-            
-            if not summary[event_type]['latest_timestamp'] or activity.created_at > summary[event_type]['latest_timestamp']:
-                summary[event_type]['latest_timestamp'] = activity.created_at
+        for event_type, count, latest_timestamp in rows:
+            summary[event_type] = {
+                'count': count,
+                'recent_actors': [],
+                'latest_timestamp': _as_datetime(latest_timestamp).isoformat() if latest_timestamp else None
+            }
         
-        # Converter sets para listas para serialização JSON
-        for event_type in summary:
-            summary[event_type]['recent_actors'] = list(summary[event_type]['recent_actors'])
-            if summary[event_type]['latest_timestamp']:
-                summary[event_type]['latest_timestamp'] = summary[event_type]['latest_timestamp'].isoformat()
+        # Pares distintos (tipo, ator): limitados por tipos x atores, não por eventos
+        latest_by_actor = db.func.max(ActivityFeed.created_at)
+        actor_rows = db.session.query(
+            ActivityFeed.event_type, User.name
+        ).join(User, User.gid == ActivityFeed.actor_gid).filter(*filters).group_by(
+            ActivityFeed.event_type, User.name
+        ).order_by(latest_by_actor.desc())
+        _add_recent_actors(summary, actor_rows)
         
         return jsonify({
             'summary': summary,
             'period_days': days,
-            'total_activities': len(activities)
+            'total_activities': sum(item['count'] for item in summary.values())
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -165,6 +188,8 @@ def get_user_activity():
             ActivityFeed.created_at >= since_date
         ).order_by(ActivityFeed.created_at.desc()).limit(limit).all()
         
+        related = _related_for(activities, _live_relations(), include_actors=False, include_projects=False)
+        
         # Agrupar por data
         activity_by_date = {}
         for activity in activities:
@@ -175,12 +200,12 @@ def get_user_activity():
             activity_data = activity.to_dict()
             
             # Adicionar dados do alvo
-            if activity.target_type == 'task' and activity.target_gid:
-                task = Task.query.get(activity.target_gid)
+            if activity.target_type == 'task':
+                task = related['tasks'].get(activity.target_gid)
                 if task:
                     activity_data['target'] = {
-                        'gid': task.gid,
-                        'name': task.name
+                        'gid': task['gid'],
+                        'name': task['name']
                     }
             
             activity_by_date[date_key].append(activity_data)
@@ -191,7 +216,7 @@ def get_user_activity():
             'total_activities': len(activities),
             'period_days': days
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -212,30 +237,29 @@ def get_project_timeline():
             ActivityFeed.created_at >= since_date
         ).order_by(ActivityFeed.created_at.desc()).all()
         
+        related = _related_for(activities, _live_relations(), include_projects=False)
+        
         # Enriquecer dados para timeline
         timeline = []
         for activity in activities:
             activity_data = activity.to_dict()
             
             # Adicionar dados do ator
-            if activity.actor:
+            actor = related['actors'].get(activity.actor_gid)
+            if actor:
                 activity_data['actor'] = {
-                    'gid': activity.actor.gid,
-                    'name': activity.actor.name
+                    'gid': actor['gid'],
+                    'name': actor['name']
                 }
             
             # Adicionar dados do alvo
-            if activity.target_type == 'task' and activity.target_gid:
-                task = Task.query.get(activity.target_gid)
+            if activity.target_type == 'task':
+                task = related['tasks'].get(activity.target_gid)
                 if task:
-                    activity_data['target'] = {
-                        'gid': task.gid,
-                        'name': task.name,
-                        'completed': task.completed
-                    }
+                    activity_data['target'] = task
             
             # Gerar descrição amigável
-            activity_data['description'] = _generate_activity_description(activity)
+            activity_data['description'] = _generate_activity_description(activity, actor['name'] if actor else None)
             
             timeline.append(activity_data)
         
@@ -245,13 +269,339 @@ def get_project_timeline():
             'total_activities': len(timeline),
             'period_days': days
         }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activity_feed_bp.route('/api/activity-feed/stream', methods=['GET'])
+def stream_activity_feed():
+    """
+    Stream SSE com as novas atividades de um workspace.
+    
+    EventSource não envia cabeçalhos personalizados, por isso o token também é
+    aceito em ?token=. A retomada usa o cabeçalho Last-Event-ID (ou
+    ?last_event_id=); se o ponto de retomada já saiu do stream, um evento `reset`
+    avisa o cliente para recarregar o feed pela API REST. Só membros do workspace
+    (ou de algum projeto dele) podem assinar o stream.
+    """
+    token = None
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        scheme, _, token = auth_header.partition(' ')
+        if scheme != 'Bearer' or not token:
+            return jsonify({'message': 'Token is invalid!'}), 401
+    token = token or request.args.get('token')
+    user_gid = verify_token(token) if token else None
+    if not user_gid or db.session.get(User, user_gid) is None:
+        return jsonify({'message': 'Token is invalid!'}), 401
+    
+    workspace_gid = request.args.get('workspace_gid')
+    if not workspace_gid:
+        return jsonify({'error': 'workspace_gid is required'}), 400
+    project_gid = request.args.get('project_gid')
+    
+    if not _is_workspace_member(user_gid, workspace_gid):
+        return jsonify({'error': 'Access denied to workspace'}), 403
+    
+    # O stream vive por horas e não usa o banco: devolve a conexão ao pool agora
+    db.session.remove()
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id:
+        try:
+            parse_stream_id(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    try:
+        start_id = last_event_id or latest_stream_id(workspace_gid)
+        oldest_id = oldest_stream_id(workspace_gid)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        last_id = start_id
+        yield "retry: 3000\n\n"
+        
+        # '0-0' pede o stream desde o início e nunca indica lacuna
+        if last_event_id and last_event_id != '0-0' and oldest_id and parse_stream_id(oldest_id) > parse_stream_id(last_event_id):
+            yield f"event: reset\ndata: {json.dumps({'oldest_id': oldest_id})}\n\n"
+        
+        while True:
+            entries = read_activity_stream(
+                workspace_gid, last_id, block_ms=Config.ACTIVITY_STREAM_HEARTBEAT_SECONDS * 1000
+            )
+            if not entries:
+                # Comentário SSE mantém a conexão viva através de proxies
+                yield ": keepalive\n\n"
+                continue
+            
+            for entry_id, activity in entries:
+                last_id = entry_id
+                if project_gid and activity.get('project_gid') != project_gid:
+                    continue
+                yield f"id: {entry_id}\nevent: activity\ndata: {json.dumps(activity)}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@activity_feed_bp.route('/api/activity-feed/inbox', methods=['GET'])
+@auth_required
+def get_activity_inbox():
+    """Caixa de entrada pessoal: atividades sobre tarefas e projetos do usuário."""
+    try:
+        user_gid = g.current_user.gid
+        limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor')
+        unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         
+        query = ActivityInboxItem.query.filter(ActivityInboxItem.user_gid == user_gid)
+        if unread_only:
+            query = query.filter(ActivityInboxItem.read_at.is_(None))
+        
+        # Cursor é o id do último item da página anterior (ids crescem com a inserção)
+        if cursor:
+            try:
+                query = query.filter(ActivityInboxItem.id < int(cursor))
+            except ValueError:
+                raise ValueError('Invalid cursor')
+        
+        items = query.order_by(ActivityInboxItem.id.desc()).limit(limit + 1).all()
+        has_more = len(items) > limit
+        items = items[:limit]
+        
+        related = _related_for(items, _live_relations())
+        
+        result = []
+        for item in items:
+            item_data = item.to_dict()
+            
+            actor = related['actors'].get(item.actor_gid)
+            if actor:
+                item_data['actor'] = actor
+            
+            target = _related_target(item, related)
+            if target:
+                item_data['target'] = target
+            
+            project = related['projects'].get(item.project_gid)
+            if project:
+                item_data['project'] = project
+            
+            item_data['description'] = _generate_activity_description(item, actor['name'] if actor else None)
+            result.append(item_data)
+        
+        return jsonify({
+            'items': result,
+            'unread_count': unread_count(user_gid),
+            'pagination': {
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': str(items[-1].id) if has_more else None
+            }
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activity_feed_bp.route('/api/activity-feed/inbox/unread-count', methods=['GET'])
+@auth_required
+def get_activity_inbox_unread_count():
+    """Número de itens não lidos na caixa de entrada do usuário."""
+    try:
+        return jsonify({'unread_count': unread_count(g.current_user.gid)}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activity_feed_bp.route('/api/activity-feed/inbox/read', methods=['POST'])
+@auth_required
+def mark_activity_inbox_read():
+    """Marcar itens da caixa de entrada como lidos (item_ids, up_to_id ou all)."""
+    try:
+        data = request.get_json() or {}
+        
+        if 'item_ids' in data:
+            if not isinstance(data['item_ids'], list):
+                raise ValueError('Invalid item_ids')
+            marked = mark_read(g.current_user.gid, item_ids=[_inbox_id(item_id, 'item_ids') for item_id in data['item_ids']])
+        elif 'up_to_id' in data:
+            marked = mark_read(g.current_user.gid, up_to_id=_inbox_id(data['up_to_id'], 'up_to_id'))
+        elif data.get('all'):
+            marked = mark_read(g.current_user.gid)
+        else:
+            return jsonify({'error': 'item_ids, up_to_id or all is required'}), 400
+        
+        return jsonify({
+            'marked_read': marked,
+            'unread_count': unread_count(g.current_user.gid)
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def _generate_activity_description(activity: ActivityFeed) -> str:
+def _inbox_id(value, field):
+    """Id de item da caixa de entrada vindo do JSON (inteiro ou string numérica)."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise ValueError(f'Invalid {field}')
+
+def _is_workspace_member(user_gid, workspace_gid):
+    """Membro do workspace ou dono/membro de algum projeto dele."""
+    member = db.select(workspace_memberships.c.user_gid).where(
+        workspace_memberships.c.workspace_gid == workspace_gid,
+        workspace_memberships.c.user_gid == user_gid
+    )
+    project_member = db.select(Project.gid).outerjoin(project_memberships, db.and_(
+        project_memberships.c.project_gid == Project.gid,
+        project_memberships.c.user_gid == user_gid
+    )).where(
+        Project.workspace_gid == workspace_gid,
+        db.or_(Project.owner_gid == user_gid, project_memberships.c.user_gid.is_not(None))
+    )
+    return db.session.execute(db.select(db.or_(member.exists(), project_member.exists()))).scalar()
+
+def _activity_filters(since_date, workspace_gid=None, project_gid=None):
+    """Condições comuns das consultas agregadas do feed."""
+    filters = [ActivityFeed.created_at >= since_date]
+    if workspace_gid:
+        filters.append(ActivityFeed.workspace_gid == workspace_gid)
+    if project_gid:
+        filters.append(ActivityFeed.project_gid == project_gid)
+    return filters
+
+def _as_datetime(value):
+    """MAX(created_at) volta como string no SQLite e como datetime no PostgreSQL."""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _as_date_key(value):
+    return value if isinstance(value, str) else value.isoformat()
+
+def _encode_cursor(activity):
+    """Cursor opaco com a posição (created_at, gid) da última atividade da página."""
+    raw = f"{activity.created_at.isoformat()}|{activity.gid}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        created_at, gid = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), gid
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _estimate_count(query, cap=10000):
+    """
+    Estima o total de uma query sem percorrer todo o intervalo.
+    
+    No PostgreSQL usa a estimativa do planner (EXPLAIN); nos demais bancos conta
+    no máximo `cap` linhas. Retorna (total, is_estimate).
+    """
+    query = query.order_by(None)
+    bind = db.session.get_bind()
+    
+    if bind.dialect.name == 'postgresql':
+        try:
+            compiled = query.statement.compile(bind, compile_kwargs={'literal_binds': True})
+            plan = db.session.execute(db.text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows']), True
+        except Exception:
+            # Sem estimativa do planner: cai para a contagem limitada
+            db.session.rollback()
+    
+    capped = db.session.query(db.func.count()).select_from(
+        query.with_entities(ActivityFeed.gid).limit(cap + 1).subquery()
+    ).scalar()
+    return min(capped, cap), capped > cap
+
+def _load_related(activities, include_actors=True, include_projects=True):
+    """
+    Carrega atores, tarefas e projetos referenciados por uma página de atividades
+    com uma query IN por tipo, para junção em memória.
+    """
+    actor_gids = {a.actor_gid for a in activities if a.actor_gid} if include_actors else set()
+    task_gids = {a.target_gid for a in activities if a.target_type == 'task' and a.target_gid}
+    project_gids = set()
+    if include_projects:
+        project_gids = {a.project_gid for a in activities if a.project_gid}
+        project_gids |= {a.target_gid for a in activities if a.target_type == 'project' and a.target_gid}
+    
+    actors = {}
+    if actor_gids:
+        for row in db.session.query(User.gid, User.name, User.email).filter(User.gid.in_(actor_gids)):
+            actors[row.gid] = {'gid': row.gid, 'name': row.name, 'email': row.email}
+    
+    tasks = {}
+    if task_gids:
+        for row in db.session.query(Task.gid, Task.name, Task.completed).filter(Task.gid.in_(task_gids)):
+            tasks[row.gid] = {'gid': row.gid, 'name': row.name, 'completed': row.completed}
+    
+    projects = {}
+    if project_gids:
+        for row in db.session.query(Project.gid, Project.name).filter(Project.gid.in_(project_gids)):
+            projects[row.gid] = {'gid': row.gid, 'name': row.name}
+    
+    return {'actors': actors, 'tasks': tasks, 'projects': projects}
+
+def _live_relations():
+    return request.args.get('live_relations', 'false').lower() == 'true'
+
+def _related_for(activities, live=False, include_actors=True, include_projects=True):
+    """
+    Monta os dados relacionados a partir do snapshot de nomes gravado em cada
+    atividade, sem joins. Só consulta as tabelas para linhas antigas sem snapshot,
+    ou para todas quando live=True (dados atuais, incluindo email e status).
+    """
+    if live:
+        return _load_related(activities, include_actors, include_projects)
+    
+    missing = [a for a in activities if _missing_snapshot(a)]
+    related = _load_related(missing, include_actors, include_projects)
+    
+    for activity in activities:
+        if include_actors and activity.actor_gid and activity.actor_name:
+            related['actors'].setdefault(activity.actor_gid, {'gid': activity.actor_gid, 'name': activity.actor_name})
+        if activity.target_gid and activity.target_name:
+            if activity.target_type == 'task':
+                related['tasks'].setdefault(activity.target_gid, {'gid': activity.target_gid, 'name': activity.target_name})
+            elif activity.target_type == 'project' and include_projects:
+                related['projects'].setdefault(activity.target_gid, {'gid': activity.target_gid, 'name': activity.target_name})
+        if include_projects and activity.project_gid and activity.project_name:
+            related['projects'].setdefault(activity.project_gid, {'gid': activity.project_gid, 'name': activity.project_name})
+    
+    return related
+
+def _missing_snapshot(activity):
+    return bool(
+        (activity.actor_gid and not activity.actor_name)
+        or (activity.target_type in ('task', 'project') and activity.target_gid and not activity.target_name)
+        or (activity.project_gid and not activity.project_name)
+    )
+
+def _related_target(activity, related):
+    """Resolve o alvo de uma atividade a partir dos dados carregados em lote."""
+    if activity.target_type == 'task':
+        return related['tasks'].get(activity.target_gid)
+    elif activity.target_type == 'project':
+        return related['projects'].get(activity.target_gid)
+    return None
+
+def _generate_activity_description(activity: ActivityFeed, actor_name: str = None) -> str:
     """Gera descrição amigável para uma atividade."""
-    actor_name = activity.actor.name if activity.actor else 'Alguém'
+    actor_name = actor_name or activity.actor_name or 'Alguém'
     
     if activity.event_type == 'task_created':
         return f"{actor_name} criou uma nova tarefa"
@@ -283,22 +633,26 @@ def get_activity_stats():
         project_gid = request.args.get('project_gid')
         days = int(request.args.get('days', 30))
         
-        since_date = datetime.utcnow() - timedelta(days=days)
+        # Janela em dias completos (incluindo hoje) é servida pelos rollups diários
+        if request.args.get('whole_days', 'false').lower() == 'true':
+            since_day = datetime.utcnow().date() - timedelta(days=days - 1)
+            stats = _stats_from_rollups(since_day, workspace_gid, project_gid)
+            stats['period_days'] = days
+            stats['source'] = 'rollup'
+            return jsonify(stats), 200
         
-        # Query base
-        query = ActivityFeed.query.filter(ActivityFeed.created_at >= since_date)
-        
-        if workspace_gid:
-            query = query.filter_by(workspace_gid=workspace_gid)
-        if project_gid:
-            query = query.filter_by(project_gid=project_gid)
+        since_date = datetime.utcnow() - timedelta(days=days)
+        filters = _activity_filters(since_date, workspace_gid, project_gid)
         
-        activities = query.all()
+        # Totais
+        total_activities, unique_actors = db.session.query(
+            db.func.count(ActivityFeed.gid),
+            db.func.count(db.distinct(ActivityFeed.actor_gid))
+        ).filter(*filters).one()
         
-        # Calcular estatísticas
         stats = {
-            'total_activities': len(activities),
-            'unique_actors': len(set(a.actor_gid for a in activities if a.actor_gid)),
+            'total_activities': total_activities,
+            'unique_actors': unique_actors,
             'activities_by_type': {},
             'activities_by_day': {},
             'most_active_users': {},
@@ -306,34 +660,124 @@ def get_activity_stats():
         }
         
         # Atividades por tipo
-        for activity in activities:
-            event_type = activity.event_type
-            if event_type not in stats['activities_by_type']:
-                stats['activities_by_type'][event_type] = 0
-            stats['activities_by_type'][event_type] += 1
+        for event_type, count in db.session.query(
+            ActivityFeed.event_type, db.func.count(ActivityFeed.gid)
+        ).filter(*filters).group_by(ActivityFeed.event_type):
+            stats['activities_by_type'][event_type] = count
         
         # Atividades por dia
-        for activity in activities:
-            date_key = activity.created_at.date().isoformat()
-            if date_key not in stats['activities_by_day']:
-                stats['activities_by_day'][date_key] = 0
-            stats['activities_by_day'][date_key] += 1
-        
-        # Usuários mais ativos
-        for activity in activities:
-            if activity.actor_gid:
-                actor_name = activity.actor.name if activity.actor else f"User {activity.actor_gid}"
-                if actor_name not in stats['most_active_users']:
-                    stats['most_active_users'][actor_name] = 0
-                stats['most_active_users'][actor_name] += 1
-        
-        # Ordenar usuários mais ativos
-        stats['most_active_users'] = dict(
-            sorted(stats['most_active_users'].items(), key=lambda x: x[1], reverse=True)[:10]
-        )
+        day = db.func.date(ActivityFeed.created_at)
+        for date_value, count in db.session.query(
+            day, db.func.count(ActivityFeed.gid)
+        ).filter(*filters).group_by(day).order_by(day):
+            stats['activities_by_day'][_as_date_key(date_value)] = count
+        
+        # Usuários mais ativos (top 10 calculado no banco)
+        activity_count = db.func.count(ActivityFeed.gid)
+        top_actors = db.session.query(
+            ActivityFeed.actor_gid, User.name, activity_count
+        ).outerjoin(
+            User, User.gid == ActivityFeed.actor_gid
+        ).filter(
+            *filters, ActivityFeed.actor_gid.isnot(None)
+        ).group_by(
+            ActivityFeed.actor_gid, User.name
+        ).order_by(activity_count.desc()).limit(10)
+        
+        for actor_gid, actor_name, count in top_actors:
+            stats['most_active_users'][actor_name or f"User {actor_gid}"] = count
         
         return jsonify(stats), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _rollup_filters(since_day, workspace_gid=None, project_gid=None):
+    filters = [ActivityDailyRollup.day >= since_day]
+    if workspace_gid:
+        filters.append(ActivityDailyRollup.workspace_gid == workspace_gid)
+    if project_gid:
+        filters.append(ActivityDailyRollup.project_gid == project_gid)
+    return filters
+
+def _summary_from_rollups(since_day, workspace_gid=None, project_gid=None):
+    """Resumo por tipo de evento calculado a partir de activity_daily_rollups."""
+    filters = _rollup_filters(since_day, workspace_gid, project_gid)
+    
+    summary = {}
+    for event_type, count, latest_timestamp in db.session.query(
+        ActivityDailyRollup.event_type,
+        db.func.sum(ActivityDailyRollup.count),
+        db.func.max(ActivityDailyRollup.latest_at)
+    ).filter(*filters).group_by(ActivityDailyRollup.event_type):
+        summary[event_type] = {
+            'count': int(count),
+            'recent_actors': [],
+            'latest_timestamp': _as_datetime(latest_timestamp).isoformat() if latest_timestamp else None
+        }
+    
+    latest_by_actor = db.func.max(ActivityDailyRollup.latest_at)
+    actor_rows = db.session.query(
+        ActivityDailyRollup.event_type, User.name
+    ).join(User, User.gid == ActivityDailyRollup.actor_gid).filter(*filters).group_by(
+        ActivityDailyRollup.event_type, User.name
+    ).order_by(latest_by_actor.desc())
+    _add_recent_actors(summary, actor_rows)
+    
+    return summary
+
+def _add_recent_actors(summary, actor_rows):
+    """
+    Preenche recent_actors com até SUMMARY_RECENT_ACTORS_LIMIT nomes por tipo, na
+    ordem das linhas. Um tipo que surgiu entre as duas queries entra com count 0.
+    """
+    for event_type, actor_name in actor_rows:
+        entry = summary.setdefault(event_type, {'count': 0, 'recent_actors': [], 'latest_timestamp': None})
+        if len(entry['recent_actors']) < SUMMARY_RECENT_ACTORS_LIMIT:
+            entry['recent_actors'].append(actor_name)
+
+def _stats_from_rollups(since_day, workspace_gid=None, project_gid=None):
+    """Estatísticas de atividade calculadas a partir de activity_daily_rollups."""
+    filters = _rollup_filters(since_day, workspace_gid, project_gid)
+    has_actor = ActivityDailyRollup.actor_gid != ''
+    
+    total_activities = db.session.query(
+        db.func.coalesce(db.func.sum(ActivityDailyRollup.count), 0)
+    ).filter(*filters).scalar()
+    unique_actors = db.session.query(
+        db.func.count(db.distinct(ActivityDailyRollup.actor_gid))
+    ).filter(*filters, has_actor).scalar()
+    
+    stats = {
+        'total_activities': int(total_activities),
+        'unique_actors': unique_actors,
+        'activities_by_type': {},
+        'activities_by_day': {},
+        'most_active_users': {}
+    }
+    
+    for event_type, count in db.session.query(
+        ActivityDailyRollup.event_type, db.func.sum(ActivityDailyRollup.count)
+    ).filter(*filters).group_by(ActivityDailyRollup.event_type):
+        stats['activities_by_type'][event_type] = int(count)
+    
+    for day, count in db.session.query(
+        ActivityDailyRollup.day, db.func.sum(ActivityDailyRollup.count)
+    ).filter(*filters).group_by(ActivityDailyRollup.day).order_by(ActivityDailyRollup.day):
+        stats['activities_by_day'][_as_date_key(day)] = int(count)
+    
+    activity_count = db.func.sum(ActivityDailyRollup.count)
+    top_actors = db.session.query(
+        ActivityDailyRollup.actor_gid, User.name, activity_count
+    ).outerjoin(
+        User, User.gid == ActivityDailyRollup.actor_gid
+    ).filter(
+        *filters, has_actor
+    ).group_by(
+        ActivityDailyRollup.actor_gid, User.name
+    ).order_by(activity_count.desc()).limit(10)
+    
+    for actor_gid, actor_name, count in top_actors:
+        stats['most_active_users'][actor_name or f"User {actor_gid}"] = int(count)
+    
+    return stats
@@ -1,6 +1,8 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify
 from src.models.enhanced_work_graph import db, AutomationRule, Project
 from src.routes.auth import auth_required
+from src.config import Config
+from src.tasks.rule_metrics import get_rule_stats
 from datetime import datetime
 import json
 
@@ -180,6 +182,57 @@ def toggle_automation_rule(rule_gid):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@automation_rules_bp.route('/api/automation-rules/<rule_gid>/stats', methods=['GET'])
+@auth_required
+def get_automation_rule_stats(rule_gid):
+    """Buscar métricas de execução de uma regra de automação."""
+    try:
+        rule = AutomationRule.query.get(rule_gid)
+        if not rule:
+            return jsonify({'error': 'Automation rule not found'}), 404
+        
+        stats = get_rule_stats([rule.gid])[rule.gid]
+        
+        return jsonify({
+            'rule': rule.to_dict(),
+            'stats': stats
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@automation_rules_bp.route('/api/automation-rules/slowest', methods=['GET'])
+@auth_required
+def get_slowest_automation_rules():
+    """Buscar as regras de automação mais lentas de um workspace."""
+    try:
+        workspace_gid = request.args.get('workspace_gid')
+        if not workspace_gid:
+            return jsonify({'error': 'workspace_gid is required'}), 400
+        
+        limit = int(request.args.get('limit', 10))
+        
+        rules = AutomationRule.query.join(
+            Project, Project.gid == AutomationRule.project_gid
+        ).filter(Project.workspace_gid == workspace_gid).all()
+        
+        stats_by_rule = get_rule_stats([rule.gid for rule in rules])
+        
+        ranking = [
+            {'rule': rule.to_dict(), 'stats': stats_by_rule[rule.gid]}
+            for rule in rules
+            if stats_by_rule[rule.gid]['evaluations']
+        ]
+        ranking.sort(key=lambda item: item['stats']['avg_total_ms'], reverse=True)
+        
+        return jsonify({
+            'workspace_gid': workspace_gid,
+            'rules': ranking[:limit]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @automation_rules_bp.route('/api/automation-rules/templates', methods=['GET'])
 @auth_required
 def get_automation_rule_templates():
@@ -250,36 +303,52 @@ def get_automation_rule_templates():
 @automation_rules_bp.route('/api/automation-rules/test/<rule_gid>', methods=['POST'])
 @auth_required
 def test_automation_rule(rule_gid):
-    """Testar regra de automação com dados simulados."""
+    """Simular regra de automação sobre tarefas em memória, sem gravar nada."""
     try:
         rule = AutomationRule.query.get(rule_gid)
         if not rule:
             return jsonify({'error': 'Automation rule not found'}), 404
         
-        data = request.get_json()
-        test_data = data.get('test_data', {})
-        
-        # Simular execução da regra
-        from src.tasks.automation_tasks import process_automation_rules
-        
-        # Executar regra de forma síncrona para teste
-        result = process_automation_rules(
-            rule.trigger_type,
-            test_data.get('target_gid', 'test-task-id'),
-            test_data.get('target_type', 'task'),
-            g.current_user.gid,
-            test_data.get('workspace_gid', 'test-workspace-id'),
-            rule.project_gid,
-            test_data
+        data = request.get_json() or {}
+        test_data = data.get('test_data') or {}
+        if not isinstance(test_data, dict):
+            return jsonify({'error': 'test_data must be an object'}), 400
+        
+        # Tarefas fornecidas pelo usuário ou amostradas do projeto da regra
+        tasks = test_data.get('tasks')
+        if tasks is not None and not isinstance(tasks, list):
+            return jsonify({'error': 'tasks must be a list'}), 400
+        
+        max_tasks = Config.AUTOMATION_SIMULATION_MAX_TASKS
+        sample_size = int(test_data.get('sample_size', 100))
+        if (tasks is not None and len(tasks) > max_tasks) or sample_size > max_tasks:
+            return jsonify({'error': f'Simulation is limited to {max_tasks} tasks'}), 400
+        
+        include_cascade = bool(test_data.get('include_cascade', False))
+        
+        from src.tasks.automation_tasks import simulate_automation_rule
+        
+        result = simulate_automation_rule(
+            rule,
+            tasks=tasks,
+            sample_size=sample_size,
+            include_cascade=include_cascade,
+            report_limit=int(test_data.get('report_limit', 200))
         )
         
+        # Só o resumo da entrada: a lista de tarefas pode ter milhares de itens
         return jsonify({
             'message': 'Rule test completed',
             'rule': rule.to_dict(),
             'test_result': result,
-            'test_data': test_data
+            'test_data': {
+                'tasks_provided': len(tasks) if tasks is not None else None,
+                'sample_size': sample_size if tasks is None else None,
+                'include_cascade': include_cascade
+            }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, g
 from src.models.enhanced_work_graph import db, Task, Project, User, CustomField, CustomFieldValue, task_dependencies
 from src.routes.auth import auth_required
-from src.tasks.automation_tasks import process_automation_rules
-from src.websocket.events import broadcast_task_change
+from src.tasks.automation_tasks import enqueue_automation_event
+from src.websocket.events import broadcast_task_change, task_changes
 from datetime import datetime, date
 import json
 
@@ -138,7 +138,7 @@ def create_task():
         db.session.commit()
         
         # Disparar automação assíncrona
-        process_automation_rules.delay(
+        enqueue_automation_event(
             'task_created',
             task.gid,
             'task',
@@ -148,10 +148,14 @@ def create_task():
             {'task_name': task.name}
         )
         
-        # Broadcast para WebSocket
-        broadcast_task_change(task.gid, 'created', task.to_dict(), g.current_user.gid)
+        # Na criação o delta é a própria tarefa
+        task_data = task.to_dict()
+        broadcast_task_change(
+            task.gid, 'created', task_data, g.current_user,
+            version=task_data['version'], project_gids=task_data['project_gids'], workspace_gid=task_data['workspace_gid']
+        )
         
-        return jsonify(task.to_dict()), 201
+        return jsonify(task_data), 201
         
     except Exception as e:
         db.session.rollback()
@@ -196,7 +200,7 @@ def update_task(task_gid):
                 task.completed_at = datetime.utcnow()
                 
                 # Disparar automação para conclusão
-                process_automation_rules.delay(
+                enqueue_automation_event(
                     'task_completed',
                     task.gid,
                     'task',
@@ -280,8 +284,13 @@ def update_task(task_gid):
                     db.session.add(cfv)
         
         task.modified_at = datetime.utcnow()
+        # Incremento no banco: atualizações concorrentes não repetem a versão
+        task.version = Task.version + 1
         db.session.commit()
         
+        new_data = task.to_dict()
+        changes = task_changes(old_data, new_data)
+        
         # Determinar tipo de mudança para automação
         change_type = 'task_updated'
         if old_data.get('completed') != task.completed:
@@ -290,20 +299,23 @@ def update_task(task_gid):
             change_type = 'task_assigned'
         
         # Disparar automação
-        process_automation_rules.delay(
+        enqueue_automation_event(
             change_type,
             task.gid,
             'task',
             g.current_user.gid,
             task.workspace_gid,
             task.projects[0].gid if task.projects else None,
-            {'old_data': old_data, 'new_data': task.to_dict()}
+            {'changes': changes}
         )
         
-        # Broadcast para WebSocket
-        broadcast_task_change(task.gid, 'updated', task.to_dict(), g.current_user.gid)
+        # Broadcast para WebSocket: apenas os campos alterados e a nova versão
+        broadcast_task_change(
+            task.gid, 'updated', changes, g.current_user,
+            version=new_data['version'], project_gids=new_data['project_gids'], workspace_gid=new_data['workspace_gid']
+        )
         
-        return jsonify(task.to_dict()), 200
+        return jsonify(new_data), 200
         
     except Exception as e:
         db.session.rollback()
@@ -338,17 +350,22 @@ def add_task_dependency(task_gid):
         
         task.dependencies.append(dependency_task)
         task.modified_at = datetime.utcnow()
+        task.version = Task.version + 1
         db.session.commit()
         
+        task_data = task.to_dict()
+        
         # Broadcast para WebSocket
-        broadcast_task_change(task.gid, 'dependency_added', {
-            'dependency_gid': dependency_gid,
-            'dependency_name': dependency_task.name
-        }, g.current_user.gid)
+        broadcast_task_change(
+            task.gid, 'dependency_added',
+            {'dependency_gid': dependency_gid, 'dependency_name': dependency_task.name},
+            g.current_user,
+            version=task_data['version'], project_gids=task_data['project_gids'], workspace_gid=task_data['workspace_gid']
+        )
         
         return jsonify({
             'message': 'Dependency added successfully',
-            'task': task.to_dict()
+            'task': task_data
         }), 200
         
     except Exception as e:
@@ -373,17 +390,22 @@ def remove_task_dependency(task_gid, dependency_gid):
         
         task.dependencies.remove(dependency_task)
         task.modified_at = datetime.utcnow()
+        task.version = Task.version + 1
         db.session.commit()
         
+        task_data = task.to_dict()
+        
         # Broadcast para WebSocket
-        broadcast_task_change(task.gid, 'dependency_removed', {
-            'dependency_gid': dependency_gid,
-            'dependency_name': dependency_task.name
-        }, g.current_user.gid)
+        broadcast_task_change(
+            task.gid, 'dependency_removed',
+            {'dependency_gid': dependency_gid, 'dependency_name': dependency_task.name},
+            g.current_user,
+            version=task_data['version'], project_gids=task_data['project_gids'], workspace_gid=task_data['workspace_gid']
+        )
         
         return jsonify({
             'message': 'Dependency removed successfully',
-            'task': task.to_dict()
+            'task': task_data
         }), 200
         
     except Exception as e:
@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify
+from src.models.enhanced_work_graph import db, Project, User
+from src.routes.auth import auth_required
+from src.websocket.events import presence_registry
+from datetime import datetime
+
+project_presence_bp = Blueprint('project_presence', __name__)
+
+@project_presence_bp.route('/api/projects/<project_gid>/presence', methods=['GET'])
+@auth_required
+def get_project_presence(project_gid):
+    """
+    Usuários conectados à sala do projeto, em todos os processos do servidor
+    Socket.IO (lidos do registro de presença no Redis).
+    """
+    try:
+        if not db.session.get(Project, project_gid):
+            return jsonify({'error': 'Project not found'}), 404
+        
+        present = presence_registry.present_users(project_gid)
+        names = dict(
+            db.session.query(User.gid, User.name).filter(User.gid.in_(present))
+        ) if present else {}
+        
+        users = [
+            {
+                'gid': user_gid,
+                'name': names.get(user_gid),
+                'connections': entry['connections'],
+                'last_seen': datetime.utcfromtimestamp(entry['last_seen']).isoformat()
+            }
+            for user_gid, entry in sorted(present.items(), key=lambda item: names.get(item[0]) or '')
+        ]
+        
+        return jsonify({
+            'project_gid': project_gid,
+            'count': len(users),
+            'users': users
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,118 @@
+from flask import Blueprint, request, jsonify
+from src.models.enhanced_work_graph import db, Task, Project, task_projects
+from src.routes.auth import auth_required
+from src.tasks.burndown_cache import read_cached_days, write_cached_days
+from datetime import datetime, date, timedelta
+
+project_reports_bp = Blueprint('project_reports', __name__)
+
+@project_reports_bp.route('/api/projects/<project_gid>/burndown', methods=['GET'])
+@auth_required
+def get_project_burndown(project_gid):
+    """
+    Séries diárias de burndown e fluxo cumulativo (abertas x concluídas) de um projeto.
+    
+    Tarefas criadas e concluídas são contadas por dia com GROUP BY no banco. Dias
+    encerrados ficam em cache no Redis, invalidado quando uma tarefa altera um
+    desses dias; a cada requisição só o dia corrente e os dias ausentes do cache
+    são recalculados (refresh=true ignora o cache).
+    """
+    try:
+        days = min(int(request.args.get('days', 30)), 365)
+        if days < 1:
+            return jsonify({'error': 'days must be positive'}), 400
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        
+        if not db.session.get(Project, project_gid):
+            return jsonify({'error': 'Project not found'}), 404
+        
+        today = datetime.utcnow().date()
+        first_day = today - timedelta(days=days - 1)
+        all_days = [first_day + timedelta(days=offset) for offset in range(days)]
+        
+        cached = {} if refresh else read_cached_days(project_gid, all_days[:-1])
+        missing = [day for day in all_days[:-1] if day not in cached]
+        
+        # Dias encerrados ausentes do cache são calculados em uma única faixa
+        if missing:
+            computed = _daily_counts(project_gid, missing[0], missing[-1] + timedelta(days=1))
+            finished = {day: computed.get(day, (0, 0)) for day in missing}
+            cached.update(finished)
+            write_cached_days(project_gid, finished)
+        
+        # O dia corrente é sempre recalculado
+        cached.update(_daily_counts(project_gid, today, today + timedelta(days=1)))
+        
+        # Totais anteriores à janela servem de base para as séries acumuladas
+        scope, completed_total = _totals_before(project_gid, first_day)
+        
+        series = []
+        for day in all_days:
+            created, completed = cached.get(day, (0, 0))
+            scope += created
+            completed_total += completed
+            series.append({
+                'date': day.isoformat(),
+                'created': created,
+                'completed': completed,
+                'scope': scope,
+                'completed_total': completed_total,
+                'open': scope - completed_total
+            })
+        
+        return jsonify({
+            'project_gid': project_gid,
+            'period_days': days,
+            'series': series,
+            'cached_days': days - 1 - len(missing)
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _project_tasks(query, project_gid):
+    return query.join(task_projects, task_projects.c.task_gid == Task.gid).filter(
+        task_projects.c.project_gid == project_gid
+    )
+
+def _daily_counts(project_gid, start_day, end_day):
+    """Tarefas criadas e concluídas por dia em [start_day, end_day). Retorna {dia: (criadas, concluídas)}."""
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+    counts = {}
+    
+    created_day = db.func.date(Task.created_at)
+    for day, count in _project_tasks(
+        db.session.query(created_day, db.func.count(Task.gid)), project_gid
+    ).filter(Task.created_at >= start, Task.created_at < end).group_by(created_day):
+        counts[_as_date(day)] = (count, 0)
+    
+    completed_day = db.func.date(Task.completed_at)
+    for day, count in _project_tasks(
+        db.session.query(completed_day, db.func.count(Task.gid)), project_gid
+    ).filter(
+        Task.completed == True, Task.completed_at >= start, Task.completed_at < end
+    ).group_by(completed_day):
+        created, _ = counts.get(_as_date(day), (0, 0))
+        counts[_as_date(day)] = (created, count)
+    
+    return counts
+
+def _totals_before(project_gid, first_day):
+    """Tarefas criadas e concluídas antes do início da janela."""
+    start = datetime.combine(first_day, datetime.min.time())
+    created_before = db.func.sum(db.case((Task.created_at < start, 1), else_=0))
+    completed_before = db.func.sum(db.case(
+        (db.and_(Task.completed == True, Task.completed_at < start), 1), else_=0
+    ))
+    scope, completed = _project_tasks(
+        db.session.query(created_before, completed_before), project_gid
+    ).one()
+    return int(scope or 0), int(completed or 0)
+
+def _as_date(value):
+    """DATE() volta como string no SQLite e como date no PostgreSQL."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
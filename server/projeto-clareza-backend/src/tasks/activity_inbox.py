@@ -0,0 +1,183 @@
+from src.models.enhanced_work_graph import (
+    db, Task, Project, ActivityInboxItem, ActivityInboxCounter, task_followers, project_memberships
+)
+from src.tasks.activity_rollups import upsert_insert
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ordem de prioridade do motivo quando o usuário se qualifica de mais de uma forma
+REASONS = ('assignee', 'follower', 'owner', 'member')
+
+def resolve_recipients(rows):
+    """
+    Calcula quem recebe cada atividade de um lote: responsável e seguidores da
+    tarefa alvo, dono e membros do projeto. O autor da ação não recebe a própria
+    atividade. Usa no máximo quatro queries IN por lote.
+    
+    Returns:
+        {activity_gid: {user_gid: reason}}
+    """
+    task_gids = {row['target_gid'] for row in rows if row.get('target_type') == 'task' and row.get('target_gid')}
+    project_gids = {row['project_gid'] for row in rows if row.get('project_gid')}
+    
+    assignees = {}
+    followers = {}
+    if task_gids:
+        for gid, assignee_gid in db.session.query(Task.gid, Task.assignee_gid).filter(
+            Task.gid.in_(task_gids), Task.assignee_gid.isnot(None)
+        ):
+            assignees[gid] = assignee_gid
+        for task_gid, user_gid in db.session.execute(
+            db.select(task_followers.c.task_gid, task_followers.c.user_gid)
+            .where(task_followers.c.task_gid.in_(task_gids))
+        ):
+            followers.setdefault(task_gid, []).append(user_gid)
+    
+    owners = {}
+    members = {}
+    if project_gids:
+        for gid, owner_gid in db.session.query(Project.gid, Project.owner_gid).filter(
+            Project.gid.in_(project_gids), Project.owner_gid.isnot(None)
+        ):
+            owners[gid] = owner_gid
+        for project_gid, user_gid in db.session.execute(
+            db.select(project_memberships.c.project_gid, project_memberships.c.user_gid)
+            .where(project_memberships.c.project_gid.in_(project_gids))
+        ):
+            members.setdefault(project_gid, []).append(user_gid)
+    
+    recipients = {}
+    for row in rows:
+        task_gid = row.get('target_gid') if row.get('target_type') == 'task' else None
+        project_gid = row.get('project_gid')
+        candidates = {
+            'assignee': [assignees[task_gid]] if task_gid in assignees else [],
+            'follower': followers.get(task_gid, []),
+            'owner': [owners[project_gid]] if project_gid in owners else [],
+            'member': members.get(project_gid, [])
+        }
+        
+        by_user = {}
+        for reason in REASONS:
+            for user_gid in candidates[reason]:
+                if user_gid != row.get('actor_gid'):
+                    by_user.setdefault(user_gid, reason)
+        if by_user:
+            recipients[row['gid']] = by_user
+    
+    return recipients
+
+def fan_out_to_inboxes(rows):
+    """
+    Copia cada atividade do lote para a caixa de entrada dos destinatários e
+    incrementa os contadores de não lidas. Não faz commit: roda na transação do
+    activity_writer. Retorna o número de itens criados.
+    """
+    recipients = resolve_recipients(rows)
+    if not recipients:
+        return 0
+    
+    items = []
+    unread_by_user = {}
+    for row in rows:
+        for user_gid, reason in recipients.get(row['gid'], {}).items():
+            items.append({
+                'user_gid': user_gid,
+                'activity_gid': row['gid'],
+                'reason': reason,
+                'event_type': row['event_type'],
+                'actor_gid': row.get('actor_gid'),
+                'target_gid': row.get('target_gid'),
+                'target_type': row.get('target_type'),
+                'project_gid': row.get('project_gid'),
+                'workspace_gid': row['workspace_gid'],
+                'data': row.get('data'),
+                'created_at': row['created_at'],
+                'actor_name': row.get('actor_name'),
+                'target_name': row.get('target_name'),
+                'project_name': row.get('project_name')
+            })
+            unread_by_user[user_gid] = unread_by_user.get(user_gid, 0) + 1
+    
+    db.session.execute(ActivityInboxItem.__table__.insert(), items)
+    _add_unread(unread_by_user)
+    return len(items)
+
+def mark_read(user_gid, item_ids=None, up_to_id=None):
+    """
+    Marca itens como lidos (por ids, até um id, ou todos) e ajusta o contador
+    na mesma transação. Retorna o número de itens marcados.
+    """
+    query = ActivityInboxItem.query.filter(
+        ActivityInboxItem.user_gid == user_gid,
+        ActivityInboxItem.read_at.is_(None)
+    )
+    if item_ids is not None:
+        query = query.filter(ActivityInboxItem.id.in_(item_ids))
+    elif up_to_id is not None:
+        query = query.filter(ActivityInboxItem.id <= up_to_id)
+    
+    marked = query.update({'read_at': datetime.utcnow()}, synchronize_session=False)
+    if marked:
+        _add_unread({user_gid: -marked})
+    db.session.commit()
+    return marked
+
+def purge_inbox_batch(read_cutoff, age_cutoff, batch_size):
+    """
+    Apaga até batch_size itens lidos anteriores a read_cutoff ou quaisquer itens
+    anteriores a age_cutoff, desconta dos contadores os não lidos removidos e faz
+    commit. A busca segue a chave primária a partir dos ids mais antigos, que
+    crescem com a inserção. Retorna quantos itens foram apagados.
+    """
+    rows = db.session.execute(
+        db.select(ActivityInboxItem.id, ActivityInboxItem.user_gid, ActivityInboxItem.read_at)
+        .where(db.or_(
+            db.and_(ActivityInboxItem.read_at.isnot(None), ActivityInboxItem.created_at < read_cutoff),
+            ActivityInboxItem.created_at < age_cutoff
+        ))
+        .order_by(ActivityInboxItem.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    
+    db.session.execute(db.delete(ActivityInboxItem).where(ActivityInboxItem.id.in_([row.id for row in rows])))
+    
+    unread_by_user = {}
+    for row in rows:
+        if row.read_at is None:
+            unread_by_user[row.user_gid] = unread_by_user.get(row.user_gid, 0) - 1
+    if unread_by_user:
+        _add_unread(unread_by_user)
+    
+    db.session.commit()
+    return len(rows)
+
+def unread_count(user_gid):
+    counter = db.session.get(ActivityInboxCounter, user_gid)
+    return max(counter.unread_count, 0) if counter else 0
+
+def _add_unread(deltas):
+    """Soma deltas aos contadores de não lidas com um único upsert."""
+    values = [{'user_gid': user_gid, 'unread_count': delta} for user_gid, delta in deltas.items()]
+    
+    insert = upsert_insert(ActivityInboxCounter)
+    if insert is None:
+        for value in values:
+            counter = db.session.get(ActivityInboxCounter, value['user_gid'])
+            if counter:
+                counter.unread_count += value['unread_count']
+            else:
+                db.session.add(ActivityInboxCounter(**value))
+        return
+    
+    table = ActivityInboxCounter.__table__
+    stmt = insert.values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_gid'],
+        set_={'unread_count': table.c.unread_count + stmt.excluded.unread_count}
+    )
+    db.session.execute(stmt)
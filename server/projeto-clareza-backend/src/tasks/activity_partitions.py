@@ -0,0 +1,287 @@
+from src.config import Config
+from src.models.enhanced_work_graph import db, ActivityFeed
+from sqlalchemy.schema import CreateTable
+from datetime import datetime, date, timedelta
+import gzip
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'activity_feed'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_PATTERN = re.compile(r'^activity_feed_p(\d{4})_(\d{2})$')
+
+# Verificação em pg_partitioned_table já confirmada neste processo
+_native_partitions = False
+
+def month_start(value):
+    """Primeiro dia do mês de uma data ou datetime."""
+    return date(value.year, value.month, 1)
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}'
+
+def _partition_month(name):
+    match = PARTITION_PATTERN.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def partitioning_requested():
+    """Particionamento nativo só existe no PostgreSQL; nos demais bancos o arquivamento é por faixa de datas."""
+    return Config.ACTIVITY_PARTITIONING and db.engine.dialect.name == 'postgresql'
+
+def uses_native_partitions():
+    """
+    Indica se a activity_feed é de fato particionada. Uma tabela criada antes do
+    particionamento continua sem partições até a migração e segue pelo
+    arquivamento por faixa de datas. Só o resultado positivo fica em cache: a
+    tabela pode ser criada por outro processo depois desta verificação.
+    """
+    global _native_partitions
+    if not partitioning_requested():
+        return False
+    if not _native_partitions:
+        _native_partitions = _is_partitioned()
+    return _native_partitions
+
+def _is_partitioned():
+    return db.session.execute(db.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :name"
+    ), {'name': PARENT_TABLE}).first() is not None
+
+def init_activity_storage():
+    """
+    Cria activity_feed particionada por mês (RANGE em created_at) quando o
+    particionamento está ativo no PostgreSQL. Deve rodar antes do db.create_all(),
+    que então ignora a tabela já existente. Tabelas já criadas sem partições são
+    mantidas como estão (a conversão exige migração manual).
+    """
+    if not partitioning_requested():
+        return False
+    
+    inspector = db.inspect(db.engine)
+    if inspector.has_table(PARENT_TABLE):
+        if not uses_native_partitions():
+            logger.warning("activity_feed já existe sem partições; particionamento ignorado até a migração")
+            return False
+    else:
+        # Tabelas referenciadas pelas chaves estrangeiras precisam existir antes
+        table = ActivityFeed.__table__
+        db.metadata.create_all(db.engine, tables=[t for t in db.metadata.sorted_tables if t is not table])
+        
+        db.session.execute(db.text(str(_partitioned_table_ddl())))
+        db.session.execute(db.text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT'))
+        db.session.commit()
+        
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+        logger.info("activity_feed criada com particionamento mensal")
+    
+    ensure_partitions()
+    return True
+
+def _partitioned_table_ddl():
+    """
+    CREATE TABLE da activity_feed particionada. A chave primária de uma tabela
+    particionada precisa incluir a coluna de partição, então ela é montada sobre
+    uma cópia do metadata (com as tabelas das chaves estrangeiras) em vez de
+    alterar o modelo.
+    """
+    metadata = db.MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    
+    partitioned = metadata.tables[PARENT_TABLE]
+    partitioned.append_constraint(db.PrimaryKeyConstraint('gid', 'created_at'))
+    partitioned.dialect_options['postgresql']['partition_by'] = 'RANGE (created_at)'
+    return CreateTable(partitioned).compile(dialect=db.engine.dialect)
+
+def ensure_partitions(months_ahead=None):
+    """
+    Cria as partições do mês corrente e dos próximos meses. Retorna as partições criadas.
+    
+    Linhas do mês que já caíram na partição DEFAULT (ex.: antes de a partição
+    existir) impediriam o CREATE ... PARTITION OF; nesse caso a partição é criada
+    solta, recebe as linhas da DEFAULT e só então é anexada, tudo na mesma transação.
+    """
+    if months_ahead is None:
+        months_ahead = Config.ACTIVITY_PARTITION_MONTHS_AHEAD
+    
+    existing = set(_attached_partitions())
+    current = month_start(datetime.utcnow())
+    created = []
+    
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        _create_partition(name, month)
+        db.session.commit()
+        created.append(name)
+    
+    return created
+
+def _create_partition(name, month):
+    bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    in_month = "created_at >= :start AND created_at < :end"
+    params = {'start': month, 'end': add_months(month, 1)}
+    
+    stranded = db.session.execute(db.text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1"
+    ), params).first()
+    if not stranded:
+        db.session.execute(db.text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+    
+    db.session.execute(db.text(
+        f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    moved = db.session.execute(db.text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), params).rowcount
+    db.session.execute(db.text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.info(f"Partição {name} criada com {moved} atividades movidas da partição DEFAULT")
+
+def archive_expired_activity(retention_days=None):
+    """
+    Move para o arquivo frio (JSONL compactado) os meses inteiros anteriores à
+    retenção. Com partições nativas a partição é destacada, exportada e removida,
+    e as linhas antigas da partição DEFAULT são arquivadas mês a mês; nos demais
+    casos (inclusive uma activity_feed ainda não migrada para partições) as
+    linhas do mês são exportadas e depois apagadas em lotes. Se a remoção for
+    interrompida, a próxima execução arquiva as linhas restantes em um novo
+    arquivo, então o mesmo gid pode aparecer em dois arquivos do mês.
+    
+    Returns:
+        Lista de {'month', 'rows', 'path'} para cada mês arquivado
+    """
+    if retention_days is None:
+        retention_days = Config.ACTIVITY_RETENTION_DAYS
+    
+    # Só meses que terminam antes do início da janela de retenção
+    cutoff_month = month_start(datetime.utcnow() - timedelta(days=retention_days))
+    os.makedirs(Config.ACTIVITY_ARCHIVE_DIR, exist_ok=True)
+    
+    if uses_native_partitions():
+        return _archive_partitions(cutoff_month)
+    return _archive_month_ranges(cutoff_month, ActivityFeed.__table__)
+
+def _attached_partitions():
+    rows = db.session.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name"
+    ), {'name': PARENT_TABLE})
+    return [name for name, in rows]
+
+def _archive_partitions(cutoff_month):
+    attached = set(_attached_partitions())
+    archived = []
+    columns = [db.column(column.name) for column in ActivityFeed.__table__.columns]
+    
+    # Inclui partições já destacadas por uma execução interrompida
+    for name in sorted(db.inspect(db.engine).get_table_names()):
+        month = _partition_month(name)
+        if month is None or month >= cutoff_month:
+            continue
+        
+        if name in attached:
+            db.session.execute(db.text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}'))
+            db.session.commit()
+        
+        stmt = db.select(*columns).select_from(db.table(name)).order_by(db.column('created_at'), db.column('gid'))
+        path, count = _write_archive(name, stmt)
+        
+        db.session.execute(db.text(f'DROP TABLE {name}'))
+        db.session.commit()
+        
+        logger.info(f"Partição {name} arquivada em {path} ({count} atividades)")
+        archived.append({'month': month.isoformat(), 'rows': count, 'path': path})
+    
+    # Linhas de meses sem partição própria ficam na DEFAULT e também expiram
+    archived.extend(_archive_month_ranges(cutoff_month, db.table(DEFAULT_PARTITION, *columns)))
+    return archived
+
+def _archive_month_ranges(cutoff_month, source):
+    oldest = db.session.execute(db.select(db.func.min(source.c.created_at))).scalar()
+    if oldest is None:
+        return []
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    
+    archived = []
+    month = month_start(oldest)
+    
+    while month < cutoff_month:
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(add_months(month, 1), datetime.min.time())
+        in_month = (source.c.created_at >= start, source.c.created_at < end)
+        
+        stmt = db.select(source).where(*in_month).order_by(source.c.created_at, source.c.gid)
+        path, count = _write_archive(partition_name(month), stmt)
+        
+        if count:
+            _delete_in_batches(source, in_month)
+            logger.info(f"Atividades de {month.strftime('%Y-%m')} arquivadas em {path} ({count} atividades)")
+            archived.append({'month': month.isoformat(), 'rows': count, 'path': path})
+        else:
+            os.remove(path)
+        
+        month = add_months(month, 1)
+    
+    return archived
+
+def _delete_in_batches(source, conditions):
+    """
+    Apaga as linhas já arquivadas em lotes de ACTIVITY_PURGE_BATCH_SIZE, um
+    commit por lote, como a limpeza de atividades: um mês inteiro em um único
+    DELETE seguraria locks e I/O por toda a transação.
+    """
+    batch_size = Config.ACTIVITY_PURGE_BATCH_SIZE
+    while True:
+        gids = db.session.execute(
+            db.select(source.c.gid).where(*conditions)
+            .order_by(source.c.created_at, source.c.gid)
+            .limit(batch_size)
+        ).scalars().all()
+        if not gids:
+            return
+        
+        db.session.execute(db.delete(source).where(*conditions, source.c.gid.in_(gids)))
+        db.session.commit()
+        if len(gids) < batch_size:
+            return
+        time.sleep(Config.ACTIVITY_PURGE_SLEEP_SECONDS)
+
+def _write_archive(name, stmt):
+    """Exporta o resultado da query em streaming para um arquivo .jsonl.gz. Retorna (caminho, linhas)."""
+    timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(Config.ACTIVITY_ARCHIVE_DIR, f'{name}-{timestamp}.jsonl.gz')
+    tmp_path = f'{path}.tmp'
+    count = 0
+    
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+        result = db.session.execute(stmt.execution_options(yield_per=1000))
+        for row in result.mappings():
+            archive.write(json.dumps(dict(row), default=_json_default) + '\n')
+            count += 1
+    
+    # O arquivo só aparece completo, nunca parcialmente escrito
+    os.replace(tmp_path, path)
+    return path, count
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
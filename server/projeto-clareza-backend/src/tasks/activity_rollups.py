@@ -0,0 +1,145 @@
+from src.models.enhanced_work_graph import db, ActivityFeed, ActivityDailyRollup
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+def aggregate_rows(rows):
+    """Agrupa linhas de ActivityFeed por (workspace, projeto, dia, tipo, ator)."""
+    aggregated = {}
+    for row in rows:
+        key = (
+            row['workspace_gid'],
+            row.get('project_gid') or '',
+            row['created_at'].date(),
+            row['event_type'],
+            row.get('actor_gid') or ''
+        )
+        count, latest_at = aggregated.get(key, (0, None))
+        created_at = row['created_at']
+        aggregated[key] = (count + 1, created_at if latest_at is None or created_at > latest_at else latest_at)
+    return aggregated
+
+def upsert_insert(model):
+    """INSERT com suporte a ON CONFLICT no banco atual, ou None se o dialeto não suportar."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    elif dialect == 'sqlite':
+        return sqlite.insert(model)
+    return None
+
+def upsert_rollups(aggregated):
+    """
+    Soma contagens às linhas de rollup existentes com um único INSERT ... ON CONFLICT.
+    Não faz commit: deve rodar na mesma transação que grava as atividades.
+    """
+    if not aggregated:
+        return
+    
+    values = [
+        {
+            'workspace_gid': workspace_gid,
+            'project_gid': project_gid,
+            'day': day,
+            'event_type': event_type,
+            'actor_gid': actor_gid,
+            'count': count,
+            'latest_at': latest_at
+        }
+        for (workspace_gid, project_gid, day, event_type, actor_gid), (count, latest_at) in aggregated.items()
+    ]
+    
+    insert = upsert_insert(ActivityDailyRollup)
+    if insert is None:
+        _upsert_rollups_generic(values)
+        return
+    
+    table = ActivityDailyRollup.__table__
+    stmt = insert.values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['workspace_gid', 'project_gid', 'day', 'event_type', 'actor_gid'],
+        set_={
+            'count': table.c.count + stmt.excluded.count,
+            'latest_at': db.case(
+                (table.c.latest_at > stmt.excluded.latest_at, table.c.latest_at),
+                else_=stmt.excluded.latest_at
+            )
+        }
+    )
+    db.session.execute(stmt)
+
+def _upsert_rollups_generic(values):
+    """Fallback sem ON CONFLICT: lê as linhas existentes e atualiza ou insere."""
+    for value in values:
+        rollup = ActivityDailyRollup.query.filter_by(
+            workspace_gid=value['workspace_gid'],
+            project_gid=value['project_gid'],
+            day=value['day'],
+            event_type=value['event_type'],
+            actor_gid=value['actor_gid']
+        ).first()
+        if rollup:
+            rollup.count += value['count']
+            if not rollup.latest_at or value['latest_at'] > rollup.latest_at:
+                rollup.latest_at = value['latest_at']
+        else:
+            db.session.add(ActivityDailyRollup(**value))
+
+def first_rebuildable_day(retention_days):
+    """
+    Primeiro dia cujo feed bruto ainda está completo. O dia do corte da retenção
+    já pode ter sido removido em parte pela limpeza ou pelo arquivamento.
+    """
+    return (datetime.utcnow() - timedelta(days=retention_days)).date() + timedelta(days=1)
+
+def rebuild_rollups_for_day(day):
+    """
+    Recalcula a partir do feed bruto todas as linhas de rollup de um dia.
+    
+    Um dia sem nenhuma atividade bruta mantém os rollups existentes: eles podem
+    ser o único registro de atividades já removidas. Retorna o número de linhas
+    reconstruídas ou None quando o dia foi mantido.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    
+    rows = db.session.query(
+        ActivityFeed.workspace_gid,
+        ActivityFeed.project_gid,
+        ActivityFeed.event_type,
+        ActivityFeed.actor_gid,
+        db.func.count(ActivityFeed.gid),
+        db.func.max(ActivityFeed.created_at)
+    ).filter(
+        ActivityFeed.created_at >= start,
+        ActivityFeed.created_at < end
+    ).group_by(
+        ActivityFeed.workspace_gid,
+        ActivityFeed.project_gid,
+        ActivityFeed.event_type,
+        ActivityFeed.actor_gid
+    ).all()
+    
+    if not rows:
+        return None
+    
+    db.session.query(ActivityDailyRollup).filter(
+        ActivityDailyRollup.day == day
+    ).delete(synchronize_session=False)
+    
+    db.session.execute(ActivityDailyRollup.__table__.insert(), [
+        {
+            'workspace_gid': workspace_gid,
+            'project_gid': project_gid or '',
+            'day': day,
+            'event_type': event_type,
+            'actor_gid': actor_gid or '',
+            'count': count,
+            'latest_at': datetime.fromisoformat(latest_at) if isinstance(latest_at, str) else latest_at
+        }
+        for workspace_gid, project_gid, event_type, actor_gid, count, latest_at in rows
+    ])
+    
+    return len(rows)
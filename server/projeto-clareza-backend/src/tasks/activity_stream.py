@@ -0,0 +1,73 @@
+from src.config import Config
+from src.tasks.rule_metrics import get_redis
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Um Redis Stream por workspace; o id da entrada é o id do evento SSE
+STREAM_KEY_PREFIX = 'activity:stream:'
+
+def stream_key(workspace_gid):
+    return f'{STREAM_KEY_PREFIX}{workspace_gid}'
+
+def publish_activities(rows):
+    """
+    Publica as atividades já gravadas nos streams dos seus workspaces. Cada stream
+    é limitado (aproximadamente) a ACTIVITY_STREAM_MAXLEN entradas. Falhas são
+    registradas e não afetam a gravação.
+    """
+    if not rows:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for row in rows:
+            pipe.xadd(
+                stream_key(row['workspace_gid']),
+                {'activity': json.dumps(_activity_payload(row))},
+                maxlen=Config.ACTIVITY_STREAM_MAXLEN,
+                approximate=True
+            )
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Erro ao publicar {len(rows)} atividades no stream: {str(e)}")
+
+def latest_stream_id(workspace_gid):
+    """Id da entrada mais recente do stream ('0-0' se vazio)."""
+    entries = get_redis().xrevrange(stream_key(workspace_gid), count=1)
+    return entries[0][0].decode() if entries else '0-0'
+
+def oldest_stream_id(workspace_gid):
+    entries = get_redis().xrange(stream_key(workspace_gid), count=1)
+    return entries[0][0].decode() if entries else None
+
+def read_activity_stream(workspace_gid, last_id, block_ms, count=100):
+    """Lê as entradas posteriores a last_id, bloqueando até block_ms. Retorna [(id, atividade)]."""
+    response = get_redis().xread({stream_key(workspace_gid): last_id}, count=count, block=block_ms)
+    if not response:
+        return []
+    _, entries = response[0]
+    return [(entry_id.decode(), json.loads(fields[b'activity'])) for entry_id, fields in entries]
+
+def parse_stream_id(value):
+    """Converte 'ms-seq' em tupla comparável; ValueError se inválido."""
+    milliseconds, sequence = value.split('-')
+    return int(milliseconds), int(sequence)
+
+def _activity_payload(row):
+    """Mesmo formato de ActivityFeed.to_dict() a partir da linha do activity_writer."""
+    return {
+        'gid': row['gid'],
+        'resource_type': row.get('resource_type', 'activity'),
+        'event_type': row['event_type'],
+        'actor_gid': row.get('actor_gid'),
+        'target_gid': row.get('target_gid'),
+        'target_type': row.get('target_type'),
+        'project_gid': row.get('project_gid'),
+        'workspace_gid': row['workspace_gid'],
+        'data': json.loads(row['data']) if row.get('data') else {},
+        'created_at': row['created_at'].isoformat() if row.get('created_at') else None,
+        'actor_name': row.get('actor_name'),
+        'target_name': row.get('target_name'),
+        'project_name': row.get('project_name')
+    }
@@ -0,0 +1,245 @@
+from celery.signals import task_postrun, worker_process_shutdown, worker_shutdown
+from flask import has_app_context
+from src.config import Config
+from src.models.enhanced_work_graph import db, ActivityFeed, User, Task, Project
+from src.tasks.activity_rollups import aggregate_rows, upsert_rollups
+from src.tasks.activity_inbox import fan_out_to_inboxes
+from src.tasks.activity_stream import publish_activities
+from datetime import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+def build_activity_row(event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid=None, data=None):
+    """Monta a linha de ActivityFeed usada nas inserções em massa."""
+    return {
+        'gid': str(uuid.uuid4()),
+        'resource_type': 'activity',
+        'event_type': event_type,
+        'actor_gid': actor_gid,
+        'target_gid': target_gid,
+        'target_type': target_type,
+        'project_gid': project_gid,
+        'workspace_gid': workspace_gid,
+        'data': json.dumps(data) if data else None,
+        'created_at': datetime.utcnow()
+    }
+
+def attach_display_names(rows):
+    """
+    Preenche actor_name, target_name e project_name das linhas com uma query IN
+    por tipo de entidade. Nomes já informados pelo chamador são mantidos.
+    """
+    actor_gids = {row['actor_gid'] for row in rows if row.get('actor_gid') and not row.get('actor_name')}
+    task_gids = {row['target_gid'] for row in rows if row.get('target_type') == 'task' and not row.get('target_name')}
+    project_gids = {row['project_gid'] for row in rows if row.get('project_gid') and not row.get('project_name')}
+    project_gids |= {row['target_gid'] for row in rows if row.get('target_type') == 'project' and not row.get('target_name')}
+    task_gids.discard(None)
+    project_gids.discard(None)
+    
+    actor_names = dict(db.session.query(User.gid, User.name).filter(User.gid.in_(actor_gids))) if actor_gids else {}
+    task_names = dict(db.session.query(Task.gid, Task.name).filter(Task.gid.in_(task_gids))) if task_gids else {}
+    project_names = dict(db.session.query(Project.gid, Project.name).filter(Project.gid.in_(project_gids))) if project_gids else {}
+    target_names = {'task': task_names, 'project': project_names}
+    
+    # Todas as linhas precisam das mesmas chaves para o INSERT multi-linha
+    for row in rows:
+        row['actor_name'] = row.get('actor_name') or actor_names.get(row.get('actor_gid'))
+        row['target_name'] = row.get('target_name') or target_names.get(row.get('target_type'), {}).get(row.get('target_gid'))
+        row['project_name'] = row.get('project_name') or project_names.get(row.get('project_gid'))
+    return rows
+
+class ActivityWriter:
+    """
+    Buffer de registros de atividade por processo (worker).
+    
+    Os registros são acumulados na ordem em que chegam e gravados com um único
+    INSERT multi-linha quando o buffer atinge `max_batch` registros ou quando o
+    registro mais antigo passa de `max_delay` segundos. Como o buffer é uma fila
+    FIFO e created_at é definido na entrada, a ordem por alvo é preservada.
+    Com um app configurado (init_app), um timer garante a gravação mesmo com o
+    worker ocioso; o buffer também é esvaziado ao final de cada tarefa que
+    estourou o prazo e no desligamento do worker (neste caso, só se houver app
+    context ou app configurado).
+    """
+    
+    def __init__(self, max_batch=500, max_delay=2.0, max_buffer=10000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+        self.app = None
+        
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._oldest_at = None
+        self._timer = None
+        
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_failed = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+    
+    def init_app(self, app):
+        """Permite gravar fora de um app context (ex.: no desligamento do worker)."""
+        self.app = app
+    
+    def add(self, row):
+        self.add_many([row])
+    
+    def add_many(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            if not self._buffer:
+                self._oldest_at = time.monotonic()
+            self._buffer.extend(rows)
+            
+            # Proteção de memória caso o banco fique indisponível por muito tempo
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.rows_dropped += overflow
+                logger.error(f"Buffer de atividades cheio: {overflow} registros descartados")
+            
+            if len(self._buffer) >= self.max_batch or self._is_due():
+                self.flush()
+            elif self._timer is None and self.app is not None:
+                self._timer = threading.Timer(self.max_delay, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def flush_if_due(self):
+        with self._lock:
+            if self._buffer and self._is_due():
+                self.flush()
+    
+    def flush(self):
+        """
+        Grava todo o buffer com um único INSERT (com os nomes de exibição já
+        resolvidos) e, na mesma transação, atualiza os rollups diários e as caixas
+        de entrada dos destinatários.
+        
+        Se o lote falha com o banco respondendo, ele é dividido ao meio até isolar
+        as linhas com erro, que são descartadas (e logadas) sem bloquear as demais.
+        Com o banco fora do ar o buffer é mantido para a próxima tentativa.
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            
+            if not has_app_context():
+                if self.app is None:
+                    # Worker sem app configurado (init_app): sem banco para gravar
+                    logger.warning(f"Sem app context para gravar {len(self._buffer)} atividades; gravação adiada")
+                    return 0
+                with self.app.app_context():
+                    return self.flush()
+            
+            rows = self._buffer
+            started = time.perf_counter()
+            try:
+                self._write(rows)
+                written = rows
+            except Exception as e:
+                db.session.rollback()
+                self.failed_flushes += 1
+                logger.error(f"Erro ao gravar lote de {len(rows)} atividades: {str(e)}")
+                if not self._database_available():
+                    return 0
+                written = self._write_bisecting(rows)
+            
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._buffer = []
+            self._oldest_at = None
+            self.flush_count += 1
+            self.rows_written += len(written)
+            self.last_flush_rows = len(written)
+            self.last_flush_ms = round(elapsed_ms, 3)
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            logger.debug(f"{len(written)} atividades gravadas em {elapsed_ms:.1f} ms")
+            
+            # Só publica depois do commit, para o stream nunca mostrar atividades não gravadas
+            if Config.ACTIVITY_STREAM_ENABLED and written:
+                publish_activities(written)
+            return len(written)
+    
+    def _write(self, rows):
+        attach_display_names(rows)
+        db.session.execute(ActivityFeed.__table__.insert(), rows)
+        upsert_rollups(aggregate_rows(rows))
+        if Config.ACTIVITY_INBOX_ENABLED:
+            fan_out_to_inboxes(rows)
+        db.session.commit()
+    
+    def _write_bisecting(self, rows):
+        """Grava o lote; se falhar, grava cada metade separadamente até isolar as linhas com erro."""
+        try:
+            self._write(rows)
+            return rows
+        except Exception as e:
+            db.session.rollback()
+            if len(rows) == 1:
+                self.rows_failed += 1
+                logger.error(f"Atividade descartada por erro de gravação ({rows[0].get('event_type')} em {rows[0].get('target_gid')}): {str(e)}")
+                return []
+        
+        middle = len(rows) // 2
+        return self._write_bisecting(rows[:middle]) + self._write_bisecting(rows[middle:])
+    
+    @staticmethod
+    def _database_available():
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            db.session.rollback()
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._buffer),
+                'flush_count': self.flush_count,
+                'failed_flushes': self.failed_flushes,
+                'rows_written': self.rows_written,
+                'rows_dropped': self.rows_dropped,
+                'rows_failed': self.rows_failed,
+                'last_flush_rows': self.last_flush_rows,
+                'last_flush_ms': self.last_flush_ms,
+                'max_flush_ms': self.max_flush_ms
+            }
+    
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+            self.flush()
+    
+    def _is_due(self):
+        return self._oldest_at is not None and time.monotonic() - self._oldest_at >= self.max_delay
+
+# Instância global por processo
+activity_writer = ActivityWriter(
+    max_batch=Config.ACTIVITY_WRITER_MAX_BATCH,
+    max_delay=Config.ACTIVITY_WRITER_MAX_DELAY_SECONDS,
+    max_buffer=Config.ACTIVITY_WRITER_MAX_BUFFER
+)
+
+@task_postrun.connect
+def _flush_after_task(**kwargs):
+    activity_writer.flush_if_due()
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_on_shutdown(**kwargs):
+    flushed = activity_writer.flush()
+    if flushed:
+        logger.info(f"{flushed} atividades gravadas no desligamento do worker")
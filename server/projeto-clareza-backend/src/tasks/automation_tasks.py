@@ -1,11 +1,57 @@
 from src.celery_app import celery
-from src.models.enhanced_work_graph import db, Task, AutomationRule, ActivityFeed, Section
-from datetime import datetime
+from src.models.enhanced_work_graph import (
+    db, Task, AutomationRule, ActivityFeed, ActivityInboxItem, Section, Project, User, task_projects
+)
+from src.tasks.rule_engine import RuleCascade
+from src.tasks.rule_metrics import RuleMetricsRecorder, get_redis
+from src.tasks.activity_writer import activity_writer, build_activity_row
+from src.tasks.burndown_cache import invalidate_burndown_cache
+from src.config import Config
+from datetime import datetime, date
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Eventos aguardando o próximo lote e marcador do drain já agendado
+AUTOMATION_QUEUE_KEY = 'automation:events'
+AUTOMATION_DRAIN_KEY = 'automation:events:drain_scheduled'
+# Eventos que falham sozinhos com o banco respondendo, guardados para inspeção
+AUTOMATION_DEAD_LETTER_KEY = 'automation:events:dead'
+
+def enqueue_automation_event(event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid=None, data=None):
+    """
+    Enfileira um evento para o próximo lote de automação.
+    
+    Os eventos de todas as requisições se acumulam em uma lista no Redis; o
+    primeiro evento de cada janela agenda process_queued_automation_events para
+    daqui a AUTOMATION_BATCH_WINDOW_SECONDS. Sem Redis, o evento segue sozinho
+    por process_automation_rules.
+    """
+    event = {
+        'event_type': event_type,
+        'target_gid': target_gid,
+        'target_type': target_type,
+        'actor_gid': actor_gid,
+        'workspace_gid': workspace_gid,
+        'project_gid': project_gid,
+        'data': data
+    }
+    try:
+        pipe = get_redis().pipeline()
+        pipe.rpush(AUTOMATION_QUEUE_KEY, json.dumps(event))
+        # O marcador expira sozinho se o drain agendado nunca rodar
+        pipe.set(AUTOMATION_DRAIN_KEY, 1, nx=True, ex=max(60, int(Config.AUTOMATION_BATCH_WINDOW_SECONDS * 10)))
+        _, schedule = pipe.execute()
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar evento de automação: {str(e)}")
+        process_automation_rules.delay(event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid, data)
+        return
+    
+    if schedule:
+        process_queued_automation_events.apply_async(countdown=Config.AUTOMATION_BATCH_WINDOW_SECONDS)
+
 @celery.task(bind=True)
 def process_automation_rules(self, event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid=None, data=None):
     """
@@ -21,186 +67,669 @@ def process_automation_rules(self, event_type, target_gid, target_type, actor_gi
         data: Dados adicionais do evento
     """
     try:
-        # Buscar regras ativas para o projeto
-        if project_gid:
-            rules = AutomationRule.query.filter_by(
-                project_gid=project_gid,
-                trigger_type=event_type,
-                active=True
-            ).all()
-        else:
-            # Se não há projeto específico, buscar regras globais do workspace
-            rules = []
-        
-        for rule in rules:
-            try:
-                # Verificar condições da regra
-                if _check_rule_conditions(rule, target_gid, target_type, data):
-                    # Executar ação da regra
-                    _execute_rule_action(rule, target_gid, target_type, actor_gid, data)
-                    
-                    logger.info(f"Regra {rule.gid} executada com sucesso para {target_type} {target_gid}")
-            except Exception as e:
-                logger.error(f"Erro ao executar regra {rule.gid}: {str(e)}")
-                continue
+        event = {
+            'event_type': event_type,
+            'target_gid': target_gid,
+            'target_type': target_type,
+            'actor_gid': actor_gid,
+            'workspace_gid': workspace_gid,
+            'project_gid': project_gid,
+            'data': data
+        }
+        return _process_event_batch([event])
+    
+    except Exception as e:
+        logger.error(f"Erro no processamento de regras de automação: {str(e)}")
+        self.retry(countdown=60, max_retries=3)
+
+@celery.task(bind=True)
+def process_automation_events(self, events):
+    """
+    Processa um lote de eventos de uma só vez.
+    
+    As ações das regras que casam com o lote (e com os eventos que essas ações
+    geram, em cascata) são avaliadas em memória e gravadas com um UPDATE por
+    grupo de alterações idênticas, em uma única transação.
+    
+    Args:
+        events: Lista de dicts com as mesmas chaves de process_automation_rules
+    """
+    try:
+        return _process_event_batch(events)
+    
+    except Exception as e:
+        logger.error(f"Erro no processamento do lote de automação: {str(e)}")
+        self.retry(countdown=60, max_retries=3)
+
+@celery.task(bind=True)
+def process_queued_automation_events(self, batch_size=None):
+    """
+    Esvazia a fila de eventos de automação em lotes de até batch_size eventos.
+    
+    Com o banco fora do ar, o lote que falha volta para o início da fila antes
+    do retry. Com o banco respondendo, o lote é dividido ao meio até isolar os
+    eventos com erro, que vão para AUTOMATION_DEAD_LETTER_KEY sem bloquear a fila.
+    """
+    batch_size = batch_size or Config.AUTOMATION_BATCH_SIZE
+    redis_client = get_redis()
+    # Eventos que chegarem a partir daqui agendam o próximo drain
+    redis_client.delete(AUTOMATION_DRAIN_KEY)
+    
+    results = []
+    dead_lettered = 0
+    while True:
+        # LRANGE + LTRIM em MULTI: retira o lote de forma atômica (LPOP com contagem exige Redis 6.2)
+        pipe = redis_client.pipeline()
+        pipe.lrange(AUTOMATION_QUEUE_KEY, 0, batch_size - 1)
+        pipe.ltrim(AUTOMATION_QUEUE_KEY, batch_size, -1)
+        raw_events, _ = pipe.execute()
+        if not raw_events:
+            break
         
-        # Registrar atividade no feed
-        _create_activity_record(event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid, data)
+        try:
+            results.append(_process_event_batch([json.loads(raw) for raw in raw_events]))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro no processamento do lote de automação enfileirado: {str(e)}")
+            if not _database_available():
+                redis_client.lpush(AUTOMATION_QUEUE_KEY, *reversed(raw_events))
+                raise self.retry(countdown=60, max_retries=3)
+            batch_results, failed = _process_raw_events_bisecting(raw_events)
+            results.extend(batch_results)
+            if failed:
+                redis_client.rpush(AUTOMATION_DEAD_LETTER_KEY, *failed)
+                dead_lettered += len(failed)
         
-        return {'status': 'success', 'rules_processed': len(rules)}
+        if len(raw_events) < batch_size:
+            break
+    
+    return {
+        'status': 'partial' if dead_lettered or any(result['status'] == 'partial' for result in results) else 'success',
+        'batches': len(results),
+        'events_processed': sum(result['events_processed'] for result in results),
+        'events_dead_lettered': dead_lettered
+    }
+
+def _process_raw_events_bisecting(raw_events):
+    """
+    Processa os eventos em metades até isolar os que falham sozinhos.
+    Retorna (resultados dos lotes gravados, eventos brutos com erro).
+    """
+    try:
+        return [_process_event_batch([json.loads(raw) for raw in raw_events])], []
+    except Exception as e:
+        db.session.rollback()
+        if len(raw_events) == 1:
+            logger.error(f"Evento de automação enviado para a dead letter ({raw_events[0]}): {str(e)}")
+            return [], list(raw_events)
+    
+    middle = len(raw_events) // 2
+    left_results, left_failed = _process_raw_events_bisecting(raw_events[:middle])
+    right_results, right_failed = _process_raw_events_bisecting(raw_events[middle:])
+    return left_results + right_results, left_failed + right_failed
+
+def _database_available():
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        db.session.rollback()
+        return True
+    except Exception:
+        db.session.rollback()
+        return False
+
+def _process_event_batch(events):
+    """
+    Avalia as regras para um lote de eventos, incluindo a cascata de eventos
+    gerados pelas próprias ações. As alterações nas tarefas são gravadas em uma
+    única transação; os registros de atividade seguem para o buffer do
+    activity_writer somente após o commit.
+    """
+    rules = _load_rules_for_events(events)
+    task_gids = {e['target_gid'] for e in events if e.get('target_type') == 'task' and e.get('target_gid')}
+    tasks_by_gid = _load_task_snapshots(task_gids)
+    valid_section_gids, valid_project_gids = _load_action_targets(rules)
+    metrics = RuleMetricsRecorder()
+    
+    cascade = RuleCascade(
+        rules,
+        tasks_by_gid,
+        valid_section_gids=valid_section_gids,
+        valid_project_gids=valid_project_gids,
+        max_depth=Config.AUTOMATION_MAX_CASCADE_DEPTH,
+        max_operations=Config.AUTOMATION_MAX_CASCADE_OPERATIONS,
+        metrics=metrics
+    ).run(events)
+    
+    try:
+        activity_rows = _flush_cascade(cascade, events)
+        db.session.commit()
         
+        # Tarefas antigas que entraram em projetos mudam o escopo de dias já em cache
+        invalidate_burndown_cache({project_gid for _, project_gid in cascade.added_projects()})
+    
     except Exception as e:
-        logger.error(f"Erro no processamento de regras de automação: {str(e)}")
-        self.retry(countdown=60, max_retries=3)
+        logger.error(f"Erro ao aplicar ações de automação em lote: {str(e)}")
+        db.session.rollback()
+        raise
+    finally:
+        metrics.flush()
+    
+    activity_writer.add_many(activity_rows)
+    
+    stats = cascade.stats()
+    if stats['loops_detected'] or stats['depth_limited'] or stats['budget_exhausted']:
+        logger.warning(f"Cascata de automação interrompida: {stats}")
+    
+    # Eventos cuja cascata estourou o orçamento tiveram ações descartadas
+    return {
+        'status': 'partial' if stats['truncated_events'] else 'success',
+        'events_processed': len(events),
+        'rules_processed': stats['rules_evaluated'],
+        **stats,
+        'activity_writer': activity_writer.stats()
+    }
 
-def _check_rule_conditions(rule, target_gid, target_type, data):
-    """Verifica se as condições da regra são atendidas."""
+def _load_rules_for_events(events):
+    """Busca, com uma única query, as regras ativas dos projetos do lote."""
+    project_gids = {e.get('project_gid') for e in events if e.get('project_gid')}
+    if not project_gids:
+        # Sem projeto específico não há regras (regras globais do workspace ainda não existem)
+        return []
+    
+    # Todos os triggers são carregados porque a cascata pode gerar outros tipos de evento
+    return AutomationRule.query.filter(
+        AutomationRule.project_gid.in_(project_gids),
+        AutomationRule.active == True
+    ).all()
+
+def _load_task_snapshots(task_gids):
+    """Carrega os campos usados pelas regras para um conjunto de tarefas."""
+    if not task_gids:
+        return {}
+    
+    rows = db.session.query(
+        Task.gid, Task.assignee_gid, Task.section_gid, Task.completed,
+        Task.completed_at, Task.due_on, Task.workspace_gid
+    ).filter(Task.gid.in_(task_gids)).all()
+    
+    tasks_by_gid = {row.gid: {**row._mapping, 'project_gids': set()} for row in rows}
+    
+    memberships = db.session.execute(
+        db.select(task_projects.c.task_gid, task_projects.c.project_gid)
+        .where(task_projects.c.task_gid.in_(task_gids))
+    )
+    for task_gid, project_gid in memberships:
+        tasks_by_gid[task_gid]['project_gids'].add(project_gid)
+    
+    return tasks_by_gid
+
+def _load_action_targets(rules):
+    """Valida de uma vez as seções e projetos referenciados pelas ações das regras."""
+    section_gids, project_gids = set(), set()
+    for rule in rules:
+        try:
+            params = json.loads(rule.action_parameters) if rule.action_parameters else {}
+        except ValueError:
+            params = None
+        if not isinstance(params, dict):
+            # Parâmetros inválidos são reportados como erro da regra durante a cascata
+            continue
+        if rule.action_type == 'move_to_section' and params.get('section_gid'):
+            section_gids.add(params['section_gid'])
+        elif rule.action_type == 'add_to_project' and params.get('project_gid'):
+            project_gids.add(params['project_gid'])
+    
+    valid_sections = {
+        gid for (gid,) in db.session.query(Section.gid).filter(Section.gid.in_(section_gids))
+    } if section_gids else set()
+    valid_projects = {
+        gid for (gid,) in db.session.query(Project.gid).filter(Project.gid.in_(project_gids))
+    } if project_gids else set()
+    
+    return valid_sections, valid_projects
+
+def _flush_cascade(cascade, events):
+    """
+    Grava o estado final da cascata: um UPDATE por conjunto de valores idênticos
+    e um INSERT em task_projects. Não faz commit: o chamador controla a transação.
+    
+    Retorna os registros de atividade (eventos, eventos derivados e auditoria).
+    """
+    # Agrupar tarefas que receberam exatamente as mesmas alterações
+    update_groups = {}
+    for task_gid, changes in cascade.task_changes().items():
+        update_groups.setdefault(tuple(sorted(changes.items())), []).append(task_gid)
+    
+    changed_gids = set()
+    for values, group_gids in update_groups.items():
+        db.session.execute(
+            db.update(Task)
+            .where(Task.gid.in_(group_gids))
+            .values(**dict(values), modified_at=cascade.now, version=Task.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        changed_gids.update(group_gids)
+    
+    new_memberships = cascade.added_projects()
+    if new_memberships:
+        db.session.execute(
+            task_projects.insert(),
+            [{'task_gid': task_gid, 'project_gid': project_gid} for task_gid, project_gid in new_memberships]
+        )
+        added_only = {task_gid for task_gid, _ in new_memberships} - changed_gids
+        if added_only:
+            db.session.execute(
+                db.update(Task)
+                .where(Task.gid.in_(added_only))
+                .values(modified_at=cascade.now, version=Task.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+    
+    activity_rows = [build_activity_row(**event) for event in events + cascade.derived_events]
+    
+    # Registro de auditoria por tarefa alterada pela automação
+    for execution in cascade.executions:
+        if not execution['changed']:
+            continue
+        activity_rows.append(build_activity_row(
+            'automation_action_executed', execution['task_gid'], 'task', None,
+            execution['workspace_gid'], execution['project_gid'],
+            {
+                'rule_gid': execution['rule_gid'],
+                'action_type': execution['action_type'],
+                'action_parameters': execution['action_parameters'],
+                'cascade_depth': execution['depth']
+            }
+        ))
+    
+    return activity_rows
+
+def simulate_automation_rule(rule, tasks=None, sample_size=100, include_cascade=False, report_limit=200):
+    """
+    Simula uma regra sobre tarefas mantidas em memória, sem nenhuma escrita.
+    
+    Args:
+        rule: Regra a ser testada
+        tasks: Snapshots fornecidos pelo usuário (opcional)
+        sample_size: Quantidade de tarefas do projeto amostradas quando tasks não é fornecido
+        include_cascade: Se True, considera também as demais regras ativas do projeto
+        report_limit: Número máximo de tarefas detalhadas no relatório
+    """
+    timings = {}
+    
+    started = time.perf_counter()
+    if tasks is not None:
+        tasks_by_gid = _normalize_simulated_tasks(tasks, rule.project_gid)
+    else:
+        sample_gids = [
+            gid for (gid,) in db.session.execute(
+                db.select(task_projects.c.task_gid)
+                .where(task_projects.c.project_gid == rule.project_gid)
+                .limit(sample_size)
+            )
+        ]
+        tasks_by_gid = _load_task_snapshots(sample_gids)
+    
+    rules = [rule]
+    if include_cascade:
+        rules += AutomationRule.query.filter(
+            AutomationRule.project_gid == rule.project_gid,
+            AutomationRule.active == True,
+            AutomationRule.gid != rule.gid
+        ).all()
+    valid_section_gids, valid_project_gids = _load_action_targets(rules)
+    timings['load_ms'] = _elapsed_ms(started)
+    
+    started = time.perf_counter()
+    events = [{
+        'event_type': rule.trigger_type,
+        'target_gid': gid,
+        'target_type': 'task',
+        'actor_gid': None,
+        'workspace_gid': task.get('workspace_gid'),
+        'project_gid': rule.project_gid,
+        'data': None
+    } for gid, task in tasks_by_gid.items()]
+    
+    cascade = RuleCascade(
+        rules,
+        tasks_by_gid,
+        valid_section_gids=valid_section_gids,
+        valid_project_gids=valid_project_gids,
+        max_depth=Config.AUTOMATION_MAX_CASCADE_DEPTH if include_cascade else 0,
+        max_operations=Config.AUTOMATION_MAX_CASCADE_OPERATIONS if include_cascade else 1
+    ).run(events)
+    timings['evaluate_ms'] = _elapsed_ms(started)
+    
+    started = time.perf_counter()
+    matched_gids = [e['task_gid'] for e in cascade.executions if e['rule_gid'] == rule.gid and e['depth'] == 0]
+    task_changes = cascade.task_changes()
+    added_projects = {}
+    for task_gid, project_gid in cascade.added_projects():
+        added_projects.setdefault(task_gid, []).append(project_gid)
+    
+    changed_gids = list(dict.fromkeys(list(task_changes) + list(added_projects)))
+    changes = []
+    for task_gid in changed_gids[:report_limit]:
+        original = tasks_by_gid[task_gid]
+        changes.append({
+            'task_gid': task_gid,
+            'changes': {
+                field: {'from': _serialize_value(original.get(field)), 'to': _serialize_value(value)}
+                for field, value in task_changes.get(task_gid, {}).items()
+            },
+            'added_to_projects': added_projects.get(task_gid, [])
+        })
+    timings['report_ms'] = _elapsed_ms(started)
+    
+    return {
+        'dry_run': True,
+        'tasks_evaluated': len(tasks_by_gid),
+        'matched_count': len(matched_gids),
+        'matched_task_gids': matched_gids[:report_limit],
+        'changed_count': len(changed_gids),
+        'changes': changes,
+        'truncated': len(matched_gids) > report_limit or len(changed_gids) > report_limit,
+        'cascade': cascade.stats() if include_cascade else None,
+        'timings': timings
+    }
+
+def _normalize_simulated_tasks(tasks, project_gid):
+    """
+    Converte as tarefas fornecidas para o formato de snapshot usado pelo motor.
+    Entradas inválidas levantam ValueError (400 na rota).
+    """
+    tasks_by_gid = {}
+    for index, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            raise ValueError(f'tasks[{index}] must be an object')
+        gid = task.get('gid') or f'simulated-task-{index}'
+        due_on = task.get('due_on')
+        if isinstance(due_on, str):
+            try:
+                due_on = datetime.strptime(due_on, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError(f'tasks[{index}].due_on must be YYYY-MM-DD')
+        project_gids = task.get('project_gids') or [project_gid]
+        if not isinstance(project_gids, list):
+            raise ValueError(f'tasks[{index}].project_gids must be a list')
+        tasks_by_gid[gid] = {
+            'gid': gid,
+            'assignee_gid': task.get('assignee_gid'),
+            'section_gid': task.get('section_gid'),
+            'completed': bool(task.get('completed', False)),
+            'completed_at': None,
+            'due_on': due_on,
+            'workspace_gid': task.get('workspace_gid'),
+            'project_gids': set(project_gids)
+        }
+    return tasks_by_gid
+
+def _serialize_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+@celery.task(bind=True)
+def cleanup_old_activities(self, days_old=None, cutoff=None, batch_size=None, deleted_so_far=0):
+    """
+    Remove atividades antigas do feed em lotes pequenos, um commit por lote.
+    
+    Cada lote seleciona pelo índice (created_at, gid) os gids mais antigos que o
+    corte e os apaga com DELETE ... WHERE gid IN (...), com uma pausa entre lotes
+    para não disputar I/O e locks com o tráfego normal. Ao atingir o tempo máximo
+    de execução a tarefa se reagenda com o mesmo corte, continuando de onde parou.
+    """
     try:
-        conditions = json.loads(rule.trigger_conditions) if rule.trigger_conditions else {}
+        from datetime import timedelta
+        
+        if days_old is None:
+            days_old = Config.ACTIVITY_RETENTION_DAYS
+        if batch_size is None:
+            batch_size = Config.ACTIVITY_PURGE_BATCH_SIZE
         
-        if not conditions:
-            return True  # Sem condições específicas, sempre executa
+        # O corte é fixado na primeira execução para que as continuações apaguem o mesmo conjunto
+        cutoff_date = datetime.fromisoformat(cutoff) if cutoff else datetime.utcnow() - timedelta(days=days_old)
         
-        # Buscar o objeto alvo
-        if target_type == 'task':
-            target_obj = Task.query.get(target_gid)
-            if not target_obj:
-                return False
+        started = time.monotonic()
+        deleted = deleted_so_far
+        batches = 0
+        
+        while True:
+            removed = _purge_activity_batch(cutoff_date, batch_size)
+            deleted += removed
+            batches += 1
+            
+            # Progresso visível via AsyncResult.info enquanto a tarefa roda
+            if removed and self.request.id:
+                self.update_state(state='PROGRESS', meta={
+                    'cutoff': cutoff_date.isoformat(),
+                    'deleted_count': deleted,
+                    'batches': batches
+                })
             
-            # Verificar condições específicas para tarefas
-            if 'assignee_gid' in conditions:
-                if target_obj.assignee_gid != conditions['assignee_gid']:
-                    return False
+            if removed < batch_size:
+                break
             
-            if 'section_gid' in conditions:
-                if target_obj.section_gid != conditions['section_gid']:
-                    return False
+            if time.monotonic() - started >= Config.ACTIVITY_PURGE_MAX_RUNTIME_SECONDS:
+                logger.info(f"Limpeza de atividades pausada após {deleted} remoções; reagendando")
+                cleanup_old_activities.apply_async(kwargs={
+                    'days_old': days_old,
+                    'cutoff': cutoff_date.isoformat(),
+                    'batch_size': batch_size,
+                    'deleted_so_far': deleted
+                })
+                return {
+                    'status': 'rescheduled',
+                    'removed_count': deleted,
+                    'cutoff': cutoff_date.isoformat()
+                }
             
-            if 'custom_field' in conditions:
-                field_condition = conditions['custom_field']
-                # Verificar valor de campo personalizado
-                # Implementação seria expandida conforme necessário
-                pass
+            time.sleep(Config.ACTIVITY_PURGE_SLEEP_SECONDS)
         
-        return True
+        logger.info(f"Removidas {deleted} atividades antigas")
         
+        return {'status': 'success', 'removed_count': deleted, 'cutoff': cutoff_date.isoformat()}
+    
     except Exception as e:
-        logger.error(f"Erro ao verificar condições da regra {rule.gid}: {str(e)}")
-        return False
+        db.session.rollback()
+        logger.error(f"Erro na limpeza de atividades antigas: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+def _purge_activity_batch(cutoff_date, batch_size):
+    """Apaga até batch_size atividades anteriores ao corte e faz commit. Retorna quantas foram apagadas."""
+    gids = db.session.execute(
+        db.select(ActivityFeed.gid)
+        .where(ActivityFeed.created_at < cutoff_date)
+        .order_by(ActivityFeed.created_at, ActivityFeed.gid)
+        .limit(batch_size)
+    ).scalars().all()
+    
+    if not gids:
+        return 0
+    
+    db.session.execute(db.delete(ActivityFeed).where(ActivityFeed.gid.in_(gids)))
+    db.session.commit()
+    return len(gids)
 
-def _execute_rule_action(rule, target_gid, target_type, actor_gid, data):
-    """Executa a ação definida na regra."""
+@celery.task(bind=True)
+def cleanup_activity_inbox(self, read_days=None, max_age_days=None, read_cutoff=None, age_cutoff=None, deleted_so_far=0):
+    """
+    Remove da caixa de entrada os itens lidos há mais de read_days e qualquer
+    item com mais de max_age_days, em lotes pequenos como cleanup_old_activities.
+    Os contadores de não lidas descontam os itens não lidos que expiram.
+    """
     try:
-        action_params = json.loads(rule.action_parameters) if rule.action_parameters else {}
+        from datetime import timedelta
+        from src.tasks.activity_inbox import purge_inbox_batch
+        
+        if read_days is None:
+            read_days = Config.ACTIVITY_INBOX_READ_RETENTION_DAYS
+        if max_age_days is None:
+            max_age_days = Config.ACTIVITY_INBOX_MAX_AGE_DAYS
         
-        if rule.action_type == 'move_to_section':
-            _move_task_to_section(target_gid, action_params.get('section_gid'))
+        # Cortes fixados na primeira execução para que as continuações apaguem o mesmo conjunto
+        now = datetime.utcnow()
+        read_cutoff_date = datetime.fromisoformat(read_cutoff) if read_cutoff else now - timedelta(days=read_days)
+        age_cutoff_date = datetime.fromisoformat(age_cutoff) if age_cutoff else now - timedelta(days=max_age_days)
+        batch_size = Config.ACTIVITY_PURGE_BATCH_SIZE
         
-        elif rule.action_type == 'assign_task':
-            _assign_task(target_gid, action_params.get('assignee_gid'))
+        started = time.monotonic()
+        deleted = deleted_so_far
         
-        elif rule.action_type == 'mark_complete':
-            _mark_task_complete(target_gid)
+        while True:
+            removed = purge_inbox_batch(read_cutoff_date, age_cutoff_date, batch_size)
+            deleted += removed
+            if removed < batch_size:
+                break
+            
+            if time.monotonic() - started >= Config.ACTIVITY_PURGE_MAX_RUNTIME_SECONDS:
+                logger.info(f"Limpeza da caixa de entrada pausada após {deleted} remoções; reagendando")
+                cleanup_activity_inbox.apply_async(kwargs={
+                    'read_days': read_days,
+                    'max_age_days': max_age_days,
+                    'read_cutoff': read_cutoff_date.isoformat(),
+                    'age_cutoff': age_cutoff_date.isoformat(),
+                    'deleted_so_far': deleted
+                })
+                return {'status': 'rescheduled', 'removed_count': deleted}
+            
+            time.sleep(Config.ACTIVITY_PURGE_SLEEP_SECONDS)
         
-        elif rule.action_type == 'add_to_project':
-            _add_task_to_project(target_gid, action_params.get('project_gid'))
+        logger.info(f"Removidos {deleted} itens antigos da caixa de entrada")
         
-        elif rule.action_type == 'set_due_date':
-            _set_task_due_date(target_gid, action_params.get('due_date'))
+        return {'status': 'success', 'removed_count': deleted}
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro na limpeza da caixa de entrada: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+@celery.task
+def maintain_activity_partitions(retention_days=None):
+    """Cria as partições futuras do feed e arquiva no armazenamento frio os meses expirados."""
+    try:
+        from src.tasks.activity_partitions import uses_native_partitions, ensure_partitions, archive_expired_activity
         
-        # Adicionar mais tipos de ação conforme necessário
+        created = ensure_partitions() if uses_native_partitions() else []
+        archived = archive_expired_activity(retention_days)
         
-        db.session.commit()
+        logger.info(f"Partições de atividades: {len(created)} criadas, {len(archived)} meses arquivados")
         
+        return {'status': 'success', 'created_partitions': created, 'archived': archived}
+    
     except Exception as e:
-        logger.error(f"Erro ao executar ação da regra {rule.gid}: {str(e)}")
         db.session.rollback()
-        raise
-
-def _move_task_to_section(task_gid, section_gid):
-    """Move uma tarefa para uma seção específica."""
-    task = Task.query.get(task_gid)
-    if task and section_gid:
-        section = Section.query.get(section_gid)
-        if section:
-            task.section_gid = section_gid
-            task.modified_at = datetime.utcnow()
-
-def _assign_task(task_gid, assignee_gid):
-    """Atribui uma tarefa a um usuário."""
-    task = Task.query.get(task_gid)
-    if task:
-        task.assignee_gid = assignee_gid
-        task.modified_at = datetime.utcnow()
-
-def _mark_task_complete(task_gid):
-    """Marca uma tarefa como concluída."""
-    task = Task.query.get(task_gid)
-    if task:
-        task.completed = True
-        task.completed_at = datetime.utcnow()
-        task.modified_at = datetime.utcnow()
-
-def _add_task_to_project(task_gid, project_gid):
-    """Adiciona uma tarefa a um projeto."""
-    from src.models.enhanced_work_graph import Project
-    task = Task.query.get(task_gid)
-    project = Project.query.get(project_gid)
-    if task and project and project not in task.projects:
-        task.projects.append(project)
-        task.modified_at = datetime.utcnow()
-
-def _set_task_due_date(task_gid, due_date_str):
-    """Define a data de vencimento de uma tarefa."""
-    from datetime import datetime
-    task = Task.query.get(task_gid)
-    if task and due_date_str:
-        try:
-            due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
-            task.due_on = due_date
-            task.modified_at = datetime.utcnow()
-        except ValueError:
-            logger.error(f"Formato de data inválido: {due_date_str}")
+        logger.error(f"Erro na manutenção das partições de atividades: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
 
-def _create_activity_record(event_type, target_gid, target_type, actor_gid, workspace_gid, project_gid, data):
-    """Cria um registro de atividade no feed."""
+@celery.task
+def refresh_activity_display_names(days=None):
+    """
+    Atualiza o snapshot de nomes (ator, alvo, projeto) das atividades recentes e
+    dos itens de caixa de entrada cujas entidades foram renomeadas. Linhas antigas
+    ainda sem snapshot também são preenchidas.
+    """
     try:
-        activity = ActivityFeed(
-            event_type=event_type,
-            actor_gid=actor_gid,
-            target_gid=target_gid,
-            target_type=target_type,
-            project_gid=project_gid,
-            workspace_gid=workspace_gid,
-            data=json.dumps(data) if data else None
-        )
-        db.session.add(activity)
+        from datetime import timedelta
+        
+        if days is None:
+            days = Config.ACTIVITY_NAME_REFRESH_DAYS
+        since = datetime.utcnow() - timedelta(days=days)
+        
+        updated = 0
+        for table in (ActivityFeed.__table__, ActivityInboxItem.__table__):
+            updated += _refresh_display_names(table, since)
         db.session.commit()
+        
+        logger.info(f"Nomes de exibição atualizados em {updated} registros de atividade")
+        
+        return {'status': 'success', 'updated_count': updated}
+    
     except Exception as e:
-        logger.error(f"Erro ao criar registro de atividade: {str(e)}")
         db.session.rollback()
+        logger.error(f"Erro ao atualizar nomes de exibição das atividades: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+def _refresh_display_names(table, since):
+    """Um UPDATE ... FROM por coluna de nome, tocando só as linhas divergentes."""
+    users, tasks, projects = User.__table__, Task.__table__, Project.__table__
+    c = table.c
+    recent = c.created_at >= since
+    
+    def stale(column, name):
+        return db.or_(column.is_(None), column != name)
+    
+    statements = [
+        table.update().where(
+            recent, c.actor_gid == users.c.gid, stale(c.actor_name, users.c.name)
+        ).values(actor_name=users.c.name),
+        table.update().where(
+            recent, c.target_type == 'task', c.target_gid == tasks.c.gid, stale(c.target_name, tasks.c.name)
+        ).values(target_name=tasks.c.name),
+        table.update().where(
+            recent, c.target_type == 'project', c.target_gid == projects.c.gid, stale(c.target_name, projects.c.name)
+        ).values(target_name=projects.c.name),
+        table.update().where(
+            recent, c.project_gid == projects.c.gid, stale(c.project_name, projects.c.name)
+        ).values(project_name=projects.c.name),
+    ]
+    return sum(db.session.execute(statement).rowcount for statement in statements)
 
 @celery.task
-def cleanup_old_activities(days_old=30):
-    """Remove atividades antigas do feed para manter performance."""
+def backfill_activity_rollups(days=30, end_date=None, retention_days=None):
+    """
+    Reconstrói os rollups diários de atividades a partir do feed bruto, um dia por transação.
+    
+    O padrão termina ontem: o dia corrente ainda recebe upserts do activity_writer.
+    Dias fora da retenção (feed bruto já removido ou arquivado) são pulados para
+    não apagar o histórico que só existe nos rollups.
+    """
     try:
-        from datetime import datetime, timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+        from datetime import timedelta
+        from src.tasks.activity_rollups import first_rebuildable_day, rebuild_rollups_for_day
         
-        old_activities = ActivityFeed.query.filter(
-            ActivityFeed.created_at < cutoff_date
-        ).all()
+        if retention_days is None:
+            retention_days = Config.ACTIVITY_RETENTION_DAYS
         
-        count = len(old_activities)
-        for activity in old_activities:
-            db.session.delete(activity)
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else \
+            datetime.utcnow().date() - timedelta(days=1)
+        first_day = first_rebuildable_day(retention_days)
+        rebuilt_rows = 0
+        rebuilt_days = []
+        skipped_days = []
         
-        db.session.commit()
-        logger.info(f"Removidas {count} atividades antigas")
+        for offset in range(days):
+            day = last_day - timedelta(days=offset)
+            if day < first_day:
+                skipped_days.append(day.isoformat())
+                continue
+            try:
+                rows = rebuild_rollups_for_day(day)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao reconstruir rollups de {day.isoformat()}: {str(e)}")
+                raise
+            if rows is None:
+                skipped_days.append(day.isoformat())
+            else:
+                rebuilt_rows += rows
+                rebuilt_days.append(day.isoformat())
         
-        return {'status': 'success', 'removed_count': count}
+        logger.info(
+            f"Rollups de atividades reconstruídos: {len(rebuilt_days)} dias, {rebuilt_rows} linhas "
+            f"({len(skipped_days)} dias mantidos)"
+        )
         
+        return {
+            'status': 'success',
+            'days': len(rebuilt_days),
+            'rollup_rows': rebuilt_rows,
+            'skipped_days': skipped_days
+        }
+    
     except Exception as e:
-        logger.error(f"Erro na limpeza de atividades antigas: {str(e)}")
+        logger.error(f"Erro no backfill de rollups de atividades: {str(e)}")
         return {'status': 'error', 'message': str(e)}
-
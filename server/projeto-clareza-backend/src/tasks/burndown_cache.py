@@ -0,0 +1,117 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.enhanced_work_graph import db, Task, task_projects
+from src.models import work_graph
+from src.config import Config
+from src.tasks.rule_metrics import get_redis
+from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hash por projeto com os contadores diários de dias já encerrados
+BURNDOWN_CACHE_PREFIX = 'project:burndown:'
+
+_listeners_registered = False
+
+def read_cached_days(project_gid, days):
+    """Contadores em cache dos dias pedidos. Retorna {dia: (criadas, concluídas)}."""
+    if not days:
+        return {}
+    try:
+        values = get_redis().hmget(f'{BURNDOWN_CACHE_PREFIX}{project_gid}', [day.isoformat() for day in days])
+    except Exception as e:
+        logger.warning(f"Cache de burndown indisponível: {str(e)}")
+        return {}
+    return {day: tuple(json.loads(value)) for day, value in zip(days, values) if value is not None}
+
+def write_cached_days(project_gid, counts):
+    if not counts:
+        return
+    try:
+        key = f'{BURNDOWN_CACHE_PREFIX}{project_gid}'
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(key, mapping={day.isoformat(): json.dumps(list(value)) for day, value in counts.items()})
+        # Escritas feitas por fora do ORM não invalidam o cache; o TTL as cobre
+        pipe.expire(key, Config.BURNDOWN_CACHE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o cache de burndown: {str(e)}")
+
+def invalidate_burndown_cache(project_gids):
+    """Descarta os dias em cache dos projetos; a próxima leitura os recalcula."""
+    if not project_gids:
+        return
+    try:
+        get_redis().delete(*[f'{BURNDOWN_CACHE_PREFIX}{project_gid}' for project_gid in project_gids])
+    except Exception as e:
+        logger.warning(f"Não foi possível invalidar o cache de burndown: {str(e)}")
+
+def init_burndown_invalidation():
+    """
+    Registra (uma vez por processo) os listeners do ORM que invalidam o cache de
+    burndown quando uma tarefa muda um dia já encerrado: tarefas criadas ou
+    concluídas antes de hoje que são removidas, reabertas, redatadas ou trocam
+    de projeto. Mudanças restritas ao dia corrente não tocam o cache, que nunca
+    guarda o dia de hoje. A invalidação só acontece depois do commit.
+    """
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+    
+    def before_flush(session, flush_context, instances):
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        stale = set()
+        for tasks, kind in ((session.new, 'new'), (session.dirty, 'dirty'), (session.deleted, 'deleted')):
+            for task in tasks:
+                if isinstance(task, (Task, work_graph.Task)) and _touches_finished_days(task, kind, today):
+                    stale.update(_task_project_gids(session, task))
+        if stale:
+            session.info.setdefault('burndown_invalidations', set()).update(stale)
+    
+    def after_commit(session):
+        invalidate_burndown_cache(session.info.pop('burndown_invalidations', None))
+    
+    def after_rollback(session):
+        session.info.pop('burndown_invalidations', None)
+    
+    event.listen(Session, 'before_flush', before_flush)
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_rollback', after_rollback)
+
+def _touches_finished_days(task, kind, today):
+    state = inspect(task)
+    if kind == 'dirty':
+        if isinstance(task, Task) and state.attrs.projects.history.has_changes():
+            return _before(task.created_at, today) or _before(task.completed_at, today)
+        changed = [
+            value
+            for name in ('created_at', 'completed_at', 'completed')
+            for value in _history_values(state, name)
+        ]
+        if not changed:
+            return False
+        # Reabrir ou concluir sem mexer em completed_at afeta o dia da conclusão atual
+        return any(_before(value, today) for value in changed) or _before(task.completed_at, today)
+    return _before(task.created_at, today) or _before(task.completed_at, today)
+
+def _history_values(state, name):
+    history = state.attrs[name].history
+    if not history.has_changes():
+        return []
+    return list(history.added) + list(history.deleted)
+
+def _before(value, today):
+    return isinstance(value, datetime) and value < today
+
+def _task_project_gids(session, task):
+    """Projetos atuais da tarefa e os de que ela acabou de sair."""
+    project_gids = set(session.execute(
+        db.select(task_projects.c.project_gid).where(task_projects.c.task_gid == task.gid)
+    ).scalars())
+    if isinstance(task, Task):
+        history = inspect(task).attrs.projects.history
+        project_gids.update(project.gid for project in list(history.added) + list(history.deleted))
+    return project_gids
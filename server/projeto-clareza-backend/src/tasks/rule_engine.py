@@ -0,0 +1,279 @@
+from collections import deque
+from datetime import datetime
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Evento gerado quando uma ação realmente altera a tarefa.
+# add_to_project não tem trigger correspondente e por isso não encadeia.
+ACTION_EVENTS = {
+    'move_to_section': 'task_moved',
+    'assign_task': 'task_assigned',
+    'mark_complete': 'task_completed',
+    'set_due_date': 'field_changed',
+}
+
+# Campos da tarefa que as ações podem alterar
+TRACKED_FIELDS = ('section_gid', 'assignee_gid', 'completed', 'completed_at', 'due_on')
+
+class RuleCascade:
+    """
+    Avalia regras de automação em memória, realimentando os eventos gerados
+    pelas próprias ações até esgotar a profundidade ou o orçamento de operações.
+    Cada evento de origem tem a sua própria cascata: orçamento e detecção de
+    laços valem por evento, e um evento que estoura o orçamento não impede o
+    processamento dos seguintes.
+    
+    Nada é escrito no banco: o resultado fica em `executions`, `derived_events`
+    e `task_changes()`, para ser aplicado em uma única transação ou apenas
+    reportado (simulação).
+    
+    Args:
+        rules: Regras ativas (objetos com os campos de AutomationRule)
+        tasks_by_gid: Snapshots das tarefas {gid: {campo: valor, 'project_gids': set}}
+        valid_section_gids: Seções existentes (None dispensa a validação)
+        valid_project_gids: Projetos existentes (None dispensa a validação)
+        max_depth: Profundidade máxima de encadeamento
+        max_operations: Número máximo de execuções de ações na cascata de cada evento de origem
+        metrics: Coletor opcional de métricas por regra (RuleMetricsRecorder)
+    """
+    
+    def __init__(self, rules, tasks_by_gid, valid_section_gids=None, valid_project_gids=None,
+                 max_depth=5, max_operations=500, now=None, metrics=None):
+        self.metrics = metrics
+        self.max_depth = max_depth
+        self.max_operations = max_operations
+        self.valid_section_gids = valid_section_gids
+        self.valid_project_gids = valid_project_gids
+        self.now = now or datetime.utcnow()
+        
+        self.rules_by_trigger = {}
+        for rule in rules:
+            self.rules_by_trigger.setdefault((rule.project_gid, rule.trigger_type), []).append(rule)
+        
+        self.original = tasks_by_gid
+        self.tasks = {
+            gid: {**snapshot, 'project_gids': set(snapshot.get('project_gids', ()))}
+            for gid, snapshot in tasks_by_gid.items()
+        }
+        
+        self.executions = []
+        self.derived_events = []
+        self.rules_evaluated = 0
+        self.operations = 0
+        self.max_depth_reached = 0
+        self.loops_detected = 0
+        self.depth_limited = False
+        self.budget_exhausted = False
+        self.truncated_events = 0
+        self.errors = 0
+    
+    def run(self, events):
+        """Processa os eventos, cada um com a cascata dos eventos derivados dele."""
+        for event in events:
+            self._run_cascade(event)
+        return self
+    
+    def _run_cascade(self, root):
+        visited = set()
+        operations = 0
+        queue = deque([(root, 0)])
+        
+        while queue:
+            event, depth = queue.popleft()
+            self.max_depth_reached = max(self.max_depth_reached, depth)
+            rules = self.rules_by_trigger.get((event.get('project_gid'), event['event_type']), [])
+            
+            for rule in rules:
+                self.rules_evaluated += 1
+                
+                # Todas as ações atuais operam sobre tarefas
+                if event.get('target_type') != 'task':
+                    continue
+                task = self.tasks.get(event['target_gid'])
+                if task is None:
+                    continue
+                
+                started = time.perf_counter()
+                matched = check_rule_conditions(rule, task)
+                if self.metrics:
+                    self.metrics.record_evaluation(rule.gid, time.perf_counter() - started, matched)
+                if not matched:
+                    continue
+                
+                # Uma regra dispara no máximo uma vez por tarefa na cascata deste evento
+                key = (rule.gid, task['gid'])
+                if key in visited:
+                    self.loops_detected += 1
+                    continue
+                
+                if operations >= self.max_operations:
+                    # O restante desta cascata é descartado; os próximos eventos seguem
+                    self.budget_exhausted = True
+                    self.truncated_events += 1
+                    logger.warning(
+                        f"Orçamento de {self.max_operations} operações esgotado na cascata do evento "
+                        f"{root['event_type']} de {root.get('target_gid')}"
+                    )
+                    return
+                
+                visited.add(key)
+                operations += 1
+                self.operations += 1
+                
+                started = time.perf_counter()
+                try:
+                    action_params = json.loads(rule.action_parameters) if rule.action_parameters else {}
+                    changed = self._apply_action(rule.action_type, action_params, task)
+                except Exception as e:
+                    self.errors += 1
+                    if self.metrics:
+                        self.metrics.record_action(rule.gid, time.perf_counter() - started, error=True)
+                    logger.error(f"Erro ao executar regra {rule.gid}: {str(e)}")
+                    continue
+                if self.metrics:
+                    self.metrics.record_action(rule.gid, time.perf_counter() - started)
+                
+                self.executions.append({
+                    'rule_gid': rule.gid,
+                    'project_gid': rule.project_gid,
+                    'task_gid': task['gid'],
+                    'workspace_gid': task.get('workspace_gid'),
+                    'action_type': rule.action_type,
+                    'action_parameters': action_params,
+                    'depth': depth,
+                    'changed': changed
+                })
+                
+                derived_type = ACTION_EVENTS.get(rule.action_type)
+                if not changed or not derived_type:
+                    continue
+                if depth + 1 > self.max_depth:
+                    self.depth_limited = True
+                    continue
+                
+                derived = {
+                    'event_type': derived_type,
+                    'target_gid': task['gid'],
+                    'target_type': 'task',
+                    'actor_gid': None,
+                    'workspace_gid': task.get('workspace_gid'),
+                    'project_gid': event.get('project_gid'),
+                    'data': {'triggered_by_rule': rule.gid, 'cascade_depth': depth + 1}
+                }
+                self.derived_events.append(derived)
+                queue.append((derived, depth + 1))
+    
+    def task_changes(self):
+        """Retorna {task_gid: {campo: novo_valor}} apenas com o que mudou."""
+        changes = {}
+        for gid, task in self.tasks.items():
+            original = self.original[gid]
+            diff = {
+                field: task.get(field) for field in TRACKED_FIELDS
+                if task.get(field) != original.get(field)
+            }
+            if diff:
+                changes[gid] = diff
+        return changes
+    
+    def added_projects(self):
+        """Retorna os pares (task_gid, project_gid) criados pela cascata."""
+        pairs = []
+        for gid, task in self.tasks.items():
+            for project_gid in task['project_gids'] - set(self.original[gid].get('project_gids', ())):
+                pairs.append((gid, project_gid))
+        return pairs
+    
+    def stats(self):
+        return {
+            'rules_evaluated': self.rules_evaluated,
+            'actions_executed': len(self.executions),
+            'derived_events': len(self.derived_events),
+            'max_depth_reached': self.max_depth_reached,
+            'loops_detected': self.loops_detected,
+            'errors': self.errors,
+            'depth_limited': self.depth_limited,
+            'budget_exhausted': self.budget_exhausted,
+            'truncated_events': self.truncated_events
+        }
+    
+    def _apply_action(self, action_type, action_params, task):
+        """Aplica a ação no snapshot da tarefa. Retorna True se algo mudou."""
+        if action_type == 'move_to_section':
+            section_gid = action_params.get('section_gid')
+            if not section_gid or not self._is_valid(section_gid, self.valid_section_gids):
+                return False
+            return self._set(task, section_gid=section_gid)
+        
+        elif action_type == 'assign_task':
+            return self._set(task, assignee_gid=action_params.get('assignee_gid'))
+        
+        elif action_type == 'mark_complete':
+            if task.get('completed'):
+                return False
+            return self._set(task, completed=True, completed_at=self.now)
+        
+        elif action_type == 'add_to_project':
+            project_gid = action_params.get('project_gid')
+            if not project_gid or not self._is_valid(project_gid, self.valid_project_gids):
+                return False
+            if project_gid in task['project_gids']:
+                return False
+            task['project_gids'].add(project_gid)
+            return True
+        
+        elif action_type == 'set_due_date':
+            due_date_str = action_params.get('due_date')
+            if not due_date_str:
+                return False
+            try:
+                due_on = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                logger.error(f"Formato de data inválido: {due_date_str}")
+                return False
+            return self._set(task, due_on=due_on)
+        
+        # Adicionar mais tipos de ação conforme necessário
+        return False
+    
+    @staticmethod
+    def _is_valid(gid, valid_gids):
+        return valid_gids is None or gid in valid_gids
+    
+    @staticmethod
+    def _set(task, **values):
+        changed = any(task.get(field) != value for field, value in values.items())
+        task.update(values)
+        return changed
+
+def check_rule_conditions(rule, task):
+    """Verifica se as condições da regra são atendidas pelo snapshot da tarefa."""
+    try:
+        conditions = json.loads(rule.trigger_conditions) if rule.trigger_conditions else {}
+        
+        if not conditions:
+            return True  # Sem condições específicas, sempre executa
+        
+        # Verificar condições específicas para tarefas
+        if 'assignee_gid' in conditions:
+            if task.get('assignee_gid') != conditions['assignee_gid']:
+                return False
+        
+        if 'section_gid' in conditions:
+            if task.get('section_gid') != conditions['section_gid']:
+                return False
+        
+        if 'custom_field' in conditions:
+            field_condition = conditions['custom_field']
+            # Verificar valor de campo personalizado
+            # Implementação seria expandida conforme necessário
+            pass
+        
+        return True
+    
+    except Exception as e:
+        logger.error(f"Erro ao verificar condições da regra {rule.gid}: {str(e)}")
+        return False
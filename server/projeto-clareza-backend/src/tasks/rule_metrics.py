@@ -0,0 +1,122 @@
+from src.config import Config
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (em ms) dos buckets dos histogramas de latência
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+KEY_PREFIX = 'automation:rule_stats:'
+
+_redis_client = None
+
+def get_redis():
+    """Cliente Redis compartilhado pelo processo (criado sob demanda)."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(Config.REDIS_URL)
+    return _redis_client
+
+def _bucket_label(elapsed_ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f'le_{bound}'
+    return 'le_inf'
+
+class RuleMetricsRecorder:
+    """
+    Acumula métricas por regra em memória durante o processamento de um lote
+    e as envia ao Redis de uma só vez em flush().
+    """
+    
+    def __init__(self):
+        self.counters = {}
+    
+    def _incr(self, rule_gid, field, amount=1):
+        rule_counters = self.counters.setdefault(rule_gid, {})
+        rule_counters[field] = rule_counters.get(field, 0) + amount
+    
+    def record_evaluation(self, rule_gid, elapsed_seconds, matched):
+        elapsed_ms = elapsed_seconds * 1000
+        self._incr(rule_gid, 'evaluations')
+        self._incr(rule_gid, 'evaluation_us_total', int(elapsed_ms * 1000))
+        self._incr(rule_gid, f'evaluation_{_bucket_label(elapsed_ms)}')
+        if matched:
+            self._incr(rule_gid, 'matches')
+    
+    def record_action(self, rule_gid, elapsed_seconds, error=False):
+        elapsed_ms = elapsed_seconds * 1000
+        self._incr(rule_gid, 'errors' if error else 'executions')
+        self._incr(rule_gid, 'action_us_total', int(elapsed_ms * 1000))
+        self._incr(rule_gid, f'action_{_bucket_label(elapsed_ms)}')
+    
+    def flush(self):
+        """Envia os contadores acumulados ao Redis. Falhas não interrompem a automação."""
+        if not self.counters:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for rule_gid, rule_counters in self.counters.items():
+                for field, amount in rule_counters.items():
+                    pipe.hincrby(f'{KEY_PREFIX}{rule_gid}', field, amount)
+            pipe.execute()
+            self.counters = {}
+        except Exception as e:
+            logger.error(f"Erro ao enviar métricas de regras para o Redis: {str(e)}")
+
+def get_rule_stats(rule_gids):
+    """Lê do Redis as métricas de várias regras e as resume por regra."""
+    rule_gids = list(rule_gids)
+    if not rule_gids:
+        return {}
+    
+    pipe = get_redis().pipeline(transaction=False)
+    for rule_gid in rule_gids:
+        pipe.hgetall(f'{KEY_PREFIX}{rule_gid}')
+    raw_results = pipe.execute()
+    
+    return {
+        rule_gid: _summarize({k.decode(): int(v) for k, v in raw.items()})
+        for rule_gid, raw in zip(rule_gids, raw_results)
+    }
+
+def _summarize(raw):
+    evaluation = _summarize_latency(raw, 'evaluation', raw.get('evaluations', 0))
+    action = _summarize_latency(raw, 'action', raw.get('executions', 0) + raw.get('errors', 0))
+    return {
+        'evaluations': raw.get('evaluations', 0),
+        'matches': raw.get('matches', 0),
+        'executions': raw.get('executions', 0),
+        'errors': raw.get('errors', 0),
+        'evaluation': evaluation,
+        'action': action,
+        'avg_total_ms': round(evaluation['avg_ms'] + action['avg_ms'], 3)
+    }
+
+def _summarize_latency(raw, prefix, count):
+    labels = [f'le_{bound}' for bound in LATENCY_BUCKETS_MS] + ['le_inf']
+    histogram = {label: raw.get(f'{prefix}_{label}', 0) for label in labels}
+    total_us = raw.get(f'{prefix}_us_total', 0)
+    return {
+        'count': count,
+        'avg_ms': round(total_us / 1000 / count, 3) if count else 0.0,
+        'p50_ms': _estimate_percentile(histogram, 0.50),
+        'p95_ms': _estimate_percentile(histogram, 0.95),
+        'p99_ms': _estimate_percentile(histogram, 0.99),
+        'histogram': histogram
+    }
+
+def _estimate_percentile(histogram, percentile):
+    """Estima o percentil pelo limite superior do bucket (None se acima do último)."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    
+    threshold = percentile * total
+    cumulative = 0
+    for bound, label in zip(LATENCY_BUCKETS_MS + (None,), histogram):
+        cumulative += histogram[label]
+        if cumulative >= threshold:
+            return bound
+    return None
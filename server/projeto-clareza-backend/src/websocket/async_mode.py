@@ -0,0 +1,32 @@
+from src.config import Config
+
+# threading: uma thread do SO por cliente conectado (desenvolvimento)
+# gevent: greenlets cooperativos, milhares de conexões por processo (produção)
+ASYNC_MODES = ('threading', 'gevent')
+
+def configured_async_mode():
+    mode = Config.SOCKETIO_ASYNC_MODE.lower()
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"SOCKETIO_ASYNC_MODE inválido: {mode} (use {', '.join(ASYNC_MODES)})")
+    return mode
+
+def monkey_patch(mode=None):
+    """
+    Aplica o monkey patching do servidor cooperativo. Precisa rodar antes de
+    qualquer import de socket, threading, redis ou psycopg2, por isso é chamado
+    no topo do ponto de entrada. No modo threading não faz nada.
+    
+    Returns:
+        O modo efetivo, a ser passado ao SocketIO
+    """
+    mode = mode or configured_async_mode()
+    
+    if mode == 'gevent':
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            monkey.patch_all()
+        # psycopg2 é uma extensão C: sem o callback de espera ele bloquearia o hub
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    
+    return mode
@@ -0,0 +1,160 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class BroadcastPublisher:
+    """
+    Fila limitada de emits Socket.IO por processo, esvaziada por tarefas de fundo.
+    
+    As rotas REST apenas enfileiram (event, payload, salas) e respondem; o emit,
+    com a publicação na fila Redis, acontece fora da requisição. Com a fila cheia
+    o evento é descartado e contado em vez de segurar a requisição. Os workers
+    são iniciados com socketio.start_background_task, então seguem o async_mode
+    do servidor. Sem init_app (ex.: scripts e workers Celery) o emit é síncrono.
+    
+    Com publish_deferred, até a montagem do payload (e as consultas que ela faz)
+    fica para o worker, que a executa em um contexto da aplicação.
+    
+    Com um room_log, cada evento recebe antes do emit a sequência de cada sala
+    de destino (payload['room_seqs']) e um event_id, usados para o replay após
+    reconexão. Para que, em cada sala, a ordem dos emits seja a das sequências,
+    cada worker tem a sua fila e todos os eventos de um workspace (as salas de um
+    evento são as dos projetos e a do workspace da tarefa) passam pelo mesmo
+    worker. Entre processos a ordem não é garantida; o cliente reordena pelas
+    sequências.
+    """
+    
+    def __init__(self, max_queue=10000, workers=2, room_log=None):
+        self.max_queue = max_queue
+        self.workers = workers
+        self.room_log = room_log
+        self.socketio = None
+        
+        # Um worker por fila; o limite total é dividido entre elas
+        self._queues = [queue.Queue(maxsize=max(1, max_queue // workers)) for _ in range(workers)]
+        self._deferred_shards = itertools.count()
+        self._lock = threading.Lock()
+        
+        self.enqueued = 0
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.last_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+    
+    def init_app(self, socketio):
+        """Inicia os workers (uma vez por processo)."""
+        if self.socketio is not None:
+            return
+        self.socketio = socketio
+        for index in range(self.workers):
+            socketio.start_background_task(self._run, index)
+    
+    def publish(self, event, payload, rooms, skip_sid=None):
+        if self.socketio is None:
+            from flask import current_app
+            self._deliver(current_app.extensions['socketio'], event, payload, rooms, skip_sid)
+            return True
+        return self._enqueue(self._shard(rooms), (event, payload, rooms, skip_sid, None, None, time.monotonic()))
+    
+    def publish_deferred(self, event, build):
+        """
+        Enfileira um evento montado só no worker: build() roda em um contexto da
+        aplicação e retorna (payload, salas), ou None para descartar o evento. As
+        salas só são conhecidas depois da montagem, então o evento é repassado ao
+        worker das suas salas quando não é o que o montou.
+        """
+        from flask import current_app
+        if self.socketio is None:
+            built = build()
+            if built is not None:
+                self._deliver(current_app.extensions['socketio'], event, built[0], built[1], None)
+            return True
+        shard = next(self._deferred_shards) % self.workers
+        return self._enqueue(shard, (event, None, None, None, build, current_app._get_current_object(), time.monotonic()))
+    
+    def _shard(self, rooms):
+        """Fila do evento: a do workspace de destino, para que cada sala tenha um único worker."""
+        key = next((room for room in rooms if room.startswith('workspace_')), rooms[0] if rooms else '')
+        return hash(key) % self.workers
+    
+    def _enqueue(self, shard, item, forwarded=False):
+        try:
+            self._queues[shard].put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Um aviso a cada 100 descartes para não inundar o log
+            if dropped % 100 == 1:
+                logger.warning(f"Broadcast queue full ({self.max_queue}): {dropped} events dropped so far")
+            return False
+        
+        if forwarded:
+            return True
+        with self._lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._depth())
+        return True
+    
+    def _depth(self):
+        return sum(shard_queue.qsize() for shard_queue in self._queues)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._depth(),
+                'max_queue': self.max_queue,
+                'enqueued': self.enqueued,
+                'published': self.published,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'max_depth': self.max_depth,
+                'last_wait_ms': self.last_wait_ms,
+                'max_wait_ms': self.max_wait_ms
+            }
+    
+    def _run(self, index):
+        shard_queue = self._queues[index]
+        while True:
+            event, payload, rooms, skip_sid, build, app, enqueued_at = shard_queue.get()
+            wait_ms = round((time.monotonic() - enqueued_at) * 1000, 3)
+            try:
+                if build is not None:
+                    with app.app_context():
+                        built = build()
+                    if built is None:
+                        continue
+                    payload, rooms = built
+                    shard = self._shard(rooms)
+                    if shard != index:
+                        self._enqueue(shard, (event, payload, rooms, skip_sid, None, None, enqueued_at), forwarded=True)
+                        continue
+                self._deliver(self.socketio, event, payload, rooms, skip_sid)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Error publishing {event}: {str(e)}")
+                continue
+            finally:
+                shard_queue.task_done()
+            
+            with self._lock:
+                self.published += 1
+                self.last_wait_ms = wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+    
+    def _deliver(self, socketio, event, payload, rooms, skip_sid):
+        if self.room_log is not None:
+            # O id segue no replay e permite ao cliente ignorar a cópia recebida por outra sala
+            payload = dict(payload, event_id=uuid.uuid4().hex)
+            room_seqs = self.room_log.append(event, payload, rooms)
+            if room_seqs:
+                payload = dict(payload, room_seqs=room_seqs)
+        socketio.emit(event, payload, to=rooms, skip_sid=skip_sid)
@@ -1,67 +1,208 @@
 from flask_socketio import emit, join_room, leave_room, disconnect
-from flask import request
+from flask import request, session, current_app
 from functools import wraps
+from collections import namedtuple
+from datetime import datetime
 import jwt
 import logging
+import time
 from src.config import Config
-from src.models.enhanced_work_graph import User
+from src.models.enhanced_work_graph import db, User
+from src.routes.auth import JWT_SECRET
+from src.websocket.typing_indicators import TaskRoomCache, TypingThrottle
+from src.websocket.broadcast_publisher import BroadcastPublisher
+from src.websocket.room_log import RoomEventLog
+from src.websocket.presence import PresenceRegistry
+from src.websocket.room_access import RoomAccessCache
 
 logger = logging.getLogger(__name__)
 
+# Identidade resolvida no connect e guardada na sessão Socket.IO
+Principal = namedtuple('Principal', ['gid', 'name'])
+
+# Conexões deste processo: {sid: {'user_gid', 'exp'}}, usadas pela verificação periódica
+_connections = {}
+_expiry_checker_started = False
+
+# Caminho rápido dos indicadores de digitação: sala em cache e taxa limitada
+task_room_cache = TaskRoomCache(
+    ttl=Config.WEBSOCKET_TASK_ROOM_CACHE_TTL_SECONDS,
+    max_size=Config.WEBSOCKET_TASK_ROOM_CACHE_SIZE
+)
+typing_throttle = TypingThrottle(window=Config.WEBSOCKET_TYPING_THROTTLE_SECONDS)
+
+# Sequência e buffer por sala para o replay de eventos perdidos na reconexão
+room_log = RoomEventLog(
+    maxlen=Config.WEBSOCKET_ROOM_LOG_MAXLEN,
+    ttl=Config.WEBSOCKET_ROOM_LOG_TTL_SECONDS
+) if Config.WEBSOCKET_ROOM_LOG_ENABLED else None
+
+# Quem está em cada projeto, visível a todos os processos
+presence_registry = PresenceRegistry(
+    ttl=Config.WEBSOCKET_PRESENCE_TTL_SECONDS,
+    heartbeat=Config.WEBSOCKET_PRESENCE_HEARTBEAT_SECONDS
+)
+
+# Autorização dos joins sem consultar o banco a cada entrada em sala
+room_access = RoomAccessCache(
+    ttl=Config.WEBSOCKET_ROOM_ACCESS_CACHE_TTL_SECONDS,
+    max_size=Config.WEBSOCKET_ROOM_ACCESS_CACHE_SIZE
+)
+
+# Emits das rotas REST saem da requisição por esta fila
+broadcast_publisher = BroadcastPublisher(
+    max_queue=Config.WEBSOCKET_BROADCAST_QUEUE_SIZE,
+    workers=Config.WEBSOCKET_BROADCAST_WORKERS,
+    room_log=room_log
+)
+
+def authenticate_connection(auth=None):
+    """
+    Valida o JWT do handshake (auth.token ou ?token=) uma única vez por conexão e
+    guarda o principal e a expiração na sessão Socket.IO. Retorna o User ou None.
+    """
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    if not token:
+        logger.warning("WebSocket connection attempted without token")
+        return None
+    
+    try:
+        # Tokens são emitidos por src.routes.auth, então a verificação usa o mesmo segredo
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        logger.warning("Expired token in WebSocket connection")
+        return None
+    except jwt.InvalidTokenError:
+        logger.warning("Invalid token in WebSocket connection")
+        return None
+    
+    user_gid = payload.get('user_gid')
+    user = db.session.get(User, user_gid) if user_gid else None
+    if not user:
+        logger.warning(f"User {user_gid} not found for WebSocket connection")
+        return None
+    
+    session['principal'] = {'gid': user.gid, 'name': user.name}
+    session['token_exp'] = payload.get('exp')
+    _connections[request.sid] = {'user_gid': user.gid, 'exp': payload.get('exp')}
+    return user
+
 def authenticated_only(f):
-    """Decorator para garantir que apenas usuários autenticados acessem eventos WebSocket."""
+    """
+    Decorator para eventos WebSocket: lê o principal da sessão Socket.IO (sem
+    decodificar JWT nem consultar o banco) e desconecta sessões expiradas.
+    """
     @wraps(f)
     def wrapped(*args, **kwargs):
-        try:
-            # Obter token do handshake
-            token = request.args.get('token')
-            if not token:
-                logger.warning("WebSocket connection attempted without token")
-                disconnect()
-                return False
-            
-            # Verificar token JWT
-            payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
-            user_gid = payload.get('user_gid')
-            
-            if not user_gid:
-                logger.warning("Invalid token in WebSocket connection")
-                disconnect()
-                return False
-            
-            # Verificar se usuário existe
-            user = User.query.get(user_gid)
-            if not user:
-                logger.warning(f"User {user_gid} not found for WebSocket connection")
-                disconnect()
-                return False
-            
-            # Adicionar usuário ao contexto
-            kwargs['current_user'] = user
-            return f(*args, **kwargs)
-            
-        except jwt.ExpiredSignatureError:
-            logger.warning("Expired token in WebSocket connection")
-            disconnect()
-            return False
-        except jwt.InvalidTokenError:
-            logger.warning("Invalid token in WebSocket connection")
+        principal = session.get('principal')
+        if not principal:
+            logger.warning("WebSocket event from unauthenticated session")
             disconnect()
             return False
-        except Exception as e:
-            logger.error(f"Error in WebSocket authentication: {str(e)}")
+        
+        token_exp = session.get('token_exp')
+        if token_exp and token_exp <= time.time():
+            logger.warning(f"Expired token for user {principal['gid']} in WebSocket session")
             disconnect()
             return False
+        
+        kwargs['current_user'] = Principal(principal['gid'], principal['name'])
+        return f(*args, **kwargs)
     
     return wrapped
 
+def start_expiry_checker(socketio, app):
+    """Inicia (uma vez por processo) a verificação periódica de tokens expirados e usuários removidos."""
+    global _expiry_checker_started
+    if _expiry_checker_started:
+        return
+    _expiry_checker_started = True
+    socketio.start_background_task(_check_connections_forever, socketio, app)
+
+def _check_connections_forever(socketio, app):
+    while True:
+        socketio.sleep(Config.WEBSOCKET_AUTH_CHECK_SECONDS)
+        try:
+            with app.app_context():
+                check_connections(socketio)
+        except Exception as e:
+            logger.error(f"Error checking WebSocket sessions: {str(e)}")
+
+def check_connections(socketio):
+    """Desconecta sessões com token expirado ou cujo usuário não existe mais (uma query por rodada)."""
+    connections = dict(_connections)
+    if not connections:
+        return 0
+    
+    now = time.time()
+    user_gids = {info['user_gid'] for info in connections.values()}
+    existing = {gid for gid, in db.session.query(User.gid).filter(User.gid.in_(user_gids))}
+    
+    closed = 0
+    for sid, info in connections.items():
+        expired = info['exp'] and info['exp'] <= now
+        if expired or info['user_gid'] not in existing:
+            logger.info(f"Disconnecting WebSocket session of user {info['user_gid']} ({'expired' if expired else 'revoked'})")
+            _connections.pop(sid, None)
+            socketio.server.disconnect(sid, namespace='/')
+            closed += 1
+    return closed
+
+def task_rooms(project_gids, workspace_gid):
+    """
+    Salas que devem receber uma mudança. Emitir uma vez para a lista inteira faz o
+    python-socketio publicar uma única mensagem na fila Redis e entregar uma cópia
+    por sessão, mesmo a clientes que estão em várias dessas salas.
+    """
+    rooms = [f"project_{gid}" for gid in project_gids]
+    rooms.append(f"workspace_{workspace_gid}")
+    return rooms
+
+def _replay_room(room, since_seq):
+    """Sequência atual da sala e, com since_seq, os eventos posteriores a ela."""
+    try:
+        if since_seq is None:
+            return {'room': room, 'seq': room_log.current_seq(room)}
+        events, complete, current = room_log.replay(room, since_seq)
+        return {'room': room, 'since_seq': since_seq, 'seq': current, 'complete': complete, 'events': events}
+    except Exception as e:
+        logger.error(f"Error replaying room {room}: {str(e)}")
+        return {'room': room, 'since_seq': since_seq, 'seq': None, 'complete': False, 'events': []}
+
+def can_read_task(user_gid, project_gids, workspace_gid):
+    """Acesso a uma tarefa: o de algum dos seus projetos ou, sem projeto, o do workspace."""
+    if not project_gids:
+        return room_access.can_join_workspace(user_gid, workspace_gid)[1]
+    return any(room_access.can_join_project(user_gid, project_gid)[1] for project_gid in project_gids)
+
+def task_changes(old_data, new_data):
+    """
+    Delta entre dois snapshots de Task.to_dict(): {campo: {'from', 'to'}} apenas
+    para os campos alterados. A versão não entra no delta, pois segue no evento.
+    """
+    return {
+        field: {'from': old_data.get(field), 'to': value}
+        for field, value in new_data.items()
+        if field != 'version' and old_data.get(field) != value
+    }
+
 def init_websocket_events(socketio):
     """Inicializa todos os eventos WebSocket."""
     
+    broadcast_publisher.init_app(socketio)
+    presence_registry.init_app(socketio)
+    room_access.init_app(socketio, task_rooms=task_room_cache)
+    
     @socketio.on('connect')
-    @authenticated_only
-    def handle_connect(current_user):
-        """Evento de conexão WebSocket."""
+    def handle_connect(auth=None):
+        """Evento de conexão WebSocket: único ponto em que o token é verificado."""
+        current_user = authenticate_connection(auth)
+        if not current_user:
+            return False
+        
+        start_expiry_checker(socketio, current_app._get_current_object())
+        
         logger.info(f"User {current_user.name} ({current_user.gid}) connected via WebSocket")
         emit('connected', {
             'message': 'Connected successfully',
@@ -69,44 +210,82 @@ def init_websocket_events(socketio):
         })
     
     @socketio.on('disconnect')
-    def handle_disconnect():
-        """Evento de desconexão WebSocket."""
+    def handle_disconnect(*args):
+        """Evento de desconexão WebSocket: a conexão sai da presença de todos os projetos."""
+        _connections.pop(request.sid, None)
+        
+        principal = session.get('principal') or {}
+        try:
+            for project_gid, user_gid in presence_registry.disconnect(request.sid):
+                emit('user_left_project', {
+                    'user_name': principal.get('name'),
+                    'user_gid': user_gid,
+                    'project_gid': project_gid
+                }, to=f"project_{project_gid}")
+        except Exception as e:
+            logger.error(f"Error clearing presence on disconnect: {str(e)}")
+        
         logger.info("User disconnected from WebSocket")
     
     @socketio.on('join_project')
     @authenticated_only
     def handle_join_project(data, current_user):
-        """Usuário entra em uma sala de projeto para receber atualizações em tempo real."""
+        """
+        Usuário entra em uma sala de projeto para receber atualizações em tempo real.
+        Com since_seq (última sequência vista antes de cair), os eventos perdidos são
+        reenviados em 'room_replay'; complete=false indica que o buffer já girou e o
+        cliente deve recarregar o projeto.
+        """
         try:
             project_gid = data.get('project_gid')
             if not project_gid:
                 emit('error', {'message': 'project_gid is required'})
                 return
             
+            since_seq = data.get('since_seq')
+            if since_seq is not None and (not isinstance(since_seq, int) or since_seq < 0):
+                emit('error', {'message': 'since_seq must be a non-negative integer'})
+                return
+            
             # Verificar se usuário tem acesso ao projeto
-            from src.models.enhanced_work_graph import Project
-            project = Project.query.get(project_gid)
+            project, allowed = room_access.can_join_project(current_user.gid, project_gid)
             if not project:
                 emit('error', {'message': 'Project not found'})
                 return
+            if not allowed:
+                logger.warning(f"User {current_user.gid} denied access to project room {project_gid}")
+                emit('error', {'message': 'Access denied to project'})
+                return
             
             # Entrar na sala do projeto
             room = f"project_{project_gid}"
             join_room(room)
             
             logger.info(f"User {current_user.name} joined project room {room}")
+            
+            # Entrar na sala antes de ler o buffer: nada se perde entre o replay e os eventos ao vivo
+            replay = _replay_room(room, since_seq) if room_log is not None else None
             emit('joined_project', {
                 'project_gid': project_gid,
-                'project_name': project.name
+                'project_name': project.name,
+                'seq': replay['seq'] if replay else None
             })
+            if replay and since_seq is not None:
+                emit('room_replay', dict(replay, project_gid=project_gid))
             
-            # Notificar outros usuários na sala
-            emit('user_joined_project', {
-                'user_name': current_user.name,
-                'user_gid': current_user.gid,
-                'project_gid': project_gid
-            }, room=room, include_self=False)
-            
+            # Notificar outros usuários na sala, só na primeira conexão do usuário ao projeto
+            try:
+                newly_present = presence_registry.join(project_gid, current_user.gid, request.sid)
+            except Exception as e:
+                logger.error(f"Error registering presence: {str(e)}")
+                newly_present = True
+            if newly_present:
+                emit('user_joined_project', {
+                    'user_name': current_user.name,
+                    'user_gid': current_user.gid,
+                    'project_gid': project_gid
+                }, room=room, include_self=False)
+        
         except Exception as e:
             logger.error(f"Error joining project room: {str(e)}")
             emit('error', {'message': 'Failed to join project'})
@@ -127,13 +306,19 @@ def init_websocket_events(socketio):
             logger.info(f"User {current_user.name} left project room {room}")
             emit('left_project', {'project_gid': project_gid})
             
-            # Notificar outros usuários na sala
-            emit('user_left_project', {
-                'user_name': current_user.name,
-                'user_gid': current_user.gid,
-                'project_gid': project_gid
-            }, room=room)
-            
+            # Notificar outros usuários na sala quando a última conexão do usuário sai
+            try:
+                left = presence_registry.leave(project_gid, request.sid) is not None
+            except Exception as e:
+                logger.error(f"Error removing presence: {str(e)}")
+                left = True
+            if left:
+                emit('user_left_project', {
+                    'user_name': current_user.name,
+                    'user_gid': current_user.gid,
+                    'project_gid': project_gid
+                }, room=room)
+        
         except Exception as e:
             logger.error(f"Error leaving project room: {str(e)}")
             emit('error', {'message': 'Failed to leave project'})
@@ -141,29 +326,45 @@ def init_websocket_events(socketio):
     @socketio.on('join_workspace')
     @authenticated_only
     def handle_join_workspace(data, current_user):
-        """Usuário entra em uma sala de workspace."""
+        """
+        Usuário entra em uma sala de workspace. Como em join_project, since_seq pede
+        o replay dos eventos perdidos em 'room_replay'.
+        """
         try:
             workspace_gid = data.get('workspace_gid')
             if not workspace_gid:
                 emit('error', {'message': 'workspace_gid is required'})
                 return
             
+            since_seq = data.get('since_seq')
+            if since_seq is not None and (not isinstance(since_seq, int) or since_seq < 0):
+                emit('error', {'message': 'since_seq must be a non-negative integer'})
+                return
+            
             # Verificar se usuário tem acesso ao workspace
-            from src.models.enhanced_work_graph import Workspace
-            workspace = Workspace.query.get(workspace_gid)
-            if not workspace:
+            workspace_name, allowed = room_access.can_join_workspace(current_user.gid, workspace_gid)
+            if not workspace_name:
                 emit('error', {'message': 'Workspace not found'})
                 return
+            if not allowed:
+                logger.warning(f"User {current_user.gid} denied access to workspace room {workspace_gid}")
+                emit('error', {'message': 'Access denied to workspace'})
+                return
             
             room = f"workspace_{workspace_gid}"
             join_room(room)
             
             logger.info(f"User {current_user.name} joined workspace room {room}")
+            
+            replay = _replay_room(room, since_seq) if room_log is not None else None
             emit('joined_workspace', {
                 'workspace_gid': workspace_gid,
-                'workspace_name': workspace.name
+                'workspace_name': workspace_name,
+                'seq': replay['seq'] if replay else None
             })
-            
+            if replay and since_seq is not None:
+                emit('room_replay', dict(replay, workspace_gid=workspace_gid))
+        
         except Exception as e:
             logger.error(f"Error joining workspace room: {str(e)}")
             emit('error', {'message': 'Failed to join workspace'})
@@ -188,6 +389,12 @@ def init_websocket_events(socketio):
                 emit('error', {'message': 'Task not found'})
                 return
             
+            project_gids = [project.gid for project in task.projects]
+            if not can_read_task(current_user.gid, project_gids, task.workspace_gid):
+                logger.warning(f"User {current_user.gid} denied task update for task {task_gid}")
+                emit('error', {'message': 'Access denied to task'})
+                return
+            
             # Emitir atualização para todas as salas relevantes
             update_payload = {
                 'task_gid': task_gid,
@@ -200,17 +407,12 @@ def init_websocket_events(socketio):
                 'timestamp': datetime.utcnow().isoformat()
             }
             
-            # Emitir para salas de projetos que contêm a tarefa
-            for project in task.projects:
-                room = f"project_{project.gid}"
-                emit('task_updated', update_payload, room=room, include_self=False)
-            
-            # Emitir para sala do workspace
-            workspace_room = f"workspace_{task.workspace_gid}"
-            emit('task_updated', update_payload, room=workspace_room, include_self=False)
+            # Um único emit para a união das salas de projeto e do workspace, numerado por sala
+            rooms = task_rooms(project_gids, task.workspace_gid)
+            broadcast_publisher.publish('task_updated', update_payload, rooms, skip_sid=request.sid)
             
             logger.info(f"Task update broadcasted: {update_type} for task {task_gid}")
-            
+        
         except Exception as e:
             logger.error(f"Error handling task update: {str(e)}")
             emit('error', {'message': 'Failed to process task update'})
@@ -231,20 +433,27 @@ def init_websocket_events(socketio):
             
             # Determinar sala baseada no tipo de alvo
             if target_type == 'project':
-                room = f"project_{target_gid}"
+                project_gid = target_gid
             elif target_type == 'task':
-                # Buscar projetos da tarefa para determinar salas
-                from src.models.enhanced_work_graph import Task
-                task = Task.query.get(target_gid)
-                if task and task.projects:
-                    room = f"project_{task.projects[0].gid}"  # Usar primeiro projeto
-                else:
+                # Projeto principal da tarefa vem do cache (sem consulta por tecla)
+                project_gid = task_room_cache.get_project_gid(target_gid)
+                if not project_gid:
                     emit('error', {'message': 'Task not found or not in any project'})
                     return
             else:
                 emit('error', {'message': 'Invalid target_type'})
                 return
             
+            # Acesso também vem do cache: só quem pode entrar na sala digita nela
+            if not room_access.can_join_project(current_user.gid, project_gid)[1]:
+                emit('error', {'message': 'Access denied to project'})
+                return
+            room = f"project_{project_gid}"
+            
+            # Repetições de is_typing=true dentro da janela são absorvidas
+            if not typing_throttle.should_emit((current_user.gid, target_type, target_gid, field), is_typing):
+                return
+            
             # Emitir indicador de digitação
             typing_payload = {
                 'target_type': target_type,
@@ -259,32 +468,79 @@ def init_websocket_events(socketio):
             }
             
             emit('typing_indicator', typing_payload, room=room, include_self=False)
-            
+        
         except Exception as e:
             logger.error(f"Error handling typing indicator: {str(e)}")
             emit('error', {'message': 'Failed to process typing indicator'})
+    
+    @socketio.on('request_task_snapshot')
+    @authenticated_only
+    def handle_request_task_snapshot(data, current_user):
+        """
+        Envia ao solicitante o snapshot completo de uma tarefa (ressincronização após
+        um delta perdido), desde que ele possa entrar na sala de algum projeto da
+        tarefa ou, para tarefas sem projeto, na do workspace.
+        """
+        try:
+            task_gid = data.get('task_gid')
+            if not task_gid:
+                emit('error', {'message': 'task_gid is required'})
+                return
+            
+            from src.models.enhanced_work_graph import Task
+            task = db.session.get(Task, task_gid)
+            if not task:
+                emit('error', {'message': 'Task not found'})
+                return
+            
+            if not can_read_task(current_user.gid, [project.gid for project in task.projects], task.workspace_gid):
+                logger.warning(f"User {current_user.gid} denied snapshot of task {task_gid}")
+                emit('error', {'message': 'Access denied to task'})
+                return
+            
+            emit('task_snapshot', {
+                'task_gid': task_gid,
+                'version': task.version,
+                'task_data': task.to_dict()
+            })
+        
+        except Exception as e:
+            logger.error(f"Error sending task snapshot: {str(e)}")
+            emit('error', {'message': 'Failed to load task snapshot'})
 
-def broadcast_task_change(task_gid, change_type, change_data, actor_gid):
+def broadcast_task_change(task_gid, change_type, changes, actor, version=None, project_gids=None, workspace_gid=None):
     """
     Função utilitária para transmitir mudanças de tarefa para todos os clientes conectados.
     Chamada pelas APIs REST quando há mudanças.
+    
+    O evento leva só o delta (changes) e a versão da tarefa; o snapshot completo é
+    pedido pelo cliente via 'request_task_snapshot' quando ele detecta uma versão
+    fora de sequência. Com project_gids e workspace_gid informados pelo chamador
+    (que já tem a tarefa carregada), nenhuma consulta é feita aqui, e o emit é
+    enfileirado no broadcast_publisher em vez de bloquear a resposta HTTP.
+    
+    Args:
+        actor: Objeto com gid e name (g.current_user)
     """
     try:
-        from src.models.enhanced_work_graph import Task, User
-        from datetime import datetime
+        # Os projetos da tarefa podem ter mudado
+        task_room_cache.invalidate(task_gid)
         
-        task = Task.query.get(task_gid)
-        actor = User.query.get(actor_gid)
-        
-        if not task or not actor:
-            return
+        if project_gids is None or workspace_gid is None or version is None:
+            from src.models.enhanced_work_graph import Task
+            task = db.session.get(Task, task_gid)
+            if not task:
+                return
+            project_gids = [project.gid for project in task.projects]
+            workspace_gid = task.workspace_gid
+            version = task.version
         
         # Preparar payload da mudança
         change_payload = {
             'task_gid': task_gid,
             'change_type': change_type,
-            'change_data': change_data,
-            'task_data': task.to_dict(),
+            'change_data': changes,
+            'version': version,
             'changed_by': {
                 'gid': actor.gid,
                 'name': actor.name
@@ -292,37 +548,29 @@ def broadcast_task_change(task_gid, change_type, change_data, actor_gid):
             'timestamp': datetime.utcnow().isoformat()
         }
         
-        # Emitir para todas as salas relevantes
-        from flask import current_app
-        socketio = current_app.extensions['socketio']
-        
-        # Emitir para salas de projetos
-        for project in task.projects:
-            room = f"project_{project.gid}"
-            socketio.emit('task_changed', change_payload, room=room)
-        
-        # Emitir para sala do workspace
-        workspace_room = f"workspace_{task.workspace_gid}"
-        socketio.emit('task_changed', change_payload, room=workspace_room)
-        
-        logger.info(f"Task change broadcasted: {change_type} for task {task_gid}")
-        
+        # Um único emit para a união das salas de projeto e do workspace, feito em segundo plano
+        if broadcast_publisher.publish('task_changed', change_payload, task_rooms(project_gids, workspace_gid)):
+            logger.info(f"Task change queued: {change_type} for task {task_gid} (v{version})")
+    
     except Exception as e:
         logger.error(f"Error broadcasting task change: {str(e)}")
 
 def broadcast_project_change(project_gid, change_type, change_data, actor_gid):
     """
     Função utilitária para transmitir mudanças de projeto.
+    
+    O projeto e o autor são carregados no worker do broadcast_publisher, e não na
+    requisição; se algum deles não existir mais, o evento é descartado.
     """
-    try:
-        from src.models.enhanced_work_graph import Project, User
-        from datetime import datetime
-        
-        project = Project.query.get(project_gid)
-        actor = User.query.get(actor_gid)
+    timestamp = datetime.utcnow().isoformat()
+    
+    def build():
+        from src.models.enhanced_work_graph import Project
         
+        project = db.session.get(Project, project_gid)
+        actor = db.session.get(User, actor_gid)
         if not project or not actor:
-            return
+            return None
         
         change_payload = {
             'project_gid': project_gid,
@@ -333,22 +581,14 @@ def broadcast_project_change(project_gid, change_type, change_data, actor_gid):
                 'gid': actor.gid,
                 'name': actor.name
             },
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': timestamp
         }
-        
-        from flask import current_app
-        socketio = current_app.extensions['socketio']
-        
-        # Emitir para sala do projeto
-        project_room = f"project_{project_gid}"
-        socketio.emit('project_changed', change_payload, room=project_room)
-        
-        # Emitir para sala do workspace
-        workspace_room = f"workspace_{project.workspace_gid}"
-        socketio.emit('project_changed', change_payload, room=workspace_room)
-        
-        logger.info(f"Project change broadcasted: {change_type} for project {project_gid}")
-        
+        # Um único emit para a sala do projeto e a do workspace
+        return change_payload, task_rooms([project_gid], project.workspace_gid)
+    
+    try:
+        if broadcast_publisher.publish_deferred('project_changed', build):
+            logger.info(f"Project change queued: {change_type} for project {project_gid}")
+    
     except Exception as e:
         logger.error(f"Error broadcasting project change: {str(e)}")
-
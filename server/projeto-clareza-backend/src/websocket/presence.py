@@ -0,0 +1,177 @@
+from src.tasks.rule_metrics import get_redis
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Um sorted set por projeto: membro '<user_gid>|<sid>', score = último heartbeat (epoch)
+PRESENCE_KEY_PREFIX = 'presence:project:'
+
+# Verificação e escrita atômicas: duas conexões do mesmo usuário entrando ou saindo
+# ao mesmo tempo (em qualquer processo) geram um único aviso de entrada ou saída.
+# ARGV: user_gid, membro, agora, corte do TTL, TTL. Retorna 1 se o usuário não estava presente.
+JOIN_SCRIPT = """
+local prefix = ARGV[1] .. '|'
+local present = 0
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[4], '+inf')) do
+    if string.sub(member, 1, #prefix) == prefix then
+        present = 1
+        break
+    end
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1 - present
+"""
+
+# ARGV: user_gid, membro, corte do TTL. Retorna 1 se a conexão foi removida e era a última do usuário.
+LEAVE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[2]) == 0 then
+    return 0
+end
+local prefix = ARGV[1] .. '|'
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[3], '+inf')) do
+    if string.sub(member, 1, #prefix) == prefix then
+        return 0
+    end
+end
+return 1
+"""
+
+def presence_key(project_gid):
+    return f'{PRESENCE_KEY_PREFIX}{project_gid}'
+
+class PresenceRegistry:
+    """
+    Quem está em cada sala de projeto, compartilhado entre processos via Redis.
+    
+    Cada conexão (sid) é um membro do sorted set do projeto. O processo dono da
+    conexão renova o score a cada `heartbeat` segundos enquanto ela estiver
+    aberta; membros sem renovação há mais de `ttl` segundos (ex.: processo que
+    caiu) são ignorados e removidos nas leituras. O índice sid -> projetos é
+    local: o disconnect sempre chega ao processo que atende a conexão.
+    """
+    
+    def __init__(self, ttl=90, heartbeat=30):
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._sid_projects = {}
+        self._sid_users = {}
+        self._started = False
+        self._join_script = None
+        self._leave_script = None
+    
+    def init_app(self, socketio):
+        """Inicia (uma vez por processo) a renovação periódica das conexões locais."""
+        if self._started:
+            return
+        self._started = True
+        socketio.start_background_task(self._heartbeat_forever, socketio)
+    
+    def join(self, project_gid, user_gid, sid):
+        """Registra a conexão no projeto. Retorna True se o usuário não estava presente."""
+        with self._lock:
+            self._sid_projects.setdefault(sid, set()).add(project_gid)
+            self._sid_users[sid] = user_gid
+        
+        redis_client = get_redis()
+        if self._join_script is None:
+            self._join_script = redis_client.register_script(JOIN_SCRIPT)
+        now = time.time()
+        return bool(self._join_script(
+            keys=[presence_key(project_gid)],
+            args=[user_gid, f'{user_gid}|{sid}', now, now - self.ttl, self.ttl],
+            client=redis_client
+        ))
+    
+    def leave(self, project_gid, sid):
+        """
+        Remove a conexão do projeto. Retorna o user_gid só se esta conexão estava
+        no projeto e era a última do usuário ali.
+        """
+        with self._lock:
+            projects = self._sid_projects.get(sid)
+            joined = projects is not None and project_gid in projects
+            if joined:
+                projects.discard(project_gid)
+            user_gid = self._sid_users.get(sid)
+        if not joined or user_gid is None:
+            return None
+        
+        redis_client = get_redis()
+        if self._leave_script is None:
+            self._leave_script = redis_client.register_script(LEAVE_SCRIPT)
+        last = self._leave_script(
+            keys=[presence_key(project_gid)],
+            args=[user_gid, f'{user_gid}|{sid}', time.time() - self.ttl],
+            client=redis_client
+        )
+        return user_gid if last else None
+    
+    def disconnect(self, sid):
+        """Remove a conexão de todos os projetos. Retorna [(project_gid, user_gid)] que ficaram sem o usuário."""
+        with self._lock:
+            projects = set(self._sid_projects.get(sid, ()))
+        left = []
+        for project_gid in projects:
+            left_user = self.leave(project_gid, sid)
+            if left_user:
+                left.append((project_gid, left_user))
+        with self._lock:
+            self._sid_projects.pop(sid, None)
+            self._sid_users.pop(sid, None)
+        return left
+    
+    def present_users(self, project_gid):
+        """
+        Usuários presentes no projeto, em todos os processos.
+        
+        Returns:
+            {user_gid: {'connections', 'last_seen'}}
+        """
+        key = presence_key(project_gid)
+        now = time.time()
+        redis_client = get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(key, '-inf', now - self.ttl)
+        pipe.zrange(key, 0, -1, withscores=True)
+        _, members = pipe.execute()
+        
+        users = {}
+        for member, score in members:
+            user_gid = member.decode().split('|', 1)[0]
+            entry = users.setdefault(user_gid, {'connections': 0, 'last_seen': score})
+            entry['connections'] += 1
+            entry['last_seen'] = max(entry['last_seen'], score)
+        return users
+    
+    def refresh(self):
+        """Renova o heartbeat de todas as conexões deste processo em um único pipeline."""
+        with self._lock:
+            memberships = [
+                (project_gid, f'{self._sid_users[sid]}|{sid}')
+                for sid, projects in self._sid_projects.items() if sid in self._sid_users
+                for project_gid in projects
+            ]
+        if not memberships:
+            return 0
+        
+        now = time.time()
+        pipe = get_redis().pipeline(transaction=False)
+        for project_gid, member in memberships:
+            key = presence_key(project_gid)
+            # XX: um leave entre a cópia e o pipeline removeu o membro; não recriá-lo
+            pipe.zadd(key, {member: now}, xx=True)
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+        return len(memberships)
+    
+    def _heartbeat_forever(self, socketio):
+        while True:
+            socketio.sleep(self.heartbeat)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing presence: {str(e)}")
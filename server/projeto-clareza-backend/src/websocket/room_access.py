@@ -0,0 +1,272 @@
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, object_session
+from src.models.enhanced_work_graph import db, Project, Workspace, project_memberships, workspace_memberships
+from src.models import work_graph
+from src.tasks.rule_metrics import get_redis
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Invalidações publicadas para os demais processos Socket.IO
+INVALIDATION_CHANNEL = 'ws:room_access:invalidate'
+
+# Projetos com esta privacidade só aceitam dono e membros explícitos
+PRIVATE_PRIVACY_SETTINGS = ('private_to_team',)
+
+ProjectInfo = namedtuple('ProjectInfo', ['name', 'workspace_gid', 'private'])
+UserAccess = namedtuple('UserAccess', ['projects', 'workspaces', 'project_workspaces'])
+
+class RoomAccessCache:
+    """
+    Decide se um usuário pode entrar na sala de um projeto ou workspace sem ir ao
+    banco a cada join.
+    
+    Por usuário ficam em cache (LRU com TTL) os projetos liberados explicitamente
+    (dono ou ProjectMembership), os workspaces de que ele é membro
+    (WorkspaceMembership) e os workspaces desses projetos; por projeto/workspace,
+    nome, workspace e privacidade. Um projeto é liberado para quem tem acesso
+    explícito ou, se não for privado, para os membros do seu workspace. A sala do
+    workspace aceita os membros e quem tem acesso explícito a algum projeto dele,
+    já que nada cria WorkspaceMembership ao criar um workspace; esse acesso
+    derivado não libera os demais projetos. Mudanças de membros, dono ou privacidade
+    feitas pelo ORM invalidam as entradas no commit, neste processo e nos demais
+    (via pub/sub do Redis); o TTL cobre escritas feitas por fora do ORM.
+    """
+    
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._projects = OrderedDict()
+        self._workspaces = OrderedDict()
+        self._started = False
+        self.task_rooms = None
+    
+    def init_app(self, socketio, task_rooms=None):
+        """
+        Registra (uma vez por processo) os listeners do ORM e a escuta de
+        invalidações. task_rooms (TaskRoomCache) recebe as invalidações de
+        tarefas publicadas no mesmo canal.
+        """
+        if self._started:
+            return
+        self._started = True
+        self.task_rooms = task_rooms
+        _register_listeners(self)
+        socketio.start_background_task(self._listen_forever, socketio)
+    
+    def project(self, project_gid):
+        """ProjectInfo do projeto ou None se ele não existe (inexistentes não ficam em cache)."""
+        info = self._get(self._projects, project_gid)
+        if info is not None:
+            return info
+        
+        row = db.session.execute(
+            db.select(Project.name, Project.workspace_gid, Project.privacy_setting)
+            .where(Project.gid == project_gid)
+        ).first()
+        if row is None:
+            return None
+        
+        info = ProjectInfo(row.name, row.workspace_gid, row.privacy_setting in PRIVATE_PRIVACY_SETTINGS)
+        self._put(self._projects, project_gid, info)
+        return info
+    
+    def workspace_name(self, workspace_gid):
+        """Nome do workspace ou None se ele não existe."""
+        name = self._get(self._workspaces, workspace_gid)
+        if name is not None:
+            return name
+        
+        name = db.session.execute(
+            db.select(Workspace.name).where(Workspace.gid == workspace_gid)
+        ).scalar()
+        if name is not None:
+            self._put(self._workspaces, workspace_gid, name)
+        return name
+    
+    def user_access(self, user_gid):
+        """Conjuntos de projetos e workspaces liberados ao usuário (duas queries na carga)."""
+        access = self._get(self._users, user_gid)
+        if access is not None:
+            return access
+        
+        rows = db.session.execute(
+            db.select(Project.gid, Project.workspace_gid)
+            .outerjoin(project_memberships, db.and_(
+                project_memberships.c.project_gid == Project.gid,
+                project_memberships.c.user_gid == user_gid
+            ))
+            .where(or_(Project.owner_gid == user_gid, project_memberships.c.user_gid.is_not(None)))
+        ).all()
+        workspaces = frozenset(db.session.execute(
+            db.select(workspace_memberships.c.workspace_gid)
+            .where(workspace_memberships.c.user_gid == user_gid)
+        ).scalars())
+        
+        access = UserAccess(
+            frozenset(row.gid for row in rows),
+            workspaces,
+            frozenset(row.workspace_gid for row in rows)
+        )
+        self._put(self._users, user_gid, access)
+        return access
+    
+    def can_join_project(self, user_gid, project_gid):
+        """
+        Returns:
+            (ProjectInfo ou None se o projeto não existe, permitido)
+        """
+        info = self.project(project_gid)
+        if info is None:
+            return None, False
+        
+        access = self.user_access(user_gid)
+        allowed = project_gid in access.projects or (
+            not info.private and info.workspace_gid in access.workspaces
+        )
+        return info, allowed
+    
+    def can_join_workspace(self, user_gid, workspace_gid):
+        """
+        Returns:
+            (nome do workspace ou None se ele não existe, permitido)
+        """
+        name = self.workspace_name(workspace_gid)
+        if name is None:
+            return None, False
+        access = self.user_access(user_gid)
+        return name, workspace_gid in access.workspaces or workspace_gid in access.project_workspaces
+    
+    def invalidate(self, users=(), projects=(), workspaces=(), publish=True):
+        """
+        Descarta as entradas afetadas por uma mudança de acesso. Com publish, a
+        invalidação também é enviada aos outros processos.
+        """
+        self._discard(users, projects, workspaces)
+        if not publish or not (users or projects or workspaces):
+            return
+        
+        try:
+            get_redis().publish(INVALIDATION_CHANNEL, json.dumps({
+                'users': sorted(users),
+                'projects': sorted(projects),
+                'workspaces': sorted(workspaces)
+            }))
+        except Exception as e:
+            logger.error(f"Error publishing room access invalidation: {str(e)}")
+    
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._projects.clear()
+            self._workspaces.clear()
+    
+    def _discard(self, users, projects, workspaces):
+        with self._lock:
+            for user_gid in users:
+                self._users.pop(user_gid, None)
+            for project_gid in projects:
+                self._projects.pop(project_gid, None)
+            if projects:
+                # Quem tinha acesso explícito pode tê-lo perdido (ex.: troca de dono)
+                projects = set(projects)
+                stale = [
+                    user_gid for user_gid, (access, _) in self._users.items()
+                    if not projects.isdisjoint(access.projects)
+                ]
+                for user_gid in stale:
+                    del self._users[user_gid]
+            for workspace_gid in workspaces:
+                self._workspaces.pop(workspace_gid, None)
+    
+    def _get(self, entries, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = entries.get(key)
+            if entry and entry[1] > now:
+                entries.move_to_end(key)
+                return entry[0]
+        return None
+    
+    def _put(self, entries, key, value):
+        with self._lock:
+            entries[key] = (value, time.monotonic() + self.ttl)
+            entries.move_to_end(key)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+    
+    def _listen_forever(self, socketio):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidações perdidas enquanto a assinatura estava fora do ar
+                self.clear()
+                if self.task_rooms is not None:
+                    self.task_rooms.clear()
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    self._discard(data.get('users', ()), data.get('projects', ()), data.get('workspaces', ()))
+                    if self.task_rooms is not None:
+                        for task_gid in data.get('tasks', ()):
+                            self.task_rooms.invalidate(task_gid, publish=False)
+            except Exception as e:
+                logger.error(f"Error listening for room access invalidations: {str(e)}")
+            socketio.sleep(5)
+
+def _pending(target):
+    """Invalidações acumuladas na sessão do objeto, aplicadas só depois do commit."""
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault('room_access_invalidations', {
+        'users': set(), 'projects': set(), 'workspaces': set()
+    })
+
+def _register_listeners(cache):
+    def project_changed(mapper, connection, target):
+        pending = _pending(target)
+        if pending is not None:
+            pending['projects'].add(target.gid)
+            if target.owner_gid:
+                pending['users'].add(target.owner_gid)
+    
+    def membership_changed(mapper, connection, target):
+        pending = _pending(target)
+        if pending is not None:
+            pending['users'].add(target.user_gid)
+            if isinstance(target, work_graph.ProjectMembership):
+                pending['projects'].add(target.project_gid)
+    
+    def workspace_changed(mapper, connection, target):
+        pending = _pending(target)
+        if pending is not None:
+            pending['workspaces'].add(target.gid)
+    
+    def after_commit(session):
+        pending = session.info.pop('room_access_invalidations', None)
+        if pending:
+            cache.invalidate(pending['users'], pending['projects'], pending['workspaces'])
+    
+    def after_rollback(session):
+        session.info.pop('room_access_invalidations', None)
+    
+    # As rotas usam tanto os modelos de enhanced_work_graph quanto os de work_graph
+    for model in (Project, work_graph.Project):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, project_changed)
+    for model in (work_graph.ProjectMembership, work_graph.WorkspaceMembership):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, membership_changed)
+    for model in (Workspace, work_graph.Workspace):
+        for name in ('after_update', 'after_delete'):
+            event.listen(model, name, workspace_changed)
+    
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_rollback', after_rollback)
@@ -0,0 +1,86 @@
+from src.tasks.rule_metrics import get_redis
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Um contador e um stream limitado por sala; o id da entrada é '<seq>-0'
+SEQ_KEY_PREFIX = 'ws:room:seq:'
+LOG_KEY_PREFIX = 'ws:room:log:'
+
+# INCR e XADD atômicos: entre processos, a ordem do stream é sempre a ordem das sequências
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], seq .. '-0', 'event', ARGV[2], 'payload', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return seq
+"""
+
+class RoomEventLog:
+    """
+    Numera os broadcasts de cada sala e guarda os últimos eventos em um Redis
+    Stream limitado, para que um cliente que reconecta receba só o que perdeu.
+    Falhas do Redis não impedem o broadcast: o evento só sai sem sequência.
+    """
+    
+    def __init__(self, maxlen=1000, ttl=86400):
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self._script = None
+    
+    def append(self, event, payload, rooms):
+        """Registra o evento em cada sala (um round trip). Retorna {sala: seq}."""
+        try:
+            redis_client = get_redis()
+            if self._script is None:
+                self._script = redis_client.register_script(APPEND_SCRIPT)
+            
+            data = json.dumps(payload)
+            pipe = redis_client.pipeline(transaction=False)
+            for room in rooms:
+                self._script(
+                    keys=[f'{SEQ_KEY_PREFIX}{room}', f'{LOG_KEY_PREFIX}{room}'],
+                    args=[self.maxlen, event, data, self.ttl],
+                    client=pipe
+                )
+            return dict(zip(rooms, pipe.execute()))
+        except Exception as e:
+            logger.error(f"Error appending {event} to room log: {str(e)}")
+            return {}
+    
+    def current_seq(self, room):
+        value = get_redis().get(f'{SEQ_KEY_PREFIX}{room}')
+        return int(value) if value else 0
+    
+    def replay(self, room, since_seq, limit=None):
+        """
+        Eventos da sala com seq > since_seq, em ordem.
+        
+        Returns:
+            (eventos, completo, seq_atual). completo é False quando o buffer já
+            descartou eventos posteriores a since_seq (ou o contador foi reiniciado);
+            nesse caso o cliente precisa recarregar o estado inteiro.
+        """
+        limit = limit or self.maxlen
+        redis_client = get_redis()
+        current = self.current_seq(room)
+        
+        if since_seq >= current:
+            return [], since_seq == current, current
+        
+        entries = redis_client.xrange(
+            f'{LOG_KEY_PREFIX}{room}', min=f'{since_seq + 1}-0', max=f'{current}-0', count=limit
+        )
+        events = [
+            {
+                'seq': int(entry_id.decode().split('-')[0]),
+                'event': fields[b'event'].decode(),
+                'payload': json.loads(fields[b'payload'])
+            }
+            for entry_id, fields in entries
+        ]
+        
+        # Sem lacuna: o primeiro evento devolvido é exatamente o seguinte ao último visto
+        complete = bool(events) and events[0]['seq'] == since_seq + 1 and events[-1]['seq'] == current
+        return events, complete, current
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import json
+import logging
+import threading
+import time
+from src.models.enhanced_work_graph import db, task_projects
+from src.tasks.rule_metrics import get_redis
+from src.websocket.room_access import INVALIDATION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+class TaskRoomCache:
+    """
+    Cache LRU com TTL de tarefa -> projeto principal, usado para resolver a sala
+    dos indicadores de digitação sem consultar o banco a cada tecla. Tarefas sem
+    projeto também ficam em cache (valor None). As invalidações chegam aos demais
+    processos pela escuta do RoomAccessCache (init_app com task_rooms).
+    """
+    
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+    
+    def get_project_gid(self, task_gid):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(task_gid)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(task_gid)
+                return entry[0]
+        
+        project_gid = db.session.execute(
+            db.select(task_projects.c.project_gid)
+            .where(task_projects.c.task_gid == task_gid)
+            .order_by(task_projects.c.project_gid)
+            .limit(1)
+        ).scalar()
+        
+        with self._lock:
+            self._entries[task_gid] = (project_gid, now + self.ttl)
+            self._entries.move_to_end(task_gid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return project_gid
+    
+    def invalidate(self, task_gid, publish=True):
+        """
+        Descarta a tarefa do cache. Com publish, os outros processos Socket.IO
+        recebem a invalidação pelo mesmo canal do RoomAccessCache.
+        """
+        with self._lock:
+            self._entries.pop(task_gid, None)
+        if not publish:
+            return
+        
+        try:
+            get_redis().publish(INVALIDATION_CHANNEL, json.dumps({'tasks': [task_gid]}))
+        except Exception as e:
+            logger.error(f"Error publishing task room invalidation: {str(e)}")
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class TypingThrottle:
+    """
+    Limita a taxa de indicadores por (usuário, alvo, campo): eventos is_typing=true
+    repetidos dentro da janela são absorvidos; is_typing=false passa sempre que o
+    início correspondente foi enviado.
+    """
+    
+    def __init__(self, window=2.0, max_entries=50000):
+        self.window = window
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._last = {}
+        self.suppressed = 0
+    
+    def should_emit(self, key, is_typing):
+        now = time.monotonic()
+        with self._lock:
+            previous = self._last.get(key)
+            
+            if not is_typing:
+                # Parar de digitar só precisa ser avisado se o início foi avisado
+                self._last.pop(key, None)
+                return previous is not None
+            
+            if previous is not None and now - previous < self.window:
+                self.suppressed += 1
+                return False
+            
+            self._last[key] = now
+            if len(self._last) > self.max_entries:
+                self._prune(now)
+            return True
+    
+    def _prune(self, now):
+        # Entradas antigas: o cliente parou sem enviar is_typing=false
+        expired = [key for key, last in self._last.items() if now - last >= self.window]
+        for key in expired:
+            del self._last[key]